@@ -1,13 +1,12 @@
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+from db import get_connection
+import response_cache
 
 def get_db_connection():
     """Создает подключение к базе данных"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    return get_connection(cursor_factory=RealDictCursor)
 
 def handler(event: dict, context) -> dict:
     """
@@ -159,6 +158,7 @@ def create_event(conn, data):
          json.dumps(data.get('rules', [])))
     )
     event_id = cursor.fetchone()['id']
+    response_cache.bump(cursor, 'events')
     conn.commit()
     cursor.close()
     return {'success': True, 'id': event_id}
@@ -174,6 +174,7 @@ def update_event(conn, event_id, data):
          data.get('image_url'), json.dumps(data.get('program', [])),
          json.dumps(data.get('rules', [])), event_id)
     )
+    response_cache.bump(cursor, 'events')
     conn.commit()
     cursor.close()
     return {'success': True}
@@ -181,6 +182,7 @@ def update_event(conn, event_id, data):
 def delete_event(conn, event_id):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM t_p13705114_spa_community_portal.events WHERE id=%s", (event_id,))
+    response_cache.bump(cursor, 'events')
     conn.commit()
     cursor.close()
     return {'success': True}
@@ -203,6 +205,7 @@ def create_sauna(conn, data):
          json.dumps(data.get('features', [])), json.dumps(data.get('images', [])))
     )
     sauna_id = cursor.fetchone()['id']
+    response_cache.bump(cursor, 'baths')
     conn.commit()
     cursor.close()
     return {'success': True, 'id': sauna_id}
@@ -218,6 +221,7 @@ def update_sauna(conn, sauna_id, data):
          json.dumps(data.get('features', [])), json.dumps(data.get('images', [])),
          sauna_id)
     )
+    response_cache.bump(cursor, 'baths')
     conn.commit()
     cursor.close()
     return {'success': True}
@@ -225,6 +229,7 @@ def update_sauna(conn, sauna_id, data):
 def delete_sauna(conn, sauna_id):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM t_p13705114_spa_community_portal.baths WHERE id=%s", (sauna_id,))
+    response_cache.bump(cursor, 'baths')
     conn.commit()
     cursor.close()
     return {'success': True}
@@ -246,6 +251,7 @@ def create_master(conn, data):
          json.dumps(data.get('services', [])))
     )
     master_id = cursor.fetchone()['id']
+    response_cache.bump(cursor, 'masters')
     conn.commit()
     cursor.close()
     return {'success': True, 'id': master_id}
@@ -259,6 +265,7 @@ def update_master(conn, master_id, data):
          data.get('description'), data.get('avatar_url'),
          json.dumps(data.get('services', [])), master_id)
     )
+    response_cache.bump(cursor, 'masters')
     conn.commit()
     cursor.close()
     return {'success': True}
@@ -266,6 +273,7 @@ def update_master(conn, master_id, data):
 def delete_master(conn, master_id):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM t_p13705114_spa_community_portal.masters WHERE id=%s", (master_id,))
+    response_cache.bump(cursor, 'masters')
     conn.commit()
     cursor.close()
     return {'success': True}
@@ -3,18 +3,19 @@
 Не требует авторизации.
 """
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+from db import get_connection
+from http_cache import cache_control, cached_response
 
 SCHEMA = 't_p13705114_spa_community_portal'
 
+GET_CACHE_POLICY = cache_control(60, 300)
+
 
 def get_db_connection():
     """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
 
 
 def handler(event: dict, context) -> dict:
@@ -38,7 +39,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
@@ -92,12 +93,7 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        return {
-            'statusCode': 200,
-            'headers': headers,
-            'body': json.dumps(result, ensure_ascii=False, default=str),
-            'isBase64Encoded': False
-        }
+        return cached_response(event, json.dumps(result, ensure_ascii=False, default=str), GET_CACHE_POLICY, headers)
     
     except Exception as e:
         return {
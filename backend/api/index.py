@@ -1,12 +1,13 @@
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
+from http_cache import cache_control, cached_response
+
+GET_CACHE_POLICY = cache_control(60, 300)
 
 def get_db_connection():
     """Создает подключение к базе данных"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    return get_connection(cursor_factory=RealDictCursor)
 
 def handler(event: dict, context) -> dict:
     """
@@ -21,7 +22,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
@@ -50,15 +51,7 @@ def handler(event: dict, context) -> dict:
             
             conn.close()
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(result, default=str, ensure_ascii=False),
-                'isBase64Encoded': False
-            }
+            return cached_response(event, json.dumps(result, default=str, ensure_ascii=False), GET_CACHE_POLICY)
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
@@ -3,20 +3,20 @@ API для регистрации и авторизации пользовате
 Поддерживает регистрацию по email, вход, выход и проверку токена.
 """
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import hashlib
 import secrets
 from datetime import datetime, timedelta
+from db import get_connection
+import session_cache
+import jwt_auth
 
 SCHEMA = 't_p13705114_spa_community_portal'
 
 
 def get_db_connection():
     """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
 
 
 def hash_password(password: str) -> str:
@@ -255,13 +255,25 @@ def logout_user(headers: dict) -> dict:
     if not token:
         raise ValueError('Токен не предоставлен')
     
+    # JWT от функции auth: сессия хранится по jti, сам токен попадает в denylist
+    session_token = token
+    if jwt_auth.is_jwt(token):
+        payload = jwt_auth.decode(token, verify_exp=False)
+        if not payload:
+            raise ValueError('Невалидный токен')
+        session_token = payload['jti']
+    
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
             cursor.execute(
-                f"DELETE FROM {SCHEMA}.user_sessions WHERE session_token = %s",
-                (token,)
+                f"DELETE FROM {SCHEMA}.user_sessions WHERE session_token = %s RETURNING session_token, expires_at",
+                (session_token,)
             )
+            if jwt_auth.enabled():
+                for jti, expires_at in cursor.fetchall():
+                    jwt_auth.revoke(cursor, jti, expires_at)
+            session_cache.bump_version(cursor)
             conn.commit()
             
             return {'message': 'Успешный выход'}
@@ -276,18 +288,34 @@ def get_current_user(headers: dict) -> dict:
     if not token:
         raise ValueError('Токен не предоставлен')
     
+    jwt_user_id = None
+    if jwt_auth.is_jwt(token):
+        jwt_user_id = jwt_auth.verify(token)
+        if not jwt_user_id:
+            raise ValueError('Невалидный или истекший токен')
+    
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(
-                f"""
-                SELECT u.id, u.email, u.name, u.phone, u.role, u.created_at
-                FROM {SCHEMA}.users u
-                JOIN {SCHEMA}.user_sessions s ON u.id = s.user_id
-                WHERE s.session_token = %s AND s.expires_at > NOW()
-                """,
-                (token,)
-            )
+            if jwt_user_id:
+                # JWT проверен локально, из БД читается только профиль
+                cursor.execute(
+                    f"""
+                    SELECT id, email, name, phone, role, created_at
+                    FROM {SCHEMA}.users WHERE id = %s
+                    """,
+                    (jwt_user_id,)
+                )
+            else:
+                cursor.execute(
+                    f"""
+                    SELECT u.id, u.email, u.name, u.phone, u.role, u.created_at
+                    FROM {SCHEMA}.users u
+                    JOIN {SCHEMA}.user_sessions s ON u.id = s.user_id
+                    WHERE s.session_token = %s AND s.expires_at > NOW()
+                    """,
+                    (token,)
+                )
             
             user = cursor.fetchone()
             
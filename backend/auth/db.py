@@ -0,0 +1,92 @@
+"""
+Пул подключений к БД, переживающий тёплые вызовы функции.
+Соединения создаются лениво, проверяются перед выдачей и переподключаются при обрыве.
+"""
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions, pool
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_PING_INTERVAL = int(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_last_used = {}
+
+
+def _get_pool() -> pool.ThreadedConnectionPool:
+    """Создание пула при первом обращении (живёт до остановки инстанса)"""
+    global _pool
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                _pool = pool.ThreadedConnectionPool(0, DB_POOL_MAX_SIZE, os.environ['DATABASE_URL'])
+    return _pool
+
+
+def _is_alive(conn) -> bool:
+    """Проверка соединения: дешёвый SELECT 1, если оно долго простаивало"""
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_PING_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _release(conn) -> None:
+    """Возврат соединения в пул; сломанные соединения закрываются"""
+    broken = bool(conn.closed)
+    if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    if broken:
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    _get_pool().putconn(conn, close=broken)
+
+
+class PooledConnection:
+    """Соединение из пула: close() возвращает его в пул вместо разрыва"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError('connection already returned to pool')
+        return getattr(self._conn, name)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            _release(conn)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def get_connection(cursor_factory=None) -> PooledConnection:
+    """Получение соединения из пула (без TCP/TLS-рукопожатия на тёплом инстансе)"""
+    db_pool = _get_pool()
+    conn = db_pool.getconn()
+    if not _is_alive(conn):
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+        conn = db_pool.getconn()
+    conn.cursor_factory = cursor_factory
+    return PooledConnection(conn)
@@ -3,9 +3,6 @@ import json
 import os
 from datetime import datetime, timedelta
 from psycopg2.extras import RealDictCursor
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 
 from utils import (
     get_db_connection,
@@ -19,26 +16,21 @@ from utils import (
     get_client_ip,
     generate_token
 )
+import session_cache
+import jwt_auth
+import mail_outbox
+import purge
 
 
-def send_reset_email(email: str, token: str):
-    """Отправка письма с токеном восстановления пароля"""
-    smtp_host = os.environ.get('SMTP_HOST')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_user = os.environ.get('SMTP_USER')
-    smtp_password = os.environ.get('SMTP_PASSWORD')
+def send_reset_email(cur, email: str, token: str):
+    """
+    Письмо с токеном восстановления пароля — в очередь email_outbox в транзакции вызывающего.
+    SMTP в запросе не используется: письмо отправит воркер по таймеру.
+    """
     site_url = os.environ.get('SITE_URL', 'http://localhost:5173')
     
-    if not all([smtp_host, smtp_user, smtp_password]):
-        raise ValueError('SMTP настройки не заданы')
-    
     reset_url = f"{site_url}/reset-password?token={token}"
     
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = 'Восстановление пароля'
-    msg['From'] = smtp_user
-    msg['To'] = email
-    
     text = f"""Здравствуйте!
 
 Вы запросили восстановление пароля.
@@ -61,13 +53,55 @@ def send_reset_email(email: str, token: str):
 </body>
 </html>"""
     
-    msg.attach(MIMEText(text, 'plain'))
-    msg.attach(MIMEText(html, 'html'))
-    
-    with smtplib.SMTP(smtp_host, smtp_port) as server:
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        server.send_message(msg)
+    mail_outbox.enqueue(cur, email, 'Восстановление пароля', text, html)
+
+
+def is_timer_event(event: dict) -> bool:
+    """Вызов от таймер-триггера Yandex Cloud Functions"""
+    messages = event.get('messages') or []
+    return bool(messages) and all(
+        (message.get('event_metadata') or {}).get('event_type', '').endswith('TimerMessage')
+        for message in messages
+    )
+
+
+def timer_payload(event: dict) -> str:
+    """Payload таймер-триггера: отличает очистку от отправки писем"""
+    messages = event.get('messages') or [{}]
+    return ((messages[0].get('details') or {}).get('payload') or '').strip()
+
+
+def purge_expired() -> dict:
+    """Удаление просроченных токенов, сессий и счётчиков лимитов (таймер с payload «purge»)"""
+    conn = get_db_connection()
+    try:
+        stats = purge.purge(conn)
+    finally:
+        conn.close()
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(stats)
+    }
+
+
+def deliver_outbox() -> dict:
+    """Отправка писем из email_outbox (по таймеру) через одну SMTP-сессию"""
+    if not mail_outbox.is_configured():
+        print("Email outbox: SMTP_HOST не задан, письма остаются в очереди")
+        stats = {}
+    else:
+        conn = get_db_connection()
+        try:
+            stats = mail_outbox.drain(conn)
+        finally:
+            conn.close()
+        print(f"Email outbox: {stats}")
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(stats)
+    }
 
 
 def handler(event: dict, context) -> dict:
@@ -81,7 +115,15 @@ def handler(event: dict, context) -> dict:
     - POST /logout - выход (отзыв токенов)
     - POST /reset-password - запрос на сброс пароля
     - POST /confirm-reset - подтверждение сброса пароля
+    
+    Вызов по таймеру отправляет письма из очереди email_outbox,
+    таймер с payload «purge» удаляет просроченные токены и сессии.
     """
+    if is_timer_event(event):
+        if timer_payload(event) == 'purge':
+            return purge_expired()
+        return deliver_outbox()
+    
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -417,18 +459,9 @@ def handle_reset_password(event: dict, body: dict, headers: dict) -> dict:
                    (user_id, token, expires_at) VALUES (%s, %s, %s)""",
                 (user['id'], token, expires_at)
             )
+            send_reset_email(cur, email, token)
             conn.commit()
             
-            try:
-                send_reset_email(email, token)
-            except Exception as e:
-                return {
-                    'statusCode': 500,
-                    'headers': headers,
-                    'body': json.dumps({'error': f'Ошибка отправки письма: {str(e)}'}),
-                    'isBase64Encoded': False
-                }
-            
             return {
                 'statusCode': 200,
                 'headers': headers,
@@ -494,9 +527,15 @@ def handle_confirm_reset(body: dict, headers: dict) -> dict:
             
             cur.execute(
                 """DELETE FROM t_p13705114_spa_community_portal.user_sessions 
-                   WHERE user_id = %s""",
+                   WHERE user_id = %s
+                   RETURNING session_token, expires_at""",
                 (reset_token['user_id'],)
             )
+            sessions = cur.fetchall()
+            session_cache.bump_version(cur)
+            if jwt_auth.enabled():
+                for session in sessions:
+                    jwt_auth.revoke(cur, session['session_token'], session['expires_at'])
             
             conn.commit()
             
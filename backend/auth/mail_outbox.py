@@ -0,0 +1,184 @@
+"""
+Очередь исходящих писем (email_outbox).
+Обработчик запроса только вставляет письмо в транзакции вызывающего. Воркер
+(вызов функции по таймеру) забирает готовые к отправке письма пачками:
+строки берутся FOR UPDATE SKIP LOCKED и арендуются на EMAIL_OUTBOX_LEASE секунд,
+все письма прохода уходят через одну SMTP-сессию (подключение, STARTTLS и логин — один раз).
+Временные ошибки откладывают письмо с экспоненциальной задержкой, после
+EMAIL_OUTBOX_MAX_ATTEMPTS попыток и при постоянных ошибках (5xx) письмо помечается failed.
+"""
+import os
+import smtplib
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Optional
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+EMAIL_OUTBOX_BATCH = int(os.environ.get('EMAIL_OUTBOX_BATCH', '50'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+# Задержка перед повтором: EMAIL_OUTBOX_BACKOFF * 2^(попытка - 1) секунд
+EMAIL_OUTBOX_BACKOFF = int(os.environ.get('EMAIL_OUTBOX_BACKOFF', '60'))
+EMAIL_OUTBOX_LEASE = int(os.environ.get('EMAIL_OUTBOX_LEASE', '300'))
+# Проход воркера не начинает новую пачку позже этого срока (таймаут функции)
+EMAIL_OUTBOX_DRAIN_SECONDS = int(os.environ.get('EMAIL_OUTBOX_DRAIN_SECONDS', '20'))
+SMTP_TIMEOUT = int(os.environ.get('SMTP_TIMEOUT', '10'))
+
+
+def enqueue(cur, to_email: str, subject: str, text_body: str, html_body: Optional[str] = None) -> None:
+    """Постановка письма в очередь в транзакции вызывающего"""
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.email_outbox (to_email, subject, text_body, html_body)
+        VALUES (%s, %s, %s, %s)
+    """, (to_email, subject, text_body, html_body))
+
+
+def is_configured() -> bool:
+    return bool(os.environ.get('SMTP_HOST'))
+
+
+class SmtpSession:
+    """Одна SMTP-сессия на весь проход воркера; при обрыве переподключается один раз"""
+
+    def __init__(self):
+        self.host = os.environ.get('SMTP_HOST')
+        self.port = int(os.environ.get('SMTP_PORT', '587'))
+        self.user = os.environ.get('SMTP_USER')
+        self.password = os.environ.get('SMTP_PASSWORD')
+        self.sender = os.environ.get('SMTP_FROM') or self.user or 'noreply@localhost'
+        # Локальный SMTP-стенд (aiosmtpd) работает без TLS: SMTP_STARTTLS=0
+        self.starttls = os.environ.get('SMTP_STARTTLS', '1') != '0'
+        self._server = None
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+            if self.starttls:
+                server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        return server
+
+    def connect(self) -> None:
+        if self._server is None:
+            self._server = self._connect()
+
+    def send(self, to_email: str, subject: str, text_body: str, html_body: Optional[str]) -> None:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
+        if html_body:
+            msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+
+        self.connect()
+        try:
+            self._server.sendmail(self.sender, [to_email], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            self.connect()
+            self._server.sendmail(self.sender, [to_email], msg.as_string())
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+def _claim(cur, limit: int) -> list:
+    """Аренда пачки готовых писем: попытка засчитывается сразу, строка скрыта от других воркеров на срок аренды"""
+    cur.execute(f"""
+        UPDATE {SCHEMA}.email_outbox o
+        SET attempts = o.attempts + 1,
+            next_attempt_at = NOW() + make_interval(secs => %s)
+        WHERE o.id IN (
+            SELECT id FROM {SCHEMA}.email_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING o.id, o.to_email, o.subject, o.text_body, o.html_body, o.attempts
+    """, (EMAIL_OUTBOX_LEASE, limit))
+    return [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in cur.fetchall()]
+
+
+def _mark_sent(cur, message_id: int) -> None:
+    cur.execute(f"""
+        UPDATE {SCHEMA}.email_outbox
+        SET status = 'sent', sent_at = NOW(), last_error = NULL
+        WHERE id = %s
+    """, (message_id,))
+
+
+def _mark_failed(cur, message_id: int, attempts: int, error: Exception, permanent: bool = False) -> str:
+    """Повтор с экспоненциальной задержкой или окончательный отказ; возвращает новый статус"""
+    if permanent or attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        cur.execute(f"""
+            UPDATE {SCHEMA}.email_outbox SET status = 'failed', last_error = %s WHERE id = %s
+        """, (f'{type(error).__name__}: {error}'[:1000], message_id))
+        return 'failed'
+    cur.execute(f"""
+        UPDATE {SCHEMA}.email_outbox
+        SET next_attempt_at = NOW() + make_interval(secs => %s), last_error = %s
+        WHERE id = %s
+    """, (EMAIL_OUTBOX_BACKOFF * 2 ** (attempts - 1), f'{type(error).__name__}: {error}'[:1000], message_id))
+    return 'retry'
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Адрес отклонён или ответ 5xx на письмо — повтор не поможет"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def drain(conn) -> dict:
+    """
+    Отправка готовых писем пачками по EMAIL_OUTBOX_BATCH через одну SMTP-сессию
+
+    Returns:
+        Счётчики {sent, retry, failed}
+    """
+    stats = {'sent': 0, 'retry': 0, 'failed': 0}
+    session = SmtpSession()
+    deadline = time.monotonic() + EMAIL_OUTBOX_DRAIN_SECONDS
+    try:
+        with conn.cursor() as cur:
+            while time.monotonic() < deadline:
+                batch = _claim(cur, EMAIL_OUTBOX_BATCH)
+                conn.commit()
+                if not batch:
+                    break
+
+                for index, (message_id, to_email, subject, text_body, html_body, attempts) in enumerate(batch):
+                    try:
+                        session.connect()
+                        session.send(to_email, subject, text_body, html_body)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                        stats[_mark_failed(cur, message_id, attempts, e, permanent=_is_permanent(e))] += 1
+                    except OSError as e:
+                        # Сервер недоступен, отказал в сессии или отправителе (SMTPException — тоже OSError):
+                        # остаток пачки откладывается без попыток подключиться ради каждого письма
+                        for rest_id, _, _, _, _, rest_attempts in batch[index:]:
+                            stats[_mark_failed(cur, rest_id, rest_attempts, e)] += 1
+                        conn.commit()
+                        return stats
+                    else:
+                        _mark_sent(cur, message_id)
+                        stats['sent'] += 1
+                    # Фиксация после каждого письма: при падении воркера отправленное не уйдёт повторно
+                    conn.commit()
+
+                if len(batch) < EMAIL_OUTBOX_BATCH:
+                    break
+    finally:
+        session.close()
+    return stats
@@ -0,0 +1,69 @@
+"""
+Удаление просроченных строк из таблиц токенов, сессий и лимитов (вызов по таймеру).
+Каждая таблица чистится пачками по PURGE_BATCH строк: DELETE по ctid из подзапроса
+с LIMIT и FOR UPDATE SKIP LOCKED, фиксация после каждой пачки — блокировки короткие,
+запросы входа не ждут очистку. Проход не начинает новую пачку позже PURGE_SECONDS.
+"""
+import os
+import time
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+PURGE_BATCH = int(os.environ.get('PURGE_BATCH', '5000'))
+PURGE_SECONDS = int(os.environ.get('PURGE_SECONDS', '20'))
+
+# Таблица и условие «строка больше не нужна»
+PURGE_TARGETS = [
+    ('user_sessions', 'COALESCE(refresh_expires_at, expires_at) < NOW()'),
+    ('refresh_tokens', 'expires_at < NOW()'),
+    ('email_verification_tokens', 'expires_at < NOW()'),
+    ('password_reset_tokens', 'expires_at < NOW()'),
+    ('telegram_auth_tokens',
+     "expires_at < NOW() OR (used_at IS NOT NULL AND created_at < NOW() - INTERVAL '1 hour')"),
+    ('telegram_refresh_tokens', 'expires_at < NOW()'),
+    ('revoked_tokens', 'expires_at < NOW()'),
+    ('rate_limit_counters', 'expires_at < NOW()'),
+    # Старая таблица лимитов больше не пополняется (rate_limit_counters)
+    ('rate_limits', "last_attempt < NOW() - INTERVAL '1 day' AND (blocked_until IS NULL OR blocked_until < NOW())"),
+]
+
+
+def _delete_batch(cur, table: str, condition: str, limit: int) -> int:
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.{table}
+        WHERE ctid IN (
+            SELECT ctid FROM {SCHEMA}.{table}
+            WHERE {condition}
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+    """, (limit,))
+    return cur.rowcount
+
+
+def purge(conn) -> dict:
+    """
+    Очистка всех таблиц из PURGE_TARGETS
+
+    Returns:
+        По таблице: {deleted, batches, seconds, done}; done = False — проход
+        прерван по сроку, остаток удалит следующий вызов
+    """
+    deadline = time.monotonic() + PURGE_SECONDS
+    stats = {}
+    with conn.cursor() as cur:
+        for table, condition in PURGE_TARGETS:
+            entry = {'deleted': 0, 'batches': 0, 'seconds': 0.0, 'done': False}
+            stats[table] = entry
+            started = time.monotonic()
+            while time.monotonic() < deadline:
+                deleted = _delete_batch(cur, table, condition, PURGE_BATCH)
+                conn.commit()
+                entry['deleted'] += deleted
+                entry['batches'] += 1
+                if deleted < PURGE_BATCH:
+                    entry['done'] = True
+                    break
+            entry['seconds'] = round(time.monotonic() - started, 3)
+            print(f"Purge {table}: {entry}")
+    return stats
@@ -1,15 +1,18 @@
 """Утилиты для работы с авторизацией"""
-import os
+import math
 import secrets
 import hashlib
 from datetime import datetime, timedelta
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
+import session_cache
+import jwt_auth
+import rate_limit
 
 
 def get_db_connection():
     """Получение подключения к БД"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    return get_connection()
 
 
 def hash_password(password: str) -> str:
@@ -29,17 +32,22 @@ def generate_token(length: int = 32) -> str:
 
 def create_tokens(user_id: int) -> tuple[str, str, datetime, datetime]:
     """
-    Создание пары access + refresh токенов
+    Создание пары access + refresh токенов.
+    При заданном JWT_SECRET access токен — JWT, а в session_token хранится его jti.
     
     Returns:
         (access_token, refresh_token, access_expires_at, refresh_expires_at)
     """
-    access_token = generate_token(32)
     refresh_token = generate_token(48)
     
     access_expires_at = datetime.now() + timedelta(hours=1)
     refresh_expires_at = datetime.now() + timedelta(days=30)
     
+    if jwt_auth.enabled():
+        access_token, session_token = jwt_auth.create_access_token(user_id, access_expires_at)
+    else:
+        access_token = session_token = generate_token(32)
+    
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
@@ -47,7 +55,7 @@ def create_tokens(user_id: int) -> tuple[str, str, datetime, datetime]:
                 """INSERT INTO t_p13705114_spa_community_portal.user_sessions 
                    (user_id, session_token, refresh_token, expires_at, refresh_expires_at) 
                    VALUES (%s, %s, %s, %s, %s)""",
-                (user_id, access_token, refresh_token, access_expires_at, refresh_expires_at)
+                (user_id, session_token, refresh_token, access_expires_at, refresh_expires_at)
             )
             conn.commit()
     finally:
@@ -57,20 +65,58 @@ def create_tokens(user_id: int) -> tuple[str, str, datetime, datetime]:
 
 
 def get_user_by_token(token: str) -> dict | None:
-    """Получение пользователя по access токену"""
+    """Получение пользователя по access токену (с кэшем на тёплом инстансе)"""
+    cached = session_cache.get(token)
+    if cached:
+        return dict(cached)
+    
+    if jwt_auth.is_jwt(token):
+        return get_user_by_jwt(token)
+    
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
-                """SELECT u.* FROM t_p13705114_spa_community_portal.users u
+                """SELECT u.*, s.expires_at AS session_expires_at
+                   FROM t_p13705114_spa_community_portal.users u
                    JOIN t_p13705114_spa_community_portal.user_sessions s ON u.id = s.user_id
                    WHERE s.session_token = %s 
                    AND s.expires_at > NOW() 
                    AND u.is_active = true""",
                 (token,)
             )
-            user = cur.fetchone()
-            return dict(user) if user else None
+            row = cur.fetchone()
+            if not row:
+                return None
+            
+            user = dict(row)
+            session_cache.put(token, user, user.pop('session_expires_at'))
+            return dict(user)
+    finally:
+        conn.close()
+
+
+def get_user_by_jwt(token: str) -> dict | None:
+    """Получение пользователя по JWT: токен проверяется локально, из БД читается только профиль"""
+    payload = jwt_auth.decode(token)
+    if not payload or jwt_auth.is_revoked(payload['jti']):
+        return None
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                """SELECT * FROM t_p13705114_spa_community_portal.users
+                   WHERE id = %s AND is_active = true""",
+                (int(payload['sub']),)
+            )
+            row = cur.fetchone()
+            if not row:
+                return None
+            
+            user = dict(row)
+            session_cache.put(token, user, datetime.fromtimestamp(payload['exp']))
+            return dict(user)
     finally:
         conn.close()
 
@@ -86,7 +132,7 @@ def refresh_access_token(refresh_token: str) -> tuple[str, datetime] | None:
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
-                """SELECT user_id FROM t_p13705114_spa_community_portal.user_sessions
+                """SELECT user_id, session_token, expires_at FROM t_p13705114_spa_community_portal.user_sessions
                    WHERE refresh_token = %s 
                    AND refresh_expires_at > NOW()""",
                 (refresh_token,)
@@ -96,15 +142,23 @@ def refresh_access_token(refresh_token: str) -> tuple[str, datetime] | None:
             if not session:
                 return None
             
-            new_access_token = generate_token(32)
             new_expires_at = datetime.now() + timedelta(hours=1)
             
+            if jwt_auth.enabled():
+                new_access_token, new_session_token = jwt_auth.create_access_token(session['user_id'], new_expires_at)
+                # Прежний JWT валиден по подписи до истечения — отзываем его jti
+                jwt_auth.revoke(cur, session['session_token'], session['expires_at'])
+            else:
+                new_access_token = new_session_token = generate_token(32)
+            
             cur.execute(
                 """UPDATE t_p13705114_spa_community_portal.user_sessions
                    SET session_token = %s, expires_at = %s
                    WHERE refresh_token = %s""",
-                (new_access_token, new_expires_at, refresh_token)
+                (new_session_token, new_expires_at, refresh_token)
             )
+            # Прежний access токен больше не действителен
+            session_cache.bump_version(cur)
             conn.commit()
             
             return new_access_token, new_expires_at
@@ -120,95 +174,54 @@ def revoke_token(token: str, token_type: str = 'access') -> bool:
         token: access_token или refresh_token
         token_type: 'access' или 'refresh'
     """
+    session_token = token
+    if token_type == 'access' and jwt_auth.is_jwt(token):
+        payload = jwt_auth.decode(token, verify_exp=False)
+        if not payload:
+            return False
+        session_token = payload['jti']
+    
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
             if token_type == 'access':
                 cur.execute(
                     """DELETE FROM t_p13705114_spa_community_portal.user_sessions
-                       WHERE session_token = %s""",
-                    (token,)
+                       WHERE session_token = %s
+                       RETURNING session_token, expires_at""",
+                    (session_token,)
                 )
             else:
                 cur.execute(
                     """DELETE FROM t_p13705114_spa_community_portal.user_sessions
-                       WHERE refresh_token = %s""",
+                       WHERE refresh_token = %s
+                       RETURNING session_token, expires_at""",
                     (token,)
                 )
+            sessions = cur.fetchall()
+            revoked = len(sessions) > 0
+            if revoked:
+                session_cache.bump_version(cur)
+                if jwt_auth.enabled():
+                    for jti, expires_at in sessions:
+                        jwt_auth.revoke(cur, jti, expires_at)
             conn.commit()
-            return cur.rowcount > 0
+            if token_type == 'access':
+                session_cache.invalidate(token)
+            return revoked
     finally:
         conn.close()
 
 
 def check_rate_limit(identifier: str, action: str, max_attempts: int = 5, window_minutes: int = 15) -> tuple[bool, int]:
     """
-    Проверка rate limit
+    Проверка rate limit: скользящее окно window_minutes, один upsert в rate_limit_counters
     
     Returns:
         (allowed: bool, wait_minutes: int)
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """SELECT * FROM t_p13705114_spa_community_portal.rate_limits 
-                   WHERE identifier = %s AND action = %s""",
-                (identifier, action)
-            )
-            record = cur.fetchone()
-            
-            now = datetime.now()
-            
-            if record:
-                if record['blocked_until'] and record['blocked_until'] > now:
-                    remaining = int((record['blocked_until'] - now).total_seconds() / 60)
-                    return False, remaining
-                
-                time_diff = (now - record['first_attempt']).total_seconds() / 60
-                
-                if time_diff > window_minutes:
-                    cur.execute(
-                        """UPDATE t_p13705114_spa_community_portal.rate_limits 
-                           SET attempts = 1, first_attempt = %s, last_attempt = %s, blocked_until = NULL 
-                           WHERE identifier = %s AND action = %s""",
-                        (now, now, identifier, action)
-                    )
-                    conn.commit()
-                    return True, 0
-                
-                new_attempts = record['attempts'] + 1
-                
-                if new_attempts > max_attempts:
-                    blocked_until = now + timedelta(minutes=window_minutes)
-                    cur.execute(
-                        """UPDATE t_p13705114_spa_community_portal.rate_limits 
-                           SET attempts = %s, last_attempt = %s, blocked_until = %s 
-                           WHERE identifier = %s AND action = %s""",
-                        (new_attempts, now, blocked_until, identifier, action)
-                    )
-                    conn.commit()
-                    return False, window_minutes
-                
-                cur.execute(
-                    """UPDATE t_p13705114_spa_community_portal.rate_limits 
-                       SET attempts = %s, last_attempt = %s 
-                       WHERE identifier = %s AND action = %s""",
-                    (new_attempts, now, identifier, action)
-                )
-                conn.commit()
-                return True, 0
-            else:
-                cur.execute(
-                    """INSERT INTO t_p13705114_spa_community_portal.rate_limits 
-                       (identifier, action, attempts, first_attempt, last_attempt) 
-                       VALUES (%s, %s, 1, %s, %s)""",
-                    (identifier, action, now, now)
-                )
-                conn.commit()
-                return True, 0
-    finally:
-        conn.close()
+    allowed, retry_after = rate_limit.check(f'{action}:{identifier}', max_attempts, window_minutes * 60, sliding=True)
+    return allowed, 0 if allowed else math.ceil(retry_after / 60)
 
 
 def get_client_ip(event: dict) -> str:
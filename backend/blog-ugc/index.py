@@ -3,17 +3,28 @@ UGC Blog API для СПАРКОМ
 Пользовательский блог с модерацией, антиспамом и правами доступа
 """
 import json
-import os
 import re
 from datetime import datetime, timedelta
 from typing import Optional
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
+import session_cache
+import rate_limit
+from pagination import (
+    InvalidCursorError, decode_cursor, include_total, keyset_condition,
+    order_by_sql, sort_key_sql, split_page
+)
+
+POSTS_ORDER = [
+    ("COALESCE(p.published_at, TIMESTAMP '1970-01-01')", 'DESC'),
+    ('p.created_at', 'DESC'),
+    ('p.id', 'DESC')
+]
 
 
 def get_db():
     """Подключение к БД"""
-    return psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    return get_connection(cursor_factory=RealDictCursor)
 
 
 def get_user_from_token(headers: dict) -> Optional[dict]:
@@ -26,18 +37,27 @@ def get_user_from_token(headers: dict) -> Optional[dict]:
     if not token:
         return None
     
+    user = session_cache.get(token)
+    if user:
+        return dict(user)
+    
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT u.id, u.email, u.name, u.role, u.avatar_url, u.created_at
+        SELECT u.id, u.email, u.name, u.role, u.avatar_url, u.created_at, s.expires_at
         FROM users u
         JOIN sessions s ON s.user_id = u.id
         WHERE s.access_token = %s AND s.expires_at > NOW()
     """, (token,))
-    user = cursor.fetchone()
+    row = cursor.fetchone()
     conn.close()
     
-    return dict(user) if user else None
+    if not row:
+        return None
+    
+    user = dict(row)
+    session_cache.put(token, user, user.pop('expires_at'))
+    return dict(user)
 
 
 def generate_slug(title: str) -> str:
@@ -63,39 +83,12 @@ def generate_slug(title: str) -> str:
 
 
 def check_rate_limit(user_id: int) -> tuple[bool, str]:
-    """Проверка лимита постов в сутки (антиспам)"""
+    """Проверка лимита постов в сутки (антиспам): фиксированное окно — сутки UTC"""
     MAX_POSTS_PER_DAY = 10  # Конфигурируемый лимит
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    today = datetime.now().date()
-    cursor.execute("""
-        SELECT posts_count FROM blog_rate_limits
-        WHERE user_id = %s AND limit_date = %s
-    """, (user_id, today))
-    
-    result = cursor.fetchone()
-    
-    if result:
-        if result['posts_count'] >= MAX_POSTS_PER_DAY:
-            conn.close()
-            return False, f'Превышен лимит: максимум {MAX_POSTS_PER_DAY} постов в сутки'
-        
-        cursor.execute("""
-            UPDATE blog_rate_limits
-            SET posts_count = posts_count + 1, last_post_at = NOW()
-            WHERE user_id = %s AND limit_date = %s
-        """, (user_id, today))
-    else:
-        cursor.execute("""
-            INSERT INTO blog_rate_limits (user_id, posts_count, last_post_at, limit_date)
-            VALUES (%s, 1, NOW(), %s)
-        """, (user_id, today))
-    
-    conn.commit()
-    conn.close()
-    
+    allowed, _ = rate_limit.check(f'blog-post:{user_id}', MAX_POSTS_PER_DAY, 24 * 3600)
+    if not allowed:
+        return False, f'Превышен лимит: максимум {MAX_POSTS_PER_DAY} постов в сутки'
     return True, 'OK'
 
 
@@ -213,37 +206,56 @@ def get_posts(user: Optional[dict], params: dict) -> dict:
         query_params.append(date_to)
     
     where_sql = " AND ".join(where_clauses)
-    
-    # Подсчет общего количества
-    cursor.execute(f"""
-        SELECT COUNT(*) as total FROM blog_posts
-        WHERE {where_sql}
-    """, query_params)
-    total = cursor.fetchone()['total']
-    
-    # Получение постов
+    page_where_sql = where_sql
+    page_params = list(query_params)
+    
+    if params.get('cursor'):
+        # Keyset: страница сразу после последнего поста предыдущей
+        try:
+            cursor_values = decode_cursor(params['cursor'], 'published', POSTS_ORDER)
+        except InvalidCursorError as e:
+            conn.close()
+            return {'error': str(e)}, 400
+        condition, condition_params = keyset_condition(POSTS_ORDER, cursor_values)
+        page_where_sql = f"{where_sql} AND {condition}"
+        page_params.extend(condition_params)
+        offset = 0
+    
+    result = {}
+    
+    # Подсчет общего количества (можно отключить через include_total=false)
+    if include_total(params):
+        cursor.execute(f"""
+            SELECT COUNT(*) as total FROM blog_posts
+            WHERE {where_sql}
+        """, query_params)
+        result['total'] = cursor.fetchone()['total']
+    
+    # Получение постов (NULLS LAST для published_at — через COALESCE, чтобы работал keyset)
     cursor.execute(f"""
         SELECT 
             p.id, p.slug, p.title, p.excerpt, p.content, p.image_url,
             p.author_id, p.author, p.status, p.visibility,
             p.views_count, p.created_at, p.published_at,
-            u.avatar_url as author_avatar
+            u.avatar_url as author_avatar,
+            {sort_key_sql(POSTS_ORDER)}
         FROM blog_posts p
         LEFT JOIN users u ON u.id = p.author_id
-        WHERE {where_sql}
-        ORDER BY p.published_at DESC NULLS LAST, p.created_at DESC
+        WHERE {page_where_sql}
+        {order_by_sql(POSTS_ORDER)}
         LIMIT %s OFFSET %s
-    """, query_params + [limit, offset])
+    """, page_params + [limit + 1, offset])
     
-    posts = cursor.fetchall()
+    posts, next_cursor = split_page([dict(post) for post in cursor.fetchall()], limit, 'published', POSTS_ORDER)
     conn.close()
     
-    return {
-        'posts': [dict(post) for post in posts],
-        'total': total,
+    result.update({
+        'posts': posts,
         'limit': limit,
-        'offset': offset
-    }, 200
+        'offset': offset,
+        'next_cursor': next_cursor
+    })
+    return result, 200
 
 
 def get_post(slug: str, user: Optional[dict]) -> dict:
@@ -0,0 +1,88 @@
+"""
+Keyset-пагинация списков.
+Непрозрачный cursor хранит имя сортировки и значения ключа сортировки (+ id) последней
+строки страницы; следующая страница выбирается условием по ключу вместо OFFSET,
+поэтому глубокие страницы стоят столько же, сколько первая.
+"""
+import base64
+import binascii
+import json
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    raw = json.dumps({'s': sort, 'k': list(values)}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str, order: list) -> list:
+    """Значения ключа из cursor; cursor от другой сортировки считается некорректным"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise InvalidCursorError('Некорректный cursor')
+    if not isinstance(payload, dict) or payload.get('s') != sort:
+        raise InvalidCursorError('Некорректный cursor')
+    values = payload.get('k')
+    if not isinstance(values, list) or len(values) != len(order):
+        raise InvalidCursorError('Некорректный cursor')
+    return values
+
+
+def order_by_sql(order: list) -> str:
+    """ORDER BY по списку (выражение, 'ASC' | 'DESC'); последним должен идти уникальный id"""
+    return 'ORDER BY ' + ', '.join(f"{expr} {direction}" for expr, direction in order)
+
+
+def sort_key_sql(order: list) -> str:
+    """Колонки ключа сортировки для SELECT — из них строится cursor следующей страницы"""
+    return ', '.join(f"{expr} AS sort_key_{i}" for i, (expr, _) in enumerate(order))
+
+
+def keyset_condition(order: list, values: list) -> tuple[str, list]:
+    """Условие «строго после ключа» для WHERE"""
+    directions = {direction for _, direction in order}
+    if len(directions) == 1:
+        op = '<' if directions.pop() == 'DESC' else '>'
+        columns = ', '.join(expr for expr, _ in order)
+        placeholders = ', '.join(['%s'] * len(order))
+        return f"({columns}) {op} ({placeholders})", list(values)
+
+    # Смешанные направления: (a > x) OR (a = x AND b < y) OR ...
+    clauses = []
+    params = []
+    for i, (expr, direction) in enumerate(order):
+        parts = [f"{prev_expr} = %s" for prev_expr, _ in order[:i]]
+        parts.append(f"{expr} {'<' if direction == 'DESC' else '>'} %s")
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def split_page(rows: list, limit: int, sort: str, order: list) -> tuple[list, str | None]:
+    """
+    Отделение страницы от лишней (limit + 1)-й строки и построение next_cursor.
+    Колонки sort_key_* удаляются из строк-словарей; у строк-кортежей они идут последними.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        if isinstance(last, dict):
+            values = [last[f'sort_key_{i}'] for i in range(len(order))]
+        else:
+            values = list(last[-len(order):])
+        next_cursor = encode_cursor(sort, values)
+    for row in rows:
+        if isinstance(row, dict):
+            for i in range(len(order)):
+                row.pop(f'sort_key_{i}', None)
+    return rows, next_cursor
+
+
+def include_total(params: dict) -> bool:
+    return str(params.get('include_total', 'true')).lower() != 'false'
@@ -0,0 +1,109 @@
+"""
+Ограничение частоты действий (rate_limit_counters).
+Каждая проверка — один INSERT ... ON CONFLICT DO UPDATE ... RETURNING: счётчик окна
+увеличивается атомарно под блокировкой строки, параллельные попытки не проскакивают
+между чтением и записью. Окно фиксированное (счётчик сбрасывается на границе окна)
+или скользящее: оценка prev_hits * (доля окна, что ещё не прошла) + hits.
+Перед БД стоит token bucket в памяти инстанса с запасом RATE_LIMIT_LOCAL_BURST лимитов:
+заведомый флуд с одного инстанса отсекается без запроса к БД.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from db import get_connection
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+RATE_LIMIT_LOCAL = os.environ.get('RATE_LIMIT_LOCAL', '1') != '0'
+# Ёмкость локального ведра в лимитах: 2 — не строже фиксированного окна на его границе
+RATE_LIMIT_LOCAL_BURST = float(os.environ.get('RATE_LIMIT_LOCAL_BURST', '2'))
+RATE_LIMIT_LOCAL_KEYS = int(os.environ.get('RATE_LIMIT_LOCAL_KEYS', '10000'))
+
+_buckets = OrderedDict()
+_lock = threading.Lock()
+
+
+def _take_local(key: str, limit: int, window_seconds: int) -> float:
+    """Токен из локального ведра; 0 — взят, иначе через сколько секунд появится"""
+    rate = limit / window_seconds
+    capacity = limit * RATE_LIMIT_LOCAL_BURST
+    now = time.monotonic()
+    with _lock:
+        tokens, updated = _buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        _buckets[key] = (tokens, now)
+        while len(_buckets) > RATE_LIMIT_LOCAL_KEYS:
+            _buckets.popitem(last=False)
+    return wait
+
+
+def _sliding_retry_after(hits: int, prev_hits: int, elapsed: float, limit: int, window_seconds: int) -> float:
+    """Через сколько секунд следующая попытка уложится в лимит скользящего окна"""
+    if hits < limit and prev_hits:
+        # В текущем окне: вклад прошлого окна должен упасть до limit - hits - 1
+        needed = 1 - (limit - hits - 1) / prev_hits
+        return max(needed - elapsed, 0) * window_seconds
+    # В следующем окне текущий счётчик станет прошлым
+    needed = 1 - (limit - 1) / hits if hits else 0
+    return (1 - elapsed + max(needed, 0)) * window_seconds
+
+
+def check(key: str, limit: int, window_seconds: int, sliding: bool = False) -> tuple[bool, int]:
+    """
+    Учёт попытки и проверка лимита
+
+    Args:
+        key: действие и субъект, например 'login:203.0.113.7'
+        limit: попыток за окно
+        window_seconds: длина окна
+        sliding: скользящее окно вместо фиксированного
+
+    Returns:
+        (allowed, retry_after_seconds)
+    """
+    if RATE_LIMIT_LOCAL:
+        wait = _take_local(key, limit, window_seconds)
+        if wait:
+            return False, math.ceil(wait)
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO {SCHEMA}.rate_limit_counters AS c (key, window_id, hits, prev_hits, expires_at)
+                VALUES (
+                    %(key)s, FLOOR(EXTRACT(EPOCH FROM NOW()) / %(window)s)::bigint, 1, 0,
+                    NOW() + make_interval(secs => %(ttl)s)
+                )
+                ON CONFLICT (key) DO UPDATE SET
+                    hits = CASE WHEN c.window_id = EXCLUDED.window_id THEN c.hits + 1 ELSE 1 END,
+                    prev_hits = CASE
+                        WHEN c.window_id = EXCLUDED.window_id THEN c.prev_hits
+                        WHEN c.window_id = EXCLUDED.window_id - 1 THEN c.hits
+                        ELSE 0
+                    END,
+                    window_id = EXCLUDED.window_id,
+                    expires_at = EXCLUDED.expires_at
+                RETURNING c.hits, c.prev_hits, EXTRACT(EPOCH FROM NOW()) / %(window)s - c.window_id
+            """, {'key': key, 'window': window_seconds, 'ttl': 2 * window_seconds})
+            row = cur.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    hits, prev_hits, elapsed = tuple(row.values()) if isinstance(row, dict) else row
+    elapsed = float(elapsed)
+    if sliding:
+        if prev_hits * (1 - elapsed) + hits <= limit:
+            return True, 0
+        return False, max(1, math.ceil(_sliding_retry_after(hits, prev_hits, elapsed, limit, window_seconds)))
+    if hits <= limit:
+        return True, 0
+    return False, max(1, math.ceil((1 - elapsed) * window_seconds))
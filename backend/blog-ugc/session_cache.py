@@ -0,0 +1,112 @@
+"""
+Кэш токен → пользователь в памяти тёплого инстанса.
+LRU ограниченного размера, ключ — SHA-256 токена, запись живёт не дольше expires_at сессии.
+Отзыв сессии увеличивает счётчик session_cache_version в БД; инстансы сверяют его
+не чаще раза в SESSION_CACHE_VERSION_CHECK секунд и при изменении сбрасывают кэш.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from db import get_connection
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '1024'))
+SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', '60'))
+SESSION_CACHE_VERSION_CHECK = int(os.environ.get('SESSION_CACHE_VERSION_CHECK', '5'))
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_version = None
+_version_checked_at = 0.0
+
+
+def _key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _read_version() -> int:
+    """Текущее значение счётчика отзывов (один SELECT по первичному ключу)"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT version FROM {SCHEMA}.session_cache_version WHERE id = 1")
+            row = cur.fetchone()
+            return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+def _sync_version() -> None:
+    """Сброс кэша, если с момента последней сверки какая-то сессия была отозвана"""
+    global _version, _version_checked_at
+    now = time.monotonic()
+    if now - _version_checked_at < SESSION_CACHE_VERSION_CHECK:
+        return
+    try:
+        version = _read_version()
+    except Exception:
+        # Без актуальной версии кэшу доверять нельзя
+        clear()
+        return
+    with _lock:
+        if version != _version:
+            _entries.clear()
+            _version = version
+        _version_checked_at = now
+
+
+def get(token: str):
+    """Закэшированное значение для токена или None"""
+    if not token:
+        return None
+    _sync_version()
+    key = _key(token)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires <= time.time():
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return value
+
+
+def put(token: str, value, expires_at: datetime) -> None:
+    """Сохранение значения до истечения сессии (но не дольше SESSION_CACHE_TTL)"""
+    if not token or value is None:
+        return
+    expires = min(expires_at.timestamp(), time.time() + SESSION_CACHE_TTL)
+    key = _key(token)
+    with _lock:
+        _entries[key] = (value, expires)
+        _entries.move_to_end(key)
+        while len(_entries) > SESSION_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def invalidate(token: str) -> None:
+    """Удаление токена из кэша текущего инстанса"""
+    with _lock:
+        _entries.pop(_key(token), None)
+
+
+def clear() -> None:
+    global _version_checked_at
+    with _lock:
+        _entries.clear()
+        _version_checked_at = 0.0
+
+
+def bump_version(cur) -> None:
+    """Увеличение счётчика отзывов в транзакции вызывающего (logout, refresh, сброс пароля)"""
+    cur.execute(f"""
+        UPDATE {SCHEMA}.session_cache_version
+        SET version = version + 1, updated_at = NOW()
+        WHERE id = 1
+    """)
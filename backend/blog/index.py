@@ -1,14 +1,22 @@
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
+from db import get_connection
+import session_cache
+import jwt_auth
+import response_cache
+from http_cache import cache_control, with_http_cache
+from pagination import InvalidCursorError, decode_cursor, keyset_condition, order_by_sql, sort_key_sql, split_page
 
 SCHEMA = "t_p13705114_spa_community_portal"
 
+POSTS_CACHE_POLICY = cache_control(60, 300)
+COMMENTS_CACHE_POLICY = cache_control(30, 120)
+
+POSTS_ORDER = [('COALESCE(p.published_at, p.updated_at, p.created_at)', 'DESC'), ('p.id', 'DESC')]
+
 def get_db_connection():
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    return conn
+    return get_connection()
 
 def handler(event: dict, context) -> dict:
     '''API для управления блогом: посты, комментарии, лайки'''
@@ -24,7 +32,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -33,13 +41,13 @@ def handler(event: dict, context) -> dict:
     
     try:
         if method == 'GET' and action == 'comments' and post_id:
-            return get_post_comments(post_id)
+            return with_http_cache(event, cached_read(params, get_post_comments, post_id), COMMENTS_CACHE_POLICY)
         
         elif method == 'GET' and action == 'get' and post_id:
             return get_post_by_id(post_id)
         
         elif method == 'GET' and action == 'list':
-            return get_posts(params)
+            return with_http_cache(event, cached_read(params, get_posts, params), POSTS_CACHE_POLICY)
         
         elif method == 'POST' and action == 'create':
             body = json.loads(event.get('body', '{}'))
@@ -64,6 +72,13 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
     
+    except InvalidCursorError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -72,6 +87,23 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
+def cached_read(params: dict, read, *args) -> dict:
+    """Ответ из кэша инстанса или от read(*args); кэшируются только ответы 200"""
+    body, version = response_cache.get('blog', params)
+    if body is not None:
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'X-Cache': 'HIT'},
+            'body': body,
+            'isBase64Encoded': False
+        }
+    
+    response = read(*args)
+    if response['statusCode'] == 200:
+        response_cache.put('blog', params, response['body'], version)
+        response['headers']['X-Cache'] = 'MISS'
+    return response
+
 def get_posts(query_params: dict) -> dict:
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -81,34 +113,35 @@ def get_posts(query_params: dict) -> dict:
     limit = int(query_params.get('limit', 50))
     offset = int(query_params.get('offset', 0))
     
+    where_clauses = ['p.is_draft = %s']
+    params = [is_draft]
+    
     if tag:
-        cur.execute('''
-            SELECT DISTINCT p.*, u.name as author_name, u.avatar_url as author_avatar,
-                   ARRAY_AGG(DISTINCT t.tag) FILTER (WHERE t.tag IS NOT NULL) as tags
-            FROM t_p13705114_spa_community_portal.blog_posts p
-            LEFT JOIN t_p13705114_spa_community_portal.users u ON p.author_id = u.id
-            LEFT JOIN t_p13705114_spa_community_portal.blog_post_tags t ON p.id = t.post_id
-            WHERE p.is_draft = %s AND p.id IN (
-                SELECT post_id FROM blog_post_tags WHERE tag = %s
-            )
-            GROUP BY p.id, u.name, u.avatar_url
-            ORDER BY COALESCE(p.published_at, p.updated_at, p.created_at) DESC
-            LIMIT %s OFFSET %s
-        ''', (is_draft, tag, limit, offset))
-    else:
-        cur.execute('''
-            SELECT p.*, u.name as author_name, u.avatar_url as author_avatar,
-                   ARRAY_AGG(DISTINCT t.tag) FILTER (WHERE t.tag IS NOT NULL) as tags
-            FROM t_p13705114_spa_community_portal.blog_posts p
-            LEFT JOIN t_p13705114_spa_community_portal.users u ON p.author_id = u.id
-            LEFT JOIN t_p13705114_spa_community_portal.blog_post_tags t ON p.id = t.post_id
-            WHERE p.is_draft = %s
-            GROUP BY p.id, u.name, u.avatar_url
-            ORDER BY COALESCE(p.published_at, p.updated_at, p.created_at) DESC
-            LIMIT %s OFFSET %s
-        ''', (is_draft, limit, offset))
-    
-    posts = cur.fetchall()
+        where_clauses.append('p.id IN (SELECT post_id FROM t_p13705114_spa_community_portal.blog_post_tags WHERE tag = %s)')
+        params.append(tag)
+    
+    cursor = query_params.get('cursor')
+    if cursor:
+        # Keyset: страница сразу после последнего поста предыдущей
+        condition, condition_params = keyset_condition(POSTS_ORDER, decode_cursor(cursor, 'published', POSTS_ORDER))
+        where_clauses.append(condition)
+        params.extend(condition_params)
+        offset = 0
+    
+    cur.execute(f'''
+        SELECT p.*, u.name as author_name, u.avatar_url as author_avatar,
+               ARRAY_AGG(DISTINCT t.tag) FILTER (WHERE t.tag IS NOT NULL) as tags,
+               {sort_key_sql(POSTS_ORDER)}
+        FROM t_p13705114_spa_community_portal.blog_posts p
+        LEFT JOIN t_p13705114_spa_community_portal.users u ON p.author_id = u.id
+        LEFT JOIN t_p13705114_spa_community_portal.blog_post_tags t ON p.id = t.post_id
+        WHERE {' AND '.join(where_clauses)}
+        GROUP BY p.id, u.name, u.avatar_url
+        {order_by_sql(POSTS_ORDER)}
+        LIMIT %s OFFSET %s
+    ''', params + [limit + 1, offset])
+    
+    posts, next_cursor = split_page(cur.fetchall(), limit, 'published', POSTS_ORDER)
     
     for post in posts:
         if post['tags'] is None:
@@ -120,7 +153,7 @@ def get_posts(query_params: dict) -> dict:
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'posts': posts}, default=str),
+        'body': json.dumps({'posts': posts, 'next_cursor': next_cursor}, default=str),
         'isBase64Encoded': False
     }
 
@@ -210,6 +243,7 @@ def create_post(body: dict, event: dict) -> dict:
             ON CONFLICT DO NOTHING
         ''', (post_id, tag))
     
+    response_cache.bump(cur, 'blog')
     conn.commit()
     cur.close()
     conn.close()
@@ -297,6 +331,7 @@ def update_post(post_id: str, body: dict, event: dict) -> dict:
                 ON CONFLICT DO NOTHING
             ''', (post_id, tag))
     
+    response_cache.bump(cur, 'blog')
     conn.commit()
     cur.close()
     conn.close()
@@ -408,6 +443,7 @@ def create_comment(body: dict, event: dict) -> dict:
     
     comment_id = cur.fetchone()['id']
     
+    response_cache.bump(cur, 'blog')
     conn.commit()
     cur.close()
     conn.close()
@@ -431,12 +467,19 @@ def get_user_id_from_token(event: dict) -> int:
     if not token:
         return None
     
+    if jwt_auth.is_jwt(token):
+        return jwt_auth.verify(token)
+    
+    user_id = session_cache.get(token)
+    if user_id:
+        return user_id
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         cur.execute('''
-            SELECT user_id FROM t_p13705114_spa_community_portal.user_sessions
+            SELECT user_id, expires_at FROM t_p13705114_spa_community_portal.user_sessions
             WHERE session_token = %s AND expires_at > CURRENT_TIMESTAMP
         ''', (token,))
         
@@ -445,6 +488,7 @@ def get_user_id_from_token(event: dict) -> int:
         conn.close()
         
         if result:
+            session_cache.put(token, result[0], result[1])
             return result[0]
     except:
         pass
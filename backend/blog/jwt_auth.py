@@ -0,0 +1,115 @@
+"""
+Stateless-проверка access токенов в формате JWT (HS256).
+Подпись и срок действия проверяются локально, в БД хранится только denylist
+отозванных jti — он перечитывается не чаще раза в JWT_DENYLIST_REFRESH секунд.
+Режим включается переменной JWT_SECRET; без неё работает прежняя схема с session_token.
+"""
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+import jwt
+from db import get_connection
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+JWT_SECRET = os.environ.get('JWT_SECRET')
+JWT_ALGORITHM = 'HS256'
+JWT_DENYLIST_REFRESH = int(os.environ.get('JWT_DENYLIST_REFRESH', '10'))
+
+_revoked = set()
+_revoked_loaded_at = None
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(JWT_SECRET)
+
+
+def is_jwt(token: str) -> bool:
+    """Токен выглядит как JWT и проверка подписи включена"""
+    return enabled() and bool(token) and token.count('.') == 2
+
+
+def create_access_token(user_id: int, expires_at: datetime) -> tuple[str, str]:
+    """
+    Выпуск access токена
+
+    Returns:
+        (token, jti) — jti сохраняется в user_sessions.session_token
+    """
+    jti = secrets.token_urlsafe(16)
+    payload = {
+        'sub': str(user_id),
+        'type': 'access',
+        'jti': jti,
+        'iat': int(time.time()),
+        'exp': int(expires_at.timestamp())
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM), jti
+
+
+def decode(token: str, verify_exp: bool = True) -> Optional[dict]:
+    """Проверка подписи (и срока действия) без обращения к БД"""
+    try:
+        payload = jwt.decode(
+            token, JWT_SECRET, algorithms=[JWT_ALGORITHM],
+            options={'verify_exp': verify_exp, 'require': ['sub', 'jti', 'exp']}
+        )
+    except jwt.InvalidTokenError:
+        return None
+    if payload.get('type') != 'access':
+        return None
+    return payload
+
+
+def _load_denylist() -> set:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT jti FROM {SCHEMA}.revoked_tokens WHERE expires_at > NOW()")
+            return {row[0] for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def is_revoked(jti: str) -> bool:
+    """Проверка jti по denylist, закэшированному на инстансе"""
+    global _revoked, _revoked_loaded_at
+    now = time.monotonic()
+    if _revoked_loaded_at is None or now - _revoked_loaded_at >= JWT_DENYLIST_REFRESH:
+        try:
+            revoked = _load_denylist()
+        except Exception:
+            # Без denylist токенам доверять нельзя, пока он ни разу не загружен
+            if _revoked_loaded_at is None:
+                return True
+        else:
+            with _lock:
+                _revoked = revoked
+                _revoked_loaded_at = now
+    return jti in _revoked
+
+
+def verify(token: str) -> Optional[int]:
+    """user_id из валидного и не отозванного access токена"""
+    payload = decode(token)
+    if not payload or is_revoked(payload['jti']):
+        return None
+    try:
+        return int(payload['sub'])
+    except (TypeError, ValueError):
+        return None
+
+
+def revoke(cur, jti: str, expires_at: datetime) -> None:
+    """Добавление jti в denylist в транзакции вызывающего"""
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.revoked_tokens (jti, expires_at)
+        VALUES (%s, %s)
+        ON CONFLICT (jti) DO NOTHING
+    """, (jti, expires_at))
+    with _lock:
+        _revoked.add(jti)
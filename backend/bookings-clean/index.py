@@ -3,18 +3,18 @@ API для управления бронированиями бань и мас
 Требует авторизации.
 """
 import json
-import os
-import psycopg2
+from psycopg2 import errors
 from psycopg2.extras import RealDictCursor
-from datetime import datetime, time
+from datetime import date, datetime, time, timedelta
+from db import get_connection
+import jwt_auth
 
 SCHEMA = 't_p13705114_spa_community_portal'
 
 
 def get_db_connection():
     """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
 
 
 def get_user_id_from_token(headers: dict) -> int:
@@ -23,6 +23,13 @@ def get_user_id_from_token(headers: dict) -> int:
     if not token:
         raise ValueError('Требуется авторизация')
     
+    # JWT от функции auth: в user_sessions.session_token лежит только jti
+    if jwt_auth.is_jwt(token):
+        user_id = jwt_auth.verify(token)
+        if not user_id:
+            raise ValueError('Невалидный токен')
+        return user_id
+    
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
@@ -204,6 +211,12 @@ def get_booking_details(user_id: int, booking_id: str) -> dict:
         conn.close()
 
 
+def booking_slot(booking_date: date, start_time: time, end_time: time) -> tuple[datetime, datetime]:
+    """Границы слота [начало, конец) — так же считается колонка slot в БД"""
+    end_date = booking_date if end_time > start_time else booking_date + timedelta(days=1)
+    return datetime.combine(booking_date, start_time), datetime.combine(end_date, end_time)
+
+
 def create_booking(user_id: int, data: dict) -> dict:
     """Создание бронирования"""
     booking_type = data.get('booking_type')
@@ -221,38 +234,48 @@ def create_booking(user_id: int, data: dict) -> dict:
     if booking_type not in ['bath', 'master']:
         raise ValueError('Некорректный тип бронирования')
     
+    try:
+        slot_start, slot_end = booking_slot(
+            date.fromisoformat(booking_date), time.fromisoformat(start_time), time.fromisoformat(end_time)
+        )
+    except (TypeError, ValueError):
+        raise ValueError('Некорректный формат даты или времени')
+    
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Проверка на конфликт времени
+            # Проверка на конфликт времени: пересечение по GiST-индексу колонки slot
             cursor.execute(
                 f"""
                 SELECT id FROM {SCHEMA}.bath_master_bookings
                 WHERE booking_type = %s 
                   AND entity_id = %s 
-                  AND booking_date = %s
-                  AND start_time < %s
-                  AND end_time > %s
+                  AND slot && tsrange(%s, %s, '[)')
                   AND status IN ('pending', 'confirmed')
+                LIMIT 1
                 """,
-                (booking_type, entity_id, booking_date, end_time, start_time)
+                (booking_type, entity_id, slot_start, slot_end)
             )
             
             if cursor.fetchone():
                 raise ValueError('Это время уже забронировано')
             
-            # Создание бронирования
-            cursor.execute(
-                f"""
-                INSERT INTO {SCHEMA}.bath_master_bookings
-                (user_id, booking_type, entity_id, booking_date, start_time, end_time,
-                 guests_count, total_price, status, notes)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s)
-                RETURNING id, created_at
-                """,
-                (user_id, booking_type, entity_id, booking_date, start_time, end_time,
-                 guests_count, total_price, notes)
-            )
+            # Создание бронирования; одновременную вставку отсекает ограничение исключения
+            try:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {SCHEMA}.bath_master_bookings
+                    (user_id, booking_type, entity_id, booking_date, start_time, end_time,
+                     guests_count, total_price, status, notes)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s)
+                    RETURNING id, created_at
+                    """,
+                    (user_id, booking_type, entity_id, booking_date, start_time, end_time,
+                     guests_count, total_price, notes)
+                )
+            except errors.ExclusionViolation:
+                conn.rollback()
+                raise ValueError('Это время уже забронировано')
             
             result = cursor.fetchone()
             conn.commit()
@@ -0,0 +1,166 @@
+"""
+Сетка занятости бани или мастера за период.
+Бронирования и availability_slots читаются одним запросом, интервалы сливаются в Python
+и раскладываются по ячейкам заданной длины; сетка отдаётся как RLE или битовая маска.
+
+Правила: день без строк в availability_slots открыт целиком (как и при создании
+бронирования), день со строками открыт только в слотах is_available = true.
+Ячейка свободна, если целиком лежит в открытом интервале и не пересекается
+с pending/confirmed бронированием или закрытым слотом.
+"""
+import base64
+import os
+from datetime import date, datetime, time, timedelta
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+AVAILABILITY_MAX_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', '62'))
+
+GRANULARITIES = {'15m': 15, '30m': 30, '60m': 60, '1h': 60}
+ENCODINGS = ('rle', 'bitmap')
+
+
+def parse_request(params: dict) -> dict:
+    """Проверка параметров запроса сетки; ValueError с текстом для ответа 400"""
+    booking_type = params.get('type')
+    if booking_type not in ('bath', 'master'):
+        raise ValueError('Некорректный тип: используйте bath или master')
+    try:
+        entity_id = int(params.get('id'))
+        date_from = date.fromisoformat(params.get('from'))
+        date_to = date.fromisoformat(params.get('to'))
+    except (TypeError, ValueError):
+        raise ValueError('Требуются параметры id, from и to (YYYY-MM-DD)')
+    if date_to < date_from:
+        raise ValueError('Дата to раньше from')
+    if (date_to - date_from).days + 1 > AVAILABILITY_MAX_DAYS:
+        raise ValueError(f'Период не может быть длиннее {AVAILABILITY_MAX_DAYS} дней')
+    granularity = GRANULARITIES.get(params.get('granularity', '30m'))
+    if not granularity:
+        raise ValueError('Некорректный granularity: ' + ', '.join(GRANULARITIES))
+    encoding = params.get('encoding', 'rle')
+    if encoding not in ENCODINGS:
+        raise ValueError('Некорректный encoding: ' + ', '.join(ENCODINGS))
+    return {
+        'type': booking_type,
+        'id': entity_id,
+        'from': date_from,
+        'to': date_to,
+        'granularity': granularity,
+        'encoding': encoding
+    }
+
+
+def fetch_intervals(conn, booking_type: str, entity_id: int, range_start: datetime, range_end: datetime) -> list:
+    """Бронирования и слоты расписания за период одним запросом: [(kind, starts_at, ends_at, slot_date)]"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT 'busy' AS kind, lower(slot) AS starts_at, upper(slot) AS ends_at, NULL::date AS slot_date
+            FROM {SCHEMA}.bath_master_bookings
+            WHERE booking_type = %s
+              AND entity_id = %s
+              AND slot && tsrange(%s, %s, '[)')
+              AND status IN ('pending', 'confirmed')
+            UNION ALL
+            SELECT CASE WHEN is_available THEN 'open' ELSE 'busy' END,
+                   slot_date + start_time,
+                   CASE WHEN end_time > start_time THEN slot_date + end_time
+                        ELSE (slot_date + 1) + end_time END,
+                   slot_date
+            FROM {SCHEMA}.availability_slots
+            WHERE entity_type = %s
+              AND entity_id = %s
+              AND slot_date BETWEEN %s AND %s
+        """, (booking_type, entity_id, range_start, range_end,
+              booking_type, entity_id, range_start.date() - timedelta(days=1), range_end.date()))
+        rows = cur.fetchall()
+    return [
+        (row['kind'], row['starts_at'], row['ends_at'], row['slot_date']) if isinstance(row, dict) else tuple(row)
+        for row in rows
+    ]
+
+
+def merge_intervals(intervals: list) -> list:
+    """Слияние пересекающихся и смежных интервалов [start, end)"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def build_grid(intervals: list, date_from: date, date_to: date, granularity: int) -> bytearray:
+    """Сетка 1 — свободно, 0 — занято/закрыто; ячейка = granularity минут"""
+    range_start = datetime.combine(date_from, time.min)
+    days = (date_to - date_from).days + 1
+    total = days * 24 * 60
+
+    def minutes(moment: datetime) -> int:
+        offset = int((moment - range_start).total_seconds() // 60)
+        return min(max(offset, 0), total)
+
+    scheduled_days = {slot_date for _, _, _, slot_date in intervals if slot_date is not None}
+    open_intervals = [
+        (minutes(starts_at), minutes(ends_at)) for kind, starts_at, ends_at, _ in intervals if kind == 'open'
+    ]
+    for day in range(days):
+        if date_from + timedelta(days=day) not in scheduled_days:
+            open_intervals.append((day * 1440, (day + 1) * 1440))
+    busy_intervals = [
+        (minutes(starts_at), minutes(ends_at)) for kind, starts_at, ends_at, _ in intervals if kind == 'busy'
+    ]
+
+    cells = total // granularity
+    grid = bytearray(cells)
+    for start, end in merge_intervals(open_intervals):
+        # Свободными могут быть только ячейки, целиком попавшие в открытый интервал
+        for cell in range(-(-start // granularity), end // granularity):
+            grid[cell] = 1
+    for start, end in merge_intervals(busy_intervals):
+        for cell in range(start // granularity, -(-end // granularity)):
+            grid[cell] = 0
+    return grid
+
+
+def encode_rle(grid: bytearray) -> dict:
+    """Длины серий одинаковых ячеек; первая серия — свободная, если starts_free"""
+    runs = []
+    previous = None
+    for cell in grid:
+        if runs and cell == previous:
+            runs[-1] += 1
+        else:
+            runs.append(1)
+            previous = cell
+    return {'starts_free': bool(grid) and grid[0] == 1, 'runs': runs}
+
+
+def encode_bitmap(grid: bytearray) -> dict:
+    """Бит на ячейку (старший бит первого байта — первая ячейка), base64"""
+    packed = bytearray((len(grid) + 7) // 8)
+    for i, cell in enumerate(grid):
+        if cell:
+            packed[i // 8] |= 0x80 >> (i % 8)
+    return {'bitmap': base64.b64encode(bytes(packed)).decode()}
+
+
+def get_availability(conn, request: dict) -> dict:
+    range_start = datetime.combine(request['from'], time.min)
+    range_end = datetime.combine(request['to'] + timedelta(days=1), time.min)
+    intervals = fetch_intervals(conn, request['type'], request['id'], range_start, range_end)
+    grid = build_grid(intervals, request['from'], request['to'], request['granularity'])
+
+    payload = encode_rle(grid) if request['encoding'] == 'rle' else encode_bitmap(grid)
+    return {
+        'type': request['type'],
+        'id': request['id'],
+        'from': request['from'].isoformat(),
+        'to': request['to'].isoformat(),
+        'granularity': request['granularity'],
+        'cells_per_day': 24 * 60 // request['granularity'],
+        'cells': len(grid),
+        'encoding': request['encoding'],
+        **payload
+    }
@@ -0,0 +1,127 @@
+"""
+Групповое бронирование: несколько бань/мастеров или сеансов одним запросом.
+Все позиции проверяются и создаются в одной транзакции — либо все, либо ни одной.
+Стоимость считает pricing по тарифам из памяти инстанса, пересечения с существующими
+бронированиями ищутся одним запросом по всем слотам, вставка — execute_values. Гонку с параллельными
+бронированиями закрывает ограничение bath_master_bookings_no_overlap.
+"""
+import os
+from datetime import date, datetime
+from psycopg2.extras import execute_values
+import pricing
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+BOOKING_BATCH_MAX_ITEMS = int(os.environ.get('BOOKING_BATCH_MAX_ITEMS', '20'))
+
+REQUIRED_FIELDS = ('booking_type', 'entity_id', 'booking_date', 'start_time', 'end_time')
+
+
+def parse_items(data: dict) -> list:
+    """
+    Проверка позиций пакета (те же правила, что и у одиночного бронирования);
+    ValueError с текстом для ответа 400
+    """
+    items = data.get('bookings')
+    if not isinstance(items, list) or not items:
+        raise ValueError('Требуется непустой список bookings')
+    if len(items) > BOOKING_BATCH_MAX_ITEMS:
+        raise ValueError(f'В пакете не больше {BOOKING_BATCH_MAX_ITEMS} бронирований')
+
+    parsed = []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not all(item.get(field) for field in REQUIRED_FIELDS):
+            raise ValueError(f'Бронирование #{number}: отсутствуют обязательные поля')
+        if item['booking_type'] not in ('bath', 'master'):
+            raise ValueError(f'Бронирование #{number}: некорректный тип бронирования')
+        try:
+            entity_id = int(item['entity_id'])
+            booking_date = datetime.strptime(item['booking_date'], '%Y-%m-%d').date()
+            start_time = datetime.strptime(item['start_time'], '%H:%M').time()
+            end_time = datetime.strptime(item['end_time'], '%H:%M').time()
+        except (TypeError, ValueError):
+            raise ValueError(f'Бронирование #{number}: некорректный формат даты или времени')
+        if booking_date < date.today():
+            raise ValueError(f'Бронирование #{number}: дата бронирования должна быть в будущем')
+        if end_time <= start_time:
+            raise ValueError(f'Бронирование #{number}: время окончания должно быть больше времени начала')
+        if item.get('schedule_id') and not pricing.is_schedule_id(item['schedule_id']):
+            raise ValueError(f'Бронирование #{number}: некорректный schedule_id')
+
+        parsed.append({
+            'booking_type': item['booking_type'],
+            'entity_id': entity_id,
+            'booking_date': booking_date,
+            'start_time': start_time,
+            'end_time': end_time,
+            'starts_at': datetime.combine(booking_date, start_time),
+            'ends_at': datetime.combine(booking_date, end_time),
+            'guests_count': item.get('guests_count', 1),
+            'notes': item.get('notes', ''),
+            'service': item.get('service'),
+            'schedule_id': item.get('schedule_id')
+        })
+
+    check_internal_overlaps(parsed)
+    return parsed
+
+
+def check_internal_overlaps(items: list) -> None:
+    """Позиции пакета не должны пересекаться между собой по одной бане/мастеру"""
+    by_entity = {}
+    for number, item in enumerate(items, start=1):
+        by_entity.setdefault((item['booking_type'], item['entity_id']), []).append((item['starts_at'], item['ends_at'], number))
+    for slots in by_entity.values():
+        slots.sort()
+        for (_, previous_end, previous_number), (start, _, number) in zip(slots, slots[1:]):
+            if start < previous_end:
+                raise ValueError(f'Бронирования #{previous_number} и #{number} пересекаются по времени')
+
+
+def find_conflicts(conn, items: list) -> list:
+    """Номера позиций (с 1), слот которых уже занят, — один запрос по GiST-индексу для всех слотов"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT i.number
+            FROM unnest(%s::int[], %s::varchar[], %s::int[], %s::timestamp[], %s::timestamp[])
+                AS i(number, booking_type, entity_id, starts_at, ends_at)
+            WHERE EXISTS (
+                SELECT 1
+                FROM {SCHEMA}.bath_master_bookings b
+                WHERE b.booking_type = i.booking_type
+                  AND b.entity_id = i.entity_id
+                  AND b.slot && tsrange(i.starts_at, i.ends_at, '[)')
+                  AND b.status IN ('pending', 'confirmed')
+            )
+            ORDER BY i.number
+        """, (
+            list(range(1, len(items) + 1)),
+            [item['booking_type'] for item in items],
+            [item['entity_id'] for item in items],
+            [item['starts_at'] for item in items],
+            [item['ends_at'] for item in items]
+        ))
+        return [row['number'] for row in cur.fetchall()]
+
+
+def insert_bookings(conn, user_id: int, items: list) -> list:
+    """
+    Вставка всех позиций одним INSERT в транзакции вызывающего
+
+    Returns:
+        [{id, created_at}] в порядке позиций пакета
+    """
+    rows = [
+        (user_id, item['booking_type'], item['entity_id'], item['booking_date'], item['start_time'],
+         item['end_time'], item['guests_count'], item['total_price'], 'pending', item['notes'])
+        for item in items
+    ]
+    with conn.cursor() as cur:
+        # page_size не меньше размера пакета: один INSERT, RETURNING в порядке VALUES
+        return execute_values(cur, f"""
+            INSERT INTO {SCHEMA}.bath_master_bookings
+            (user_id, booking_type, entity_id, booking_date, start_time, end_time,
+             guests_count, total_price, status, notes)
+            VALUES %s
+            RETURNING id, created_at
+        """, rows, page_size=len(rows), fetch=True)
@@ -3,86 +3,128 @@ API для управления бронированиями бань и усл
 Поддерживает создание, просмотр, изменение и отмену бронирований.
 """
 import json
-import os
 from datetime import datetime, date, time, timedelta
 from typing import Optional
-import psycopg2
+from psycopg2 import errors
 from psycopg2.extras import RealDictCursor
+from db import get_connection
+import session_cache
+import jwt_auth
+import availability
+import batch
+import pricing
 
 SCHEMA = 't_p13705114_spa_community_portal'
 
 def get_db_connection():
     """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    return get_connection(cursor_factory=RealDictCursor)
 
-def get_user_from_token(token: str) -> Optional[dict]:
-    """Получение пользователя по токену"""
-    if not token:
+class BookingRequest:
+    """
+    Единица работы одного запроса: одно соединение на авторизацию и все запросы,
+    один commit в конце (rollback при исключении).
+    """
+
+    def __init__(self, event: dict):
+        self.event = event
+        self.user = None
+        self._conn = None
+
+    @property
+    def conn(self):
+        """Соединение берётся из пула при первом обращении"""
+        if self._conn is None:
+            self._conn = get_db_connection()
+        return self._conn
+
+    def authenticate(self) -> Optional[dict]:
+        """Получение пользователя по токену из заголовка X-Authorization"""
+        auth_header = self.event.get('headers', {}).get('x-authorization', '')
+        token = auth_header.replace('Bearer ', '') if auth_header else None
+        self.user = get_user_from_token(self.conn, token) if token else None
+        return self.user
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is None:
+            return False
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self._conn.close()
+            self._conn = None
+        return False
+
+def get_user_from_token(conn, token: str) -> Optional[dict]:
+    """Получение пользователя по токену (с кэшем на тёплом инстансе)"""
+    if jwt_auth.is_jwt(token):
+        user_id = jwt_auth.verify(token)
+        return {'id': user_id} if user_id else None
+    
+    user = session_cache.get(token)
+    if user:
+        return user
+    
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT u.id, u.email, u.first_name, u.last_name, s.expires_at
+            FROM {SCHEMA}.user_sessions s
+            JOIN {SCHEMA}.users u ON u.id = s.user_id
+            WHERE s.access_token = %s AND s.expires_at > NOW()
+        """, (token,))
+        row = cur.fetchone()
+    
+    if not row:
         return None
     
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(f"""
-                SELECT u.id, u.email, u.first_name, u.last_name
-                FROM {SCHEMA}.user_sessions s
-                JOIN {SCHEMA}.users u ON u.id = s.user_id
-                WHERE s.access_token = %s AND s.expires_at > NOW()
-            """, (token,))
-            return cur.fetchone()
-    finally:
-        conn.close()
+    user = dict(row)
+    session_cache.put(token, user, user.pop('expires_at'))
+    return user
+
+def booking_slot(booking_date: date, start_time: time, end_time: time) -> tuple[datetime, datetime]:
+    """Границы слота [начало, конец) — так же считается колонка slot в БД"""
+    end_date = booking_date if end_time > start_time else booking_date + timedelta(days=1)
+    return datetime.combine(booking_date, start_time), datetime.combine(end_date, end_time)
 
 def check_time_slot_available(conn, booking_type: str, entity_id: int, booking_date: date, 
                                start_time: time, end_time: time, exclude_booking_id: int = None) -> bool:
-    """Проверка доступности временного слота"""
+    """
+    Проверка доступности временного слота.
+    Пересечение ищется по GiST-индексу ограничения bath_master_bookings_no_overlap;
+    гонку двух одновременных бронирований закрывает само ограничение при INSERT.
+    """
+    slot_start, slot_end = booking_slot(booking_date, start_time, end_time)
     with conn.cursor() as cur:
         query = f"""
-            SELECT COUNT(*) as count
+            SELECT 1
             FROM {SCHEMA}.bath_master_bookings
             WHERE booking_type = %s 
               AND entity_id = %s 
-              AND booking_date = %s
+              AND slot && tsrange(%s, %s, '[)')
               AND status IN ('pending', 'confirmed')
-              AND (
-                (start_time < %s AND end_time > %s) OR
-                (start_time < %s AND end_time > %s) OR
-                (start_time >= %s AND end_time <= %s)
-              )
         """
-        params = [booking_type, entity_id, booking_date, end_time, start_time, 
-                  end_time, start_time, start_time, end_time]
+        params = [booking_type, entity_id, slot_start, slot_end]
         
         if exclude_booking_id:
             query += " AND id != %s"
             params.append(exclude_booking_id)
         
-        cur.execute(query, params)
-        result = cur.fetchone()
-        return result['count'] == 0
-
-def get_entity_price(conn, booking_type: str, entity_id: int) -> Optional[int]:
-    """Получение цены за час для бани или мастера"""
-    with conn.cursor() as cur:
-        if booking_type == 'bath':
-            cur.execute(f"SELECT price_per_hour FROM {SCHEMA}.baths WHERE id = %s", (entity_id,))
-        else:
-            cur.execute(f"""
-                SELECT (services->0->>'price')::integer as price_per_hour 
-                FROM {SCHEMA}.masters 
-                WHERE id = %s AND services IS NOT NULL AND jsonb_array_length(services) > 0
-            """, (entity_id,))
-        
-        result = cur.fetchone()
-        return result['price_per_hour'] if result else None
+        cur.execute(query + " LIMIT 1", params)
+        return cur.fetchone() is None
 
-def calculate_hours(start_time: time, end_time: time) -> float:
-    """Вычисление количества часов между временем"""
-    start_dt = datetime.combine(date.today(), start_time)
-    end_dt = datetime.combine(date.today(), end_time)
-    diff = end_dt - start_dt
-    return diff.total_seconds() / 3600
+def slot_taken_response() -> dict:
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Выбранный временной слот уже занят'}),
+        'isBase64Encoded': False
+    }
 
 def handler(event: dict, context) -> dict:
     """Обработчик HTTP запросов для работы с бронированиями"""
@@ -128,240 +170,271 @@ def handle_get(event: dict) -> dict:
     """Получение бронирований"""
     params = event.get('queryStringParameters') or {}
     
-    # Проверка авторизации
-    auth_header = event.get('headers', {}).get('x-authorization', '')
-    token = auth_header.replace('Bearer ', '') if auth_header else None
-    user = get_user_from_token(token)
+    if params.get('action') == 'availability':
+        return handle_availability(event, params)
     
-    if not user:
+    with BookingRequest(event) as req:
+        # Проверка авторизации
+        user = req.authenticate()
+        
+        if not user:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+        
+        booking_id = params.get('id')
+        if booking_id:
+            return get_booking_by_id(req.conn, int(booking_id), user['id'])
+        
+        # Получение списка бронирований пользователя
+        return get_user_bookings(req.conn, user['id'], params)
+
+def handle_availability(event: dict, params: dict) -> dict:
+    """Сетка свободного времени бани или мастера за период (без авторизации)"""
+    try:
+        request = availability.parse_request(params)
+    except ValueError as e:
         return {
-            'statusCode': 401,
+            'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Требуется авторизация'}),
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
             'isBase64Encoded': False
         }
     
-    booking_id = params.get('id')
-    if booking_id:
-        return get_booking_by_id(int(booking_id), user['id'])
+    with BookingRequest(event) as req:
+        grid = availability.get_availability(req.conn, request)
     
-    # Получение списка бронирований пользователя
-    return get_user_bookings(user['id'], params)
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(grid),
+        'isBase64Encoded': False
+    }
 
-def get_booking_by_id(booking_id: int, user_id: int) -> dict:
+def get_booking_by_id(conn, booking_id: int, user_id: int) -> dict:
     """Получение конкретного бронирования"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(f"""
-                SELECT b.*, 
-                       CASE 
-                         WHEN b.booking_type = 'bath' THEN ba.name
-                         ELSE m.name
-                       END as entity_name,
-                       CASE 
-                         WHEN b.booking_type = 'bath' THEN ba.address
-                         ELSE NULL
-                       END as entity_address
-                FROM {SCHEMA}.bath_master_bookings b
-                LEFT JOIN {SCHEMA}.baths ba ON b.booking_type = 'bath' AND b.entity_id = ba.id
-                LEFT JOIN {SCHEMA}.masters m ON b.booking_type = 'master' AND b.entity_id = m.id
-                WHERE b.id = %s AND b.user_id = %s
-            """, (booking_id, user_id))
-            
-            booking = cur.fetchone()
-            if not booking:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Бронирование не найдено'}),
-                    'isBase64Encoded': False
-                }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(dict(booking), default=str),
-                'isBase64Encoded': False
-            }
-    finally:
-        conn.close()
-
-def get_user_bookings(user_id: int, params: dict) -> dict:
-    """Получение списка бронирований пользователя"""
-    conn = get_db_connection()
-    try:
-        # Фильтры
-        status = params.get('status')
-        booking_type = params.get('type')
-        date_from = params.get('date_from')
-        date_to = params.get('date_to')
-        
-        # Пагинация
-        limit = min(int(params.get('limit', 20)), 100)
-        offset = int(params.get('offset', 0))
-        
-        where_clauses = ['b.user_id = %s']
-        query_params = [user_id]
-        
-        if status:
-            where_clauses.append('b.status = %s')
-            query_params.append(status)
-        
-        if booking_type:
-            where_clauses.append('b.booking_type = %s')
-            query_params.append(booking_type)
-        
-        if date_from:
-            where_clauses.append('b.booking_date >= %s')
-            query_params.append(date_from)
-        
-        if date_to:
-            where_clauses.append('b.booking_date <= %s')
-            query_params.append(date_to)
-        
-        where_sql = ' AND '.join(where_clauses)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT b.*, 
+                   CASE 
+                     WHEN b.booking_type = 'bath' THEN ba.name
+                     ELSE m.name
+                   END as entity_name,
+                   CASE 
+                     WHEN b.booking_type = 'bath' THEN ba.address
+                     ELSE NULL
+                   END as entity_address
+            FROM {SCHEMA}.bath_master_bookings b
+            LEFT JOIN {SCHEMA}.baths ba ON b.booking_type = 'bath' AND b.entity_id = ba.id
+            LEFT JOIN {SCHEMA}.masters m ON b.booking_type = 'master' AND b.entity_id = m.id
+            WHERE b.id = %s AND b.user_id = %s
+        """, (booking_id, user_id))
         
-        with conn.cursor() as cur:
-            # Получаем общее количество
-            cur.execute(f"""
-                SELECT COUNT(*) as total
-                FROM {SCHEMA}.bath_master_bookings b
-                WHERE {where_sql}
-            """, query_params)
-            total = cur.fetchone()['total']
-            
-            # Получаем бронирования
-            cur.execute(f"""
-                SELECT b.*,
-                       CASE 
-                         WHEN b.booking_type = 'bath' THEN ba.name
-                         ELSE m.name
-                       END as entity_name,
-                       CASE 
-                         WHEN b.booking_type = 'bath' THEN ba.address
-                         ELSE m.specialization
-                       END as entity_info
-                FROM {SCHEMA}.bath_master_bookings b
-                LEFT JOIN {SCHEMA}.baths ba ON b.booking_type = 'bath' AND b.entity_id = ba.id
-                LEFT JOIN {SCHEMA}.masters m ON b.booking_type = 'master' AND b.entity_id = m.id
-                WHERE {where_sql}
-                ORDER BY b.booking_date DESC, b.start_time DESC
-                LIMIT %s OFFSET %s
-            """, query_params + [limit, offset])
-            
-            bookings = cur.fetchall()
-            
+        booking = cur.fetchone()
+        if not booking:
             return {
-                'statusCode': 200,
+                'statusCode': 404,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'items': [dict(b) for b in bookings],
-                    'total': total,
-                    'limit': limit,
-                    'offset': offset
-                }, default=str),
+                'body': json.dumps({'error': 'Бронирование не найдено'}),
                 'isBase64Encoded': False
             }
-    finally:
-        conn.close()
-
-def handle_post(event: dict) -> dict:
-    """Создание нового бронирования"""
-    # Проверка авторизации
-    auth_header = event.get('headers', {}).get('x-authorization', '')
-    token = auth_header.replace('Bearer ', '') if auth_header else None
-    user = get_user_from_token(token)
-    
-    if not user:
+        
         return {
-            'statusCode': 401,
+            'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Требуется авторизация'}),
+            'body': json.dumps(dict(booking), default=str),
             'isBase64Encoded': False
         }
+
+def get_user_bookings(conn, user_id: int, params: dict) -> dict:
+    """Получение списка бронирований пользователя"""
+    # Фильтры
+    status = params.get('status')
+    booking_type = params.get('type')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
     
-    try:
-        data = json.loads(event.get('body', '{}'))
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Некорректный JSON'}),
-            'isBase64Encoded': False
-        }
+    # Пагинация
+    limit = min(int(params.get('limit', 20)), 100)
+    offset = int(params.get('offset', 0))
     
-    # Валидация
-    booking_type = data.get('booking_type')
-    entity_id = data.get('entity_id')
-    booking_date = data.get('booking_date')
-    start_time = data.get('start_time')
-    end_time = data.get('end_time')
-    guests_count = data.get('guests_count', 1)
-    notes = data.get('notes', '')
+    where_clauses = ['b.user_id = %s']
+    query_params = [user_id]
     
-    if not all([booking_type, entity_id, booking_date, start_time, end_time]):
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Отсутствуют обязательные поля'}),
-            'isBase64Encoded': False
-        }
+    if status:
+        where_clauses.append('b.status = %s')
+        query_params.append(status)
     
-    if booking_type not in ['bath', 'master']:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Некорректный тип бронирования'}),
-            'isBase64Encoded': False
-        }
+    if booking_type:
+        where_clauses.append('b.booking_type = %s')
+        query_params.append(booking_type)
     
-    # Парсим дату и время
-    try:
-        booking_date_obj = datetime.strptime(booking_date, '%Y-%m-%d').date()
-        start_time_obj = datetime.strptime(start_time, '%H:%M').time()
-        end_time_obj = datetime.strptime(end_time, '%H:%M').time()
-    except ValueError:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Некорректный формат даты или времени'}),
-            'isBase64Encoded': False
-        }
+    if date_from:
+        where_clauses.append('b.booking_date >= %s')
+        query_params.append(date_from)
     
-    # Проверка что дата в будущем
-    if booking_date_obj < date.today():
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Дата бронирования должна быть в будущем'}),
-            'isBase64Encoded': False
-        }
+    if date_to:
+        where_clauses.append('b.booking_date <= %s')
+        query_params.append(date_to)
+    
+    where_sql = ' AND '.join(where_clauses)
     
-    # Проверка что время окончания больше времени начала
-    if end_time_obj <= start_time_obj:
+    with conn.cursor() as cur:
+        # Получаем общее количество
+        cur.execute(f"""
+            SELECT COUNT(*) as total
+            FROM {SCHEMA}.bath_master_bookings b
+            WHERE {where_sql}
+        """, query_params)
+        total = cur.fetchone()['total']
+        
+        # Получаем бронирования
+        cur.execute(f"""
+            SELECT b.*,
+                   CASE 
+                     WHEN b.booking_type = 'bath' THEN ba.name
+                     ELSE m.name
+                   END as entity_name,
+                   CASE 
+                     WHEN b.booking_type = 'bath' THEN ba.address
+                     ELSE m.specialization
+                   END as entity_info
+            FROM {SCHEMA}.bath_master_bookings b
+            LEFT JOIN {SCHEMA}.baths ba ON b.booking_type = 'bath' AND b.entity_id = ba.id
+            LEFT JOIN {SCHEMA}.masters m ON b.booking_type = 'master' AND b.entity_id = m.id
+            WHERE {where_sql}
+            ORDER BY b.booking_date DESC, b.start_time DESC
+            LIMIT %s OFFSET %s
+        """, query_params + [limit, offset])
+        
+        bookings = cur.fetchall()
+        
         return {
-            'statusCode': 400,
+            'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Время окончания должно быть больше времени начала'}),
+            'body': json.dumps({
+                'items': [dict(b) for b in bookings],
+                'total': total,
+                'limit': limit,
+                'offset': offset
+            }, default=str),
             'isBase64Encoded': False
         }
+
+def handle_post(event: dict) -> dict:
+    """Создание нового бронирования"""
+    params = event.get('queryStringParameters') or {}
     
-    conn = get_db_connection()
-    try:
-        # Проверяем доступность слота
-        if not check_time_slot_available(conn, booking_type, entity_id, booking_date_obj, 
-                                         start_time_obj, end_time_obj):
+    if params.get('action') == 'batch':
+        return handle_batch_post(event)
+    
+    with BookingRequest(event) as req:
+        # Проверка авторизации
+        user = req.authenticate()
+        
+        if not user:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+        
+        try:
+            data = json.loads(event.get('body', '{}'))
+        except json.JSONDecodeError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный JSON'}),
+                'isBase64Encoded': False
+            }
+        
+        # Валидация
+        booking_type = data.get('booking_type')
+        entity_id = data.get('entity_id')
+        booking_date = data.get('booking_date')
+        start_time = data.get('start_time')
+        end_time = data.get('end_time')
+        guests_count = data.get('guests_count', 1)
+        notes = data.get('notes', '')
+        schedule_id = data.get('schedule_id')
+        
+        if not all([booking_type, entity_id, booking_date, start_time, end_time]):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Отсутствуют обязательные поля'}),
+                'isBase64Encoded': False
+            }
+        
+        if booking_type not in ['bath', 'master']:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный тип бронирования'}),
+                'isBase64Encoded': False
+            }
+        
+        # Парсим дату и время
+        try:
+            booking_date_obj = datetime.strptime(booking_date, '%Y-%m-%d').date()
+            start_time_obj = datetime.strptime(start_time, '%H:%M').time()
+            end_time_obj = datetime.strptime(end_time, '%H:%M').time()
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный формат даты или времени'}),
+                'isBase64Encoded': False
+            }
+        
+        if schedule_id and not pricing.is_schedule_id(schedule_id):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный schedule_id'}),
+                'isBase64Encoded': False
+            }
+        
+        # Проверка что дата в будущем
+        if booking_date_obj < date.today():
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Выбранный временной слот уже занят'}),
+                'body': json.dumps({'error': 'Дата бронирования должна быть в будущем'}),
                 'isBase64Encoded': False
             }
         
-        # Получаем цену
-        price_per_hour = get_entity_price(conn, booking_type, entity_id)
-        if not price_per_hour:
+        # Проверка что время окончания больше времени начала
+        if end_time_obj <= start_time_obj:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Время окончания должно быть больше времени начала'}),
+                'isBase64Encoded': False
+            }
+        
+        conn = req.conn
+        
+        # Проверяем доступность слота
+        if not check_time_slot_available(conn, booking_type, entity_id, booking_date_obj, 
+                                         start_time_obj, end_time_obj):
+            return slot_taken_response()
+        
+        # Рассчитываем стоимость по тарифу бани/услуги мастера или по слоту расписания
+        total_price, = pricing.quote(conn, [{
+            'booking_type': booking_type,
+            'entity_id': entity_id,
+            'start_time': start_time_obj,
+            'end_time': end_time_obj,
+            'service': data.get('service'),
+            'schedule_id': schedule_id
+        }])
+        if total_price is None:
             return {
                 'statusCode': 404,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -369,24 +442,24 @@ def handle_post(event: dict) -> dict:
                 'isBase64Encoded': False
             }
         
-        # Рассчитываем общую стоимость
-        hours = calculate_hours(start_time_obj, end_time_obj)
-        total_price = int(price_per_hour * hours)
-        
         # Создаем бронирование
         with conn.cursor() as cur:
-            cur.execute(f"""
-                INSERT INTO {SCHEMA}.bath_master_bookings 
-                (user_id, booking_type, entity_id, booking_date, start_time, end_time, 
-                 guests_count, total_price, status, notes)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s)
-                RETURNING id, created_at
-            """, (user['id'], booking_type, entity_id, booking_date_obj, start_time_obj, 
-                  end_time_obj, guests_count, total_price, notes))
-            
+            try:
+                cur.execute(f"""
+                    INSERT INTO {SCHEMA}.bath_master_bookings 
+                    (user_id, booking_type, entity_id, booking_date, start_time, end_time, 
+                     guests_count, total_price, status, notes)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s)
+                    RETURNING id, created_at
+                """, (user['id'], booking_type, entity_id, booking_date_obj, start_time_obj, 
+                      end_time_obj, guests_count, total_price, notes))
+            except errors.ExclusionViolation:
+                # Слот заняли между проверкой и вставкой
+                conn.rollback()
+                return slot_taken_response()
+        
             result = cur.fetchone()
-            conn.commit()
-            
+        
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -398,62 +471,133 @@ def handle_post(event: dict) -> dict:
                 }),
                 'isBase64Encoded': False
             }
-    finally:
-        conn.close()
 
-def handle_put(event: dict) -> dict:
-    """Обновление статуса бронирования"""
-    # Проверка авторизации
-    auth_header = event.get('headers', {}).get('x-authorization', '')
-    token = auth_header.replace('Bearer ', '') if auth_header else None
-    user = get_user_from_token(token)
-    
-    if not user:
-        return {
-            'statusCode': 401,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Требуется авторизация'}),
-            'isBase64Encoded': False
-        }
-    
-    try:
-        data = json.loads(event.get('body', '{}'))
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Некорректный JSON'}),
-            'isBase64Encoded': False
-        }
-    
-    booking_id = data.get('booking_id')
-    status = data.get('status')
-    
-    if not booking_id or not status:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Отсутствуют обязательные поля'}),
-            'isBase64Encoded': False
-        }
-    
-    if status not in ['pending', 'confirmed', 'completed']:
+def handle_batch_post(event: dict) -> dict:
+    """Создание нескольких бронирований в одной транзакции: либо все, либо ни одного"""
+    with BookingRequest(event) as req:
+        user = req.authenticate()
+        
+        if not user:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+        
+        try:
+            items = batch.parse_items(json.loads(event.get('body') or '{}'))
+        except (json.JSONDecodeError, AttributeError):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный JSON'}),
+                'isBase64Encoded': False
+            }
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        conn = req.conn
+        
+        conflicts = batch.find_conflicts(conn, items)
+        if conflicts:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Выбранный временной слот уже занят', 'items': conflicts}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        totals = pricing.quote(conn, items)
+        missing = [number for number, total in enumerate(totals, start=1) if total is None]
+        if missing:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Баня или мастер не найдены', 'items': missing}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        for item, total in zip(items, totals):
+            item['total_price'] = total
+        
+        try:
+            created = batch.insert_bookings(conn, user['id'], items)
+        except errors.ExclusionViolation:
+            # Один из слотов заняли между проверкой и вставкой — не создаётся ни одно бронирование
+            conn.rollback()
+            return slot_taken_response()
+        
+        bookings = [
+            {'id': row['id'], 'total_price': item['total_price'], 'created_at': str(row['created_at'])}
+            for row, item in zip(created, items)
+        ]
         return {
-            'statusCode': 400,
+            'statusCode': 201,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Некорректный статус'}),
+            'body': json.dumps({
+                'bookings': bookings,
+                'total_price': sum(booking['total_price'] for booking in bookings),
+                'message': 'Бронирования успешно созданы'
+            }),
             'isBase64Encoded': False
         }
-    
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
+
+def handle_put(event: dict) -> dict:
+    """Обновление статуса бронирования"""
+    with BookingRequest(event) as req:
+        # Проверка авторизации
+        user = req.authenticate()
+        
+        if not user:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+        
+        try:
+            data = json.loads(event.get('body', '{}'))
+        except json.JSONDecodeError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный JSON'}),
+                'isBase64Encoded': False
+            }
+        
+        booking_id = data.get('booking_id')
+        status = data.get('status')
+        
+        if not booking_id or not status:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Отсутствуют обязательные поля'}),
+                'isBase64Encoded': False
+            }
+        
+        if status not in ['pending', 'confirmed', 'completed']:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный статус'}),
+                'isBase64Encoded': False
+            }
+        
+        with req.conn.cursor() as cur:
             # Проверяем что бронирование принадлежит пользователю
             cur.execute(f"""
                 SELECT id, status FROM {SCHEMA}.bath_master_bookings
                 WHERE id = %s AND user_id = %s
             """, (booking_id, user['id']))
-            
+        
             booking = cur.fetchone()
             if not booking:
                 return {
@@ -462,7 +606,7 @@ def handle_put(event: dict) -> dict:
                     'body': json.dumps({'error': 'Бронирование не найдено'}),
                     'isBase64Encoded': False
                 }
-            
+        
             if booking['status'] == 'canceled':
                 return {
                     'statusCode': 400,
@@ -470,66 +614,65 @@ def handle_put(event: dict) -> dict:
                     'body': json.dumps({'error': 'Нельзя изменить отмененное бронирование'}),
                     'isBase64Encoded': False
                 }
-            
+        
             # Обновляем статус
-            cur.execute(f"""
-                UPDATE {SCHEMA}.bath_master_bookings
-                SET status = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            """, (status, booking_id))
-            
-            conn.commit()
-            
+            try:
+                cur.execute(f"""
+                    UPDATE {SCHEMA}.bath_master_bookings
+                    SET status = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                """, (status, booking_id))
+            except errors.ExclusionViolation:
+                # Возврат завершённого бронирования в активные пересёкся с чужим слотом
+                req.conn.rollback()
+                return slot_taken_response()
+        
+        
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'message': 'Статус бронирования обновлен'}),
                 'isBase64Encoded': False
             }
-    finally:
-        conn.close()
 
 def handle_delete(event: dict) -> dict:
     """Отмена бронирования"""
-    # Проверка авторизации
-    auth_header = event.get('headers', {}).get('x-authorization', '')
-    token = auth_header.replace('Bearer ', '') if auth_header else None
-    user = get_user_from_token(token)
-    
-    if not user:
-        return {
-            'statusCode': 401,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Требуется авторизация'}),
-            'isBase64Encoded': False
-        }
-    
-    params = event.get('queryStringParameters') or {}
-    booking_id = params.get('booking_id')
-    
-    if not booking_id:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Отсутствует ID бронирования'}),
-            'isBase64Encoded': False
-        }
-    
-    try:
-        data = json.loads(event.get('body', '{}'))
-        cancellation_reason = data.get('reason', '')
-    except:
-        cancellation_reason = ''
-    
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
+    with BookingRequest(event) as req:
+        # Проверка авторизации
+        user = req.authenticate()
+        
+        if not user:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+        
+        params = event.get('queryStringParameters') or {}
+        booking_id = params.get('booking_id')
+        
+        if not booking_id:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Отсутствует ID бронирования'}),
+                'isBase64Encoded': False
+            }
+        
+        try:
+            data = json.loads(event.get('body', '{}'))
+            cancellation_reason = data.get('reason', '')
+        except:
+            cancellation_reason = ''
+        
+        with req.conn.cursor() as cur:
             # Проверяем что бронирование принадлежит пользователю
             cur.execute(f"""
                 SELECT id, status FROM {SCHEMA}.bath_master_bookings
                 WHERE id = %s AND user_id = %s
             """, (booking_id, user['id']))
-            
+        
             booking = cur.fetchone()
             if not booking:
                 return {
@@ -538,7 +681,7 @@ def handle_delete(event: dict) -> dict:
                     'body': json.dumps({'error': 'Бронирование не найдено'}),
                     'isBase64Encoded': False
                 }
-            
+        
             if booking['status'] == 'canceled':
                 return {
                     'statusCode': 400,
@@ -546,7 +689,7 @@ def handle_delete(event: dict) -> dict:
                     'body': json.dumps({'error': 'Бронирование уже отменено'}),
                     'isBase64Encoded': False
                 }
-            
+        
             # Отменяем бронирование
             cur.execute(f"""
                 UPDATE {SCHEMA}.bath_master_bookings
@@ -556,14 +699,11 @@ def handle_delete(event: dict) -> dict:
                     updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
             """, (cancellation_reason, booking_id))
-            
-            conn.commit()
-            
+        
+        
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'message': 'Бронирование отменено'}),
                 'isBase64Encoded': False
             }
-    finally:
-        conn.close()
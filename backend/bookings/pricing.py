@@ -0,0 +1,209 @@
+"""
+Расчёт стоимости бронирований бань и мастеров.
+Тарифы всех бань и мастеров держатся в памяти тёплого инстанса. Не чаще раза
+в PRICING_CACHE_CHECK секунд одним запросом сверяется подпись таблиц по (id, updated_at)
+и перечитывается только изменившаяся таблица.
+
+Тариф бани — price_per_hour. У мастера без выбора услуги — price первой услуги
+из masters.services за час; услуга, выбранная по названию (service), стоит price
+за свои duration минут. Бронирование по слоту расписания (schedule_id) стоит
+price_override слота или base_price его услуги.
+
+Надбавки по времени суток задаются в PRICING_TIME_MULTIPLIERS, например
+"18:00-23:00=1.25,00:00-08:00=0.8". Из них один раз строятся префиксные суммы
+взвешенных минут суток, так что стоимость любого интервала — разность двух значений.
+"""
+import os
+import threading
+import time as clock
+import uuid
+from bisect import bisect_right
+from datetime import time
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+PRICING_CACHE_CHECK = float(os.environ.get('PRICING_CACHE_CHECK', '5'))
+
+DAY_MINUTES = 24 * 60
+
+_lock = threading.Lock()
+_signatures = {}
+_rates = {}
+_checked_at = None
+
+
+def parse_multipliers(spec: str) -> list:
+    """'ЧЧ:ММ-ЧЧ:ММ=множитель,...' → [(начало, конец, множитель)] в минутах суток"""
+    bands = []
+    for part in filter(None, (chunk.strip() for chunk in spec.split(','))):
+        period, multiplier = part.split('=')
+        start, end = (_minute_of_day(value) for value in period.split('-'))
+        # 24:00 — конец суток; интервал через полночь делится на два
+        end = end or DAY_MINUTES
+        if end > start:
+            bands.append((start, end, float(multiplier)))
+        else:
+            bands.extend([(start, DAY_MINUTES, float(multiplier)), (0, end, float(multiplier))])
+    bands.sort()
+    for (_, previous_end, _), (start, _, _) in zip(bands, bands[1:]):
+        if start < previous_end:
+            raise ValueError(f'PRICING_TIME_MULTIPLIERS: интервалы пересекаются: {spec}')
+    return bands
+
+
+def _minute_of_day(value: str) -> int:
+    hours, minutes = value.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _build_weights(bands: list) -> tuple[list, list, list]:
+    """Точки излома суток, вес минуты на каждом отрезке и накопленные взвешенные минуты к его началу"""
+    breaks, weights = [0], [1.0]
+    for start, end, multiplier in bands:
+        if start > breaks[-1]:
+            breaks.append(start)
+            weights.append(1.0)
+        weights[-1] = multiplier
+        breaks.append(end)
+        weights.append(1.0)
+    if breaks[-1] == DAY_MINUTES:
+        breaks.pop()
+        weights.pop()
+    cumulative = [0.0]
+    for i in range(1, len(breaks)):
+        cumulative.append(cumulative[-1] + (breaks[i] - breaks[i - 1]) * weights[i - 1])
+    day_total = cumulative[-1] + (DAY_MINUTES - breaks[-1]) * weights[-1]
+    return breaks, weights, cumulative + [day_total]
+
+
+_BREAKS, _WEIGHTS, _CUMULATIVE = _build_weights(parse_multipliers(os.environ.get('PRICING_TIME_MULTIPLIERS', '')))
+
+
+def _weighted_until(minute: int) -> float:
+    """Взвешенные минуты от полуночи дня бронирования до minute (может быть больше суток)"""
+    days, minute = divmod(minute, DAY_MINUTES)
+    i = bisect_right(_BREAKS, minute) - 1
+    return days * _CUMULATIVE[-1] + _CUMULATIVE[i] + (minute - _BREAKS[i]) * _WEIGHTS[i]
+
+
+def weighted_minutes(start_time: time, end_time: time) -> float:
+    """Длительность [start_time, end_time) в минутах с учётом множителей; конец не позже начала — следующий день"""
+    start = start_time.hour * 60 + start_time.minute
+    end = end_time.hour * 60 + end_time.minute
+    if end <= start:
+        end += DAY_MINUTES
+    return _weighted_until(end) - _weighted_until(start)
+
+
+def _row(row, *columns) -> tuple:
+    return tuple(row[column] for column in columns) if isinstance(row, dict) else tuple(row)
+
+
+def _service_rates(services) -> dict:
+    """
+    Часовые тарифы услуг мастера: {название: тариф}.
+    Названная услуга — price за её duration минут. None — тариф без выбора услуги:
+    price первой услуги за час, как и до расчёта по длительности.
+    """
+    rates = {}
+    for index, service in enumerate(services or []):
+        price = service.get('price') if isinstance(service, dict) else None
+        if not price:
+            continue
+        if index == 0:
+            rates[None] = float(price)
+        duration = service.get('duration') or 60
+        rates[service.get('name')] = float(price) * 60 / float(duration)
+    return rates
+
+
+def _load(cur, booking_type: str) -> dict:
+    if booking_type == 'bath':
+        cur.execute(f"SELECT id, price_per_hour FROM {SCHEMA}.baths WHERE price_per_hour IS NOT NULL")
+        return {entity_id: {None: float(price)} for entity_id, price in (_row(r, 'id', 'price_per_hour') for r in cur.fetchall())}
+    cur.execute(f"SELECT id, services FROM {SCHEMA}.masters WHERE services IS NOT NULL")
+    return {entity_id: _service_rates(services) for entity_id, services in (_row(r, 'id', 'services') for r in cur.fetchall())}
+
+
+def refresh(conn) -> None:
+    """Сверка подписей таблиц тарифов и перечитывание изменившихся (не чаще раза в PRICING_CACHE_CHECK)"""
+    global _checked_at
+    now = clock.monotonic()
+    if _checked_at is not None and now - _checked_at < PRICING_CACHE_CHECK:
+        return
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT 'bath' AS booking_type,
+                   md5(COALESCE(string_agg(id || '@' || COALESCE(updated_at::text, ''), ',' ORDER BY id), '')) AS signature
+            FROM {SCHEMA}.baths
+            UNION ALL
+            SELECT 'master',
+                   md5(COALESCE(string_agg(id || '@' || COALESCE(updated_at::text, ''), ',' ORDER BY id), ''))
+            FROM {SCHEMA}.masters
+        """)
+        signatures = dict(_row(row, 'booking_type', 'signature') for row in cur.fetchall())
+        changed = [booking_type for booking_type, signature in signatures.items() if _signatures.get(booking_type) != signature]
+        loaded = {booking_type: _load(cur, booking_type) for booking_type in changed}
+    with _lock:
+        _rates.update(loaded)
+        _signatures.update({booking_type: signatures[booking_type] for booking_type in changed})
+        _checked_at = now
+
+
+def clear() -> None:
+    global _checked_at
+    with _lock:
+        _rates.clear()
+        _signatures.clear()
+        _checked_at = None
+
+
+def is_schedule_id(value) -> bool:
+    """schedule_id — UUID слота service_schedules"""
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+def _schedule_prices(conn, schedule_ids: list) -> dict:
+    """Цены слотов расписания (не кэшируются — price_override меняется по слоту): {id: (цена, баня, мастер)}"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT sch.id::text AS id, COALESCE(sch.price_override, s.base_price) AS price,
+                   s.bathhouse_id, s.master_id
+            FROM {SCHEMA}.service_schedules sch
+            JOIN {SCHEMA}.services s ON s.id = sch.service_id
+            WHERE sch.id = ANY(%s::uuid[]) AND sch.status = 'active'
+        """, (schedule_ids,))
+        return {
+            schedule_id: (price, bathhouse_id, master_id)
+            for schedule_id, price, bathhouse_id, master_id
+            in (_row(r, 'id', 'price', 'bathhouse_id', 'master_id') for r in cur.fetchall())
+        }
+
+
+def quote(conn, items: list) -> list:
+    """
+    Стоимость позиций бронирования: booking_type, entity_id, start_time, end_time
+    и необязательные service (название услуги мастера) и schedule_id
+
+    Returns:
+        Стоимость по каждой позиции; None — баня, мастер, услуга или слот не найдены
+    """
+    refresh(conn)
+    schedule_ids = sorted({str(item['schedule_id']) for item in items if item.get('schedule_id')})
+    schedules = _schedule_prices(conn, schedule_ids) if schedule_ids else {}
+
+    totals = []
+    for item in items:
+        entity_id = int(item['entity_id'])
+        if item.get('schedule_id'):
+            price, bathhouse_id, master_id = schedules.get(str(item['schedule_id']), (None, None, None))
+            owner = bathhouse_id if item['booking_type'] == 'bath' else master_id
+            totals.append(price if owner == entity_id else None)
+            continue
+        rate = _rates.get(item['booking_type'], {}).get(entity_id, {}).get(item.get('service'))
+        totals.append(int(rate * weighted_minutes(item['start_time'], item['end_time']) / 60) if rate else None)
+    return totals
@@ -1,12 +1,53 @@
 import json
-import os
-import psycopg2
 from typing import Optional
+from db import get_connection
+import response_cache
+from http_cache import cache_control, cached_response
+from pagination import (
+    InvalidCursorError, decode_cursor, include_total, keyset_condition,
+    order_by_sql, sort_key_sql, split_page
+)
+
+BATHS_SORTS = {
+    'price_asc': [('price_per_hour', 'ASC'), ('id', 'ASC')],
+    'price_desc': [('price_per_hour', 'DESC'), ('id', 'DESC')],
+    'rating': [('COALESCE(rating, 0)', 'DESC'), ('COALESCE(reviews_count, 0)', 'DESC'), ('id', 'DESC')],
+    'reviews': [('COALESCE(reviews_count, 0)', 'DESC'), ('id', 'DESC')]
+}
+
+MASTERS_SORTS = {
+    'experience': [('experience', 'DESC'), ('id', 'DESC')],
+    'rating': [('COALESCE(rating, 0)', 'DESC'), ('COALESCE(reviews_count, 0)', 'DESC'), ('id', 'DESC')],
+    'reviews': [('COALESCE(reviews_count, 0)', 'DESC'), ('id', 'DESC')]
+}
+
+# search_mode=fts: ранжирование по релевантности и подсветка совпадений
+FTS_ORDER = [('ts_rank(search_vector, q)', 'DESC'), ('id', 'DESC')]
+FTS_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5'
+
+# Фильтры списков: (параметр запроса, условие, значения для плейсхолдеров)
+BATHS_FILTERS = [
+    ('city', "address ILIKE %s", lambda v: [f"%{v}%"]),
+    ('min_capacity', "capacity >= %s", lambda v: [int(v)]),
+    ('max_price', "price_per_hour <= %s", lambda v: [int(v)]),
+    ('min_rating', "rating >= %s", lambda v: [float(v)]),
+    ('search', "(name ILIKE %s OR description ILIKE %s)", lambda v: [f"%{v}%"] * 2)
+]
+
+MASTERS_FILTERS = [
+    ('specialization', "specialization ILIKE %s", lambda v: [f"%{v}%"]),
+    ('min_experience', "experience >= %s", lambda v: [int(v)]),
+    ('min_rating', "rating >= %s", lambda v: [float(v)]),
+    ('search', "(name ILIKE %s OR description ILIKE %s OR specialization ILIKE %s)", lambda v: [f"%{v}%"] * 3)
+]
+
+# Списки меняются при новых отзывах и правках каталога, карточки — реже
+LIST_CACHE_POLICY = cache_control(60, 300)
+DETAIL_CACHE_POLICY = cache_control(300, 600)
 
 def get_db_connection():
     """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
 
 def handler(event: dict, context) -> dict:
     """
@@ -21,7 +62,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization, If-None-Match'
             },
             'body': ''
         }
@@ -31,12 +72,18 @@ def handler(event: dict, context) -> dict:
     
     conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         resource = params.get('resource', 'baths')
         item_id = params.get('id')
         slug = params.get('slug')
+        policy = DETAIL_CACHE_POLICY if slug or item_id else LIST_CACHE_POLICY
+        
+        if resource in ('baths', 'masters'):
+            body, version = response_cache.get(resource, params)
+            if body is not None:
+                return cached_response(event, body, policy, cache_headers('HIT'))
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
         
         if resource == 'baths':
             if slug:
@@ -63,12 +110,16 @@ def handler(event: dict, context) -> dict:
         
         cursor.close()
         
+        body = json.dumps(result, ensure_ascii=False, default=str)
+        response_cache.put(resource, params, body, version)
+        return cached_response(event, body, policy, cache_headers('MISS'))
+    
+    except InvalidCursorError as e:
         return {
-            'statusCode': 200,
+            'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(result, ensure_ascii=False, default=str)
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
-    
     except ValueError as e:
         return {
             'statusCode': 404,
@@ -85,54 +136,118 @@ def handler(event: dict, context) -> dict:
         if conn:
             conn.close()
 
-def get_baths_list(cursor, params: dict) -> dict:
-    """Получение списка бань с фильтрацией"""
-    query = "SELECT id, slug, name, address, capacity, price_per_hour, features, images, rating, reviews_count FROM t_p13705114_spa_community_portal.baths WHERE 1=1"
-    query_params = []
-    
-    if params.get('city'):
-        query += " AND address ILIKE %s"
-        query_params.append(f"%{params['city']}%")
-    
-    if params.get('min_capacity'):
-        query += " AND capacity >= %s"
-        query_params.append(int(params['min_capacity']))
-    
-    if params.get('max_price'):
-        query += " AND price_per_hour <= %s"
-        query_params.append(int(params['max_price']))
-    
-    if params.get('min_rating'):
-        query += " AND rating >= %s"
-        query_params.append(float(params['min_rating']))
-    
-    if params.get('search'):
-        query += " AND (name ILIKE %s OR description ILIKE %s)"
-        search_term = f"%{params['search']}%"
-        query_params.extend([search_term, search_term])
+def cache_headers(status: str) -> dict:
+    """Заголовки ответа с отметкой X-Cache: HIT | MISS кэша инстанса"""
+    return {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'X-Cache': status}
+
+def build_where(filters: list, params: dict) -> tuple[str, list]:
+    """Единый построитель WHERE для страницы и total"""
+    clauses = []
+    values = []
+    for name, clause, convert in filters:
+        if params.get(name):
+            clauses.append(clause)
+            values.extend(convert(params[name]))
+    return (' AND '.join(clauses) or 'TRUE'), values
+
+def query_list(cursor, table: str, columns: str, filters: list, sorts: dict, params: dict,
+               headline_source: str = 'description') -> dict:
+    """
+    Страница списка и total одним запросом: COUNT(*) OVER() считается по отфильтрованному
+    набору до keyset-условия, поэтому total не зависит от cursor.
+    Без include_total оконной функции нет и планировщик сворачивает подзапрос.
+    search_mode=fts: поиск по search_vector (GIN), сортировка по ts_rank и подсветка
+    совпадений; ts_headline считается во внешнем запросе только для строк страницы.
+    """
+    fts = params.get('search_mode') == 'fts' and bool(params.get('search'))
     
-    sort = params.get('sort', 'rating')
-    if sort == 'price_asc':
-        query += " ORDER BY price_per_hour ASC"
-    elif sort == 'price_desc':
-        query += " ORDER BY price_per_hour DESC"
-    elif sort == 'rating':
-        query += " ORDER BY rating DESC, reviews_count DESC"
-    elif sort == 'reviews':
-        query += " ORDER BY reviews_count DESC"
+    if fts:
+        sort = 'relevance'
+        order = FTS_ORDER
+        filters = [f for f in filters if f[0] != 'search']
     else:
-        query += " ORDER BY rating DESC"
-    
+        sort = params.get('sort', 'rating')
+        if sort not in sorts:
+            sort = 'rating'
+        order = sorts[sort]
+    outer_order = [(f"sort_key_{i}", direction) for i, (_, direction) in enumerate(order)]
+    with_total = include_total(params)
+    
+    where_sql, query_params = build_where(filters, params)
+    from_sql = f"t_p13705114_spa_community_portal.{table}"
+    inner_columns = columns
+    outer_columns = columns
+    
+    if fts:
+        from_sql += ", websearch_to_tsquery('russian', %s) q"
+        query_params.insert(0, params['search'])
+        where_sql += " AND search_vector @@ q"
+        inner_columns += f", ts_rank(search_vector, q) AS rank, COALESCE({headline_source}, '') AS search_text, q AS search_query"
+        outer_columns += f", rank, ts_headline('russian', search_text, search_query, '{FTS_HEADLINE_OPTIONS}') AS highlight"
+    
+    if with_total:
+        inner_columns += ", COUNT(*) OVER() AS total_count"
+        outer_columns += ", total_count"
+    
+    filter_params = list(query_params)
     limit = min(int(params.get('limit', 20)), 100)
     offset = int(params.get('offset', 0))
-    query += " LIMIT %s OFFSET %s"
-    query_params.extend([limit, offset])
     
-    cursor.execute(query, query_params)
-    rows = cursor.fetchall()
+    page_where_sql = "TRUE"
+    if params.get('cursor'):
+        # Keyset: страница сразу после последней строки предыдущей
+        page_where_sql, condition_params = keyset_condition(
+            outer_order, decode_cursor(params['cursor'], sort, outer_order)
+        )
+        query_params.extend(condition_params)
+        offset = 0
+    
+    cursor.execute(f"""
+        SELECT {outer_columns}, {', '.join(key for key, _ in outer_order)} FROM (
+            SELECT {inner_columns}, {sort_key_sql(order)}
+            FROM {from_sql}
+            WHERE {where_sql}
+        ) page
+        WHERE {page_where_sql}
+        {order_by_sql(outer_order)}
+        LIMIT %s OFFSET %s
+    """, query_params + [limit + 1, offset])
+    rows, next_cursor = split_page(cursor.fetchall(), limit, sort, outer_order)
+    
+    n_columns = len(columns.split(','))
+    result = {
+        'rows': rows,
+        'limit': limit,
+        'offset': offset,
+        'next_cursor': next_cursor
+    }
+    
+    if fts:
+        result['search_mode'] = 'fts'
+        result['matches'] = [
+            {'rank': float(row[n_columns]), 'highlight': row[n_columns + 1]} for row in rows
+        ]
+    
+    if with_total:
+        if rows:
+            result['total'] = rows[0][n_columns + (2 if fts else 0)]
+        else:
+            # Пустая страница за концом списка — окну нечего вернуть, считаем отдельно
+            cursor.execute(f"SELECT COUNT(*) FROM {from_sql} WHERE {where_sql}", filter_params)
+            result['total'] = cursor.fetchone()[0]
+    
+    return result
+
+def get_baths_list(cursor, params: dict) -> dict:
+    """Получение списка бань с фильтрацией"""
+    page = query_list(
+        cursor, 'baths',
+        "id, slug, name, address, capacity, price_per_hour, features, images, rating, reviews_count",
+        BATHS_FILTERS, BATHS_SORTS, params
+    )
     
     baths = []
-    for row in rows:
+    for row in page.pop('rows'):
         baths.append({
             'id': row[0],
             'slug': row[1],
@@ -146,39 +261,10 @@ def get_baths_list(cursor, params: dict) -> dict:
             'reviews_count': row[9]
         })
     
-    count_query = "SELECT COUNT(*) FROM t_p13705114_spa_community_portal.baths WHERE 1=1"
-    count_params = []
-    
-    if params.get('city'):
-        count_query += " AND address ILIKE %s"
-        count_params.append(f"%{params['city']}%")
-    
-    if params.get('min_capacity'):
-        count_query += " AND capacity >= %s"
-        count_params.append(int(params['min_capacity']))
-    
-    if params.get('max_price'):
-        count_query += " AND price_per_hour <= %s"
-        count_params.append(int(params['max_price']))
+    for item, match in zip(baths, page.pop('matches', [])):
+        item.update(match)
     
-    if params.get('min_rating'):
-        count_query += " AND rating >= %s"
-        count_params.append(float(params['min_rating']))
-    
-    if params.get('search'):
-        count_query += " AND (name ILIKE %s OR description ILIKE %s)"
-        search_term = f"%{params['search']}%"
-        count_params.extend([search_term, search_term])
-    
-    cursor.execute(count_query, count_params)
-    total = cursor.fetchone()[0]
-    
-    return {
-        'items': baths,
-        'total': total,
-        'limit': limit,
-        'offset': offset
-    }
+    return {'items': baths, **page}
 
 def get_bath_by_id(cursor, bath_id: int) -> dict:
     """Получение детальной информации о бане по ID"""
@@ -238,46 +324,14 @@ def get_bath_by_slug(cursor, slug: str) -> dict:
 
 def get_masters_list(cursor, params: dict) -> dict:
     """Получение списка мастеров с фильтрацией"""
-    query = "SELECT id, slug, name, specialization, experience, avatar_url, rating, reviews_count FROM t_p13705114_spa_community_portal.masters WHERE 1=1"
-    query_params = []
-    
-    if params.get('specialization'):
-        query += " AND specialization ILIKE %s"
-        query_params.append(f"%{params['specialization']}%")
-    
-    if params.get('min_experience'):
-        query += " AND experience >= %s"
-        query_params.append(int(params['min_experience']))
-    
-    if params.get('min_rating'):
-        query += " AND rating >= %s"
-        query_params.append(float(params['min_rating']))
-    
-    if params.get('search'):
-        query += " AND (name ILIKE %s OR description ILIKE %s OR specialization ILIKE %s)"
-        search_term = f"%{params['search']}%"
-        query_params.extend([search_term, search_term, search_term])
-    
-    sort = params.get('sort', 'rating')
-    if sort == 'experience':
-        query += " ORDER BY experience DESC"
-    elif sort == 'rating':
-        query += " ORDER BY rating DESC, reviews_count DESC"
-    elif sort == 'reviews':
-        query += " ORDER BY reviews_count DESC"
-    else:
-        query += " ORDER BY rating DESC"
-    
-    limit = min(int(params.get('limit', 20)), 100)
-    offset = int(params.get('offset', 0))
-    query += " LIMIT %s OFFSET %s"
-    query_params.extend([limit, offset])
-    
-    cursor.execute(query, query_params)
-    rows = cursor.fetchall()
+    page = query_list(
+        cursor, 'masters',
+        "id, slug, name, specialization, experience, avatar_url, rating, reviews_count",
+        MASTERS_FILTERS, MASTERS_SORTS, params
+    )
     
     masters = []
-    for row in rows:
+    for row in page.pop('rows'):
         masters.append({
             'id': row[0],
             'slug': row[1],
@@ -289,35 +343,10 @@ def get_masters_list(cursor, params: dict) -> dict:
             'reviews_count': row[7]
         })
     
-    count_query = "SELECT COUNT(*) FROM t_p13705114_spa_community_portal.masters WHERE 1=1"
-    count_params = []
+    for item, match in zip(masters, page.pop('matches', [])):
+        item.update(match)
     
-    if params.get('specialization'):
-        count_query += " AND specialization ILIKE %s"
-        count_params.append(f"%{params['specialization']}%")
-    
-    if params.get('min_experience'):
-        count_query += " AND experience >= %s"
-        count_params.append(int(params['min_experience']))
-    
-    if params.get('min_rating'):
-        count_query += " AND rating >= %s"
-        count_params.append(float(params['min_rating']))
-    
-    if params.get('search'):
-        count_query += " AND (name ILIKE %s OR description ILIKE %s OR specialization ILIKE %s)"
-        search_term = f"%{params['search']}%"
-        count_params.extend([search_term, search_term, search_term])
-    
-    cursor.execute(count_query, count_params)
-    total = cursor.fetchone()[0]
-    
-    return {
-        'items': masters,
-        'total': total,
-        'limit': limit,
-        'offset': offset
-    }
+    return {'items': masters, **page}
 
 def get_master_by_id(cursor, master_id: int) -> dict:
     """Получение детальной информации о мастере по ID"""
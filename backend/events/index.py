@@ -4,17 +4,46 @@ API для работы с мероприятиями СПАРКОМ.
 """
 import json
 import os
-import psycopg2
 from datetime import datetime
 from typing import Optional
+from db import get_connection
+import session_cache
+import jwt_auth
+import response_cache
+import waitlist
 from models import EventListItem, EventDetail, RegistrationRequest
+from http_cache import cache_control, cached_response
+from pagination import (
+    InvalidCursorError, decode_cursor, include_total, keyset_condition,
+    order_by_sql, sort_key_sql, split_page
+)
 
 SCHEMA = 't_p13705114_spa_community_portal'
 
+EVENTS_SORTS = {
+    'date': [('date', 'ASC'), ('time', 'ASC'), ('id', 'ASC')],
+    'price_asc': [('price', 'ASC'), ('id', 'ASC')],
+    'price_desc': [('price', 'DESC'), ('id', 'DESC')],
+    'spots': [('available_spots', 'DESC'), ('id', 'DESC')]
+}
+
+# Свободные места меняются с каждой регистрацией — короткий max-age
+EVENTS_CACHE_POLICY = cache_control(30, 120)
+
+# Сколько событий с непустой очередью обходит один запуск по таймеру
+WAITLIST_PROMOTE_BATCH = int(os.environ.get('WAITLIST_PROMOTE_BATCH', '50'))
+
+# search_mode=fts: ранжирование по релевантности и подсветка совпадений
+FTS_ORDER = [('ts_rank(search_vector, q)', 'DESC'), ('id', 'DESC')]
+FTS_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5'
+
 def get_db_connection():
     """Подключение к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
+
+def cache_headers(status: str) -> dict:
+    """Заголовки ответа с отметкой X-Cache: HIT | MISS кэша инстанса"""
+    return {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'X-Cache': status}
 
 def get_user_id_from_token(headers: dict) -> Optional[int]:
     """Извлечение user_id из токена"""
@@ -24,12 +53,19 @@ def get_user_id_from_token(headers: dict) -> Optional[int]:
     
     token = auth.replace('Bearer ', '')
     
+    if jwt_auth.is_jwt(token):
+        return jwt_auth.verify(token)
+    
+    user_id = session_cache.get(token)
+    if user_id:
+        return user_id
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         cur.execute(f"""
-            SELECT user_id 
+            SELECT user_id, expires_at 
             FROM {SCHEMA}.user_sessions 
             WHERE access_token = %s 
               AND expires_at > NOW()
@@ -39,7 +75,11 @@ def get_user_id_from_token(headers: dict) -> Optional[int]:
         cur.close()
         conn.close()
         
-        return row[0] if row else None
+        if not row:
+            return None
+        
+        session_cache.put(token, row[0], row[1])
+        return row[0]
     except Exception:
         return None
 
@@ -53,7 +93,15 @@ def get_events_list(params: dict) -> dict:
     date_from = params.get('date_from', '')
     date_to = params.get('date_to', '')
     available_only = params.get('available_only', 'false').lower() == 'true'
-    sort = params.get('sort', 'date')
+    fts = params.get('search_mode') == 'fts' and bool(search)
+    if fts:
+        sort = 'relevance'
+        order = FTS_ORDER
+    else:
+        sort = params.get('sort', 'date')
+        if sort not in EVENTS_SORTS:
+            sort = 'date'
+        order = EVENTS_SORTS[sort]
     limit = min(int(params.get('limit', 20)), 100)
     offset = int(params.get('offset', 0))
     
@@ -64,7 +112,15 @@ def get_events_list(params: dict) -> dict:
         where_clauses.append(f"type = %s")
         query_params.append(event_type)
     
-    if search:
+    from_sql = f"{SCHEMA}.events"
+    search_columns = ""
+    if fts:
+        # Полнотекстовый поиск по GIN-индексу search_vector
+        from_sql += ", websearch_to_tsquery('russian', %s) q"
+        query_params.insert(0, search)
+        where_clauses.append("search_vector @@ q")
+        search_columns = f"ts_rank(search_vector, q), ts_headline('russian', COALESCE(description, ''), q, '{FTS_HEADLINE_OPTIONS}'),"
+    elif search:
         where_clauses.append(f"(title ILIKE %s OR description ILIKE %s)")
         search_param = f'%{search}%'
         query_params.extend([search_param, search_param])
@@ -81,31 +137,37 @@ def get_events_list(params: dict) -> dict:
         where_clauses.append(f"available_spots > 0")
     
     where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    count_params = list(query_params)
     
-    sort_mapping = {
-        'date': 'date ASC, time ASC',
-        'price_asc': 'price ASC',
-        'price_desc': 'price DESC',
-        'spots': 'available_spots DESC'
-    }
-    order_sql = f"ORDER BY {sort_mapping.get(sort, 'date ASC, time ASC')}"
+    if params.get('cursor'):
+        # Keyset: страница сразу после последней строки предыдущей
+        condition, condition_params = keyset_condition(order, decode_cursor(params['cursor'], sort, order))
+        page_where_sql = f"{where_sql} AND {condition}" if where_sql else f"WHERE {condition}"
+        query_params.extend(condition_params)
+        offset = 0
+    else:
+        page_where_sql = where_sql
     
     query = f"""
         SELECT id, slug, title, description, date, time, location, 
-               type, price, available_spots, total_spots, image_url
-        FROM {SCHEMA}.events
-        {where_sql}
-        {order_sql}
+               type, price, available_spots, total_spots, image_url,
+               {search_columns}
+               {sort_key_sql(order)}
+        FROM {from_sql}
+        {page_where_sql}
+        {order_by_sql(order)}
         LIMIT %s OFFSET %s
     """
-    query_params.extend([limit, offset])
+    query_params.extend([limit + 1, offset])
     
     cur.execute(query, query_params)
-    rows = cur.fetchall()
+    rows, next_cursor = split_page(cur.fetchall(), limit, sort, order)
     
-    count_query = f"SELECT COUNT(*) FROM {SCHEMA}.events {where_sql}"
-    cur.execute(count_query, query_params[:-2])
-    total = cur.fetchone()[0]
+    total = None
+    if include_total(params):
+        count_query = f"SELECT COUNT(*) FROM {from_sql} {where_sql}"
+        cur.execute(count_query, count_params)
+        total = cur.fetchone()[0]
     
     items = []
     for row in rows:
@@ -123,16 +185,23 @@ def get_events_list(params: dict) -> dict:
             'total_spots': row[10],
             'image_url': row[11]
         })
+        if fts:
+            items[-1]['rank'] = float(row[12])
+            items[-1]['highlight'] = row[13]
     
     cur.close()
     conn.close()
     
-    return {
+    result = {
         'items': items,
-        'total': total,
         'limit': limit,
-        'offset': offset
+        'offset': offset,
+        'next_cursor': next_cursor
     }
+    if total is not None:
+        result['total'] = total
+    
+    return result
 
 def get_event_detail(slug: str = None, event_id: int = None) -> Optional[dict]:
     """Получение детальной информации о событии"""
@@ -185,109 +254,173 @@ def get_event_detail(slug: str = None, event_id: int = None) -> Optional[dict]:
         'created_at': row[14].isoformat() if row[14] else None
     }
 
-def register_for_event(event_id: int, user_id: int) -> dict:
-    """Регистрация пользователя на событие"""
+def register_for_event(event_id: int, user_id: int, join_waitlist: bool = False) -> dict:
+    """
+    Регистрация пользователя на событие одной транзакцией.
+    При join_waitlist на распроданное событие пользователь встаёт в лист ожидания.
+    Место списывается атомарным UPDATE ... WHERE available_spots > 0 (блокировка строки
+    события сериализует конкурентов), регистрация вставляется в том же запросе через
+    ON CONFLICT (event_id, user_id) DO NOTHING — без гонки между проверками и записью.
+    """
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        cur.execute(f"SELECT available_spots FROM {SCHEMA}.events WHERE id = %s", (event_id,))
-        row = cur.fetchone()
-        
-        if not row:
-            cur.close()
-            conn.close()
-            return {'error': 'Событие не найдено', 'status': 404}
-        
-        if row[0] <= 0:
-            cur.close()
-            conn.close()
-            return {'error': 'Нет свободных мест', 'status': 400}
-        
         cur.execute(f"""
-            SELECT id FROM {SCHEMA}.event_registrations 
-            WHERE event_id = %s AND user_id = %s
+            WITH seat AS (
+                UPDATE {SCHEMA}.events
+                SET available_spots = available_spots - 1
+                WHERE id = %s AND available_spots > 0
+                RETURNING id
+            ), reg AS (
+                INSERT INTO {SCHEMA}.event_registrations (event_id, user_id, status)
+                SELECT id, %s, 'registered' FROM seat
+                ON CONFLICT (event_id, user_id) DO NOTHING
+                RETURNING id, registered_at
+            )
+            SELECT EXISTS (SELECT 1 FROM seat), reg.id, reg.registered_at
+            FROM (SELECT 1) AS one
+            LEFT JOIN reg ON true
         """, (event_id, user_id))
         
-        if cur.fetchone():
-            cur.close()
-            conn.close()
-            return {'error': 'Вы уже зарегистрированы на это событие', 'status': 409}
+        seat_taken, reg_id, registered_at = cur.fetchone()
         
-        cur.execute(f"""
-            INSERT INTO {SCHEMA}.event_registrations (event_id, user_id, status)
-            VALUES (%s, %s, 'registered')
-            RETURNING id, registered_at
-        """, (event_id, user_id))
-        
-        reg = cur.fetchone()
-        
-        cur.execute(f"""
-            UPDATE {SCHEMA}.events 
-            SET available_spots = available_spots - 1 
-            WHERE id = %s
-        """, (event_id,))
+        if not reg_id:
+            # Списанное место возвращается откатом
+            conn.rollback()
+            if seat_taken:
+                return {'error': 'Вы уже зарегистрированы на это событие', 'status': 409}
+            cur.execute(f"SELECT 1 FROM {SCHEMA}.events WHERE id = %s", (event_id,))
+            if not cur.fetchone():
+                return {'error': 'Событие не найдено', 'status': 404}
+            # Место не списано и на полном событии — регистрацию проверяем отдельно
+            cur.execute(f"""
+                SELECT 1 FROM {SCHEMA}.event_registrations
+                WHERE event_id = %s AND user_id = %s AND status = 'registered'
+            """, (event_id, user_id))
+            if cur.fetchone():
+                return {'error': 'Вы уже зарегистрированы на это событие', 'status': 409}
+            if not join_waitlist:
+                return {'error': 'Нет свободных мест', 'status': 400, 'waitlist_available': True}
+            position = waitlist.join(cur, event_id, user_id)
+            conn.commit()
+            return {
+                'waitlisted': True,
+                'position': position,
+                'message': 'Мест нет — вы в листе ожидания, при освобождении места регистрация произойдёт автоматически'
+            }
         
+        # Свободные места видны в закэшированных списках и карточках
+        response_cache.bump(cur, 'events')
         conn.commit()
-        cur.close()
-        conn.close()
         
         return {
-            'id': reg[0],
-            'registered_at': reg[1].isoformat() if reg[1] else None,
+            'id': reg_id,
+            'registered_at': registered_at.isoformat() if registered_at else None,
             'message': 'Регистрация успешна'
         }
     except Exception as e:
         conn.rollback()
+        return {'error': str(e), 'status': 500}
+    finally:
         cur.close()
         conn.close()
-        return {'error': str(e), 'status': 500}
 
 def cancel_registration(event_id: int, user_id: int) -> dict:
-    """Отмена регистрации на событие"""
+    """Отмена регистрации на событие: смена статуса и возврат места одним запросом"""
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
         cur.execute(f"""
-            SELECT id, status FROM {SCHEMA}.event_registrations 
-            WHERE event_id = %s AND user_id = %s
+            WITH canceled AS (
+                UPDATE {SCHEMA}.event_registrations
+                SET status = 'canceled', canceled_at = NOW()
+                WHERE event_id = %s AND user_id = %s AND status <> 'canceled'
+                RETURNING event_id
+            ), seat AS (
+                UPDATE {SCHEMA}.events
+                SET available_spots = LEAST(available_spots + 1, total_spots)
+                WHERE id IN (SELECT event_id FROM canceled)
+            )
+            SELECT EXISTS (SELECT 1 FROM canceled)
         """, (event_id, user_id))
         
-        row = cur.fetchone()
-        
-        if not row:
-            cur.close()
-            conn.close()
-            return {'error': 'Регистрация не найдена', 'status': 404}
-        
-        if row[1] == 'canceled':
-            cur.close()
-            conn.close()
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            cur.execute(f"""
+                SELECT 1 FROM {SCHEMA}.event_registrations 
+                WHERE event_id = %s AND user_id = %s
+            """, (event_id, user_id))
+            if not cur.fetchone():
+                return {'error': 'Регистрация не найдена', 'status': 404}
             return {'error': 'Регистрация уже отменена', 'status': 400}
         
-        cur.execute(f"""
-            UPDATE {SCHEMA}.event_registrations 
-            SET status = 'canceled', canceled_at = NOW()
-            WHERE id = %s
-        """, (row[0],))
-        
-        cur.execute(f"""
-            UPDATE {SCHEMA}.events 
-            SET available_spots = available_spots + 1 
-            WHERE id = %s
-        """, (event_id,))
-        
+        # Освободившееся место сразу уходит первому в листе ожидания
+        waitlist.promote(cur, event_id)
+        response_cache.bump(cur, 'events')
         conn.commit()
-        cur.close()
-        conn.close()
         
         return {'message': 'Регистрация отменена'}
     except Exception as e:
         conn.rollback()
+        return {'error': str(e), 'status': 500}
+    finally:
         cur.close()
         conn.close()
-        return {'error': str(e), 'status': 500}
+
+def leave_waitlist(event_id: int, user_id: int) -> dict:
+    """Выход из листа ожидания"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        if not waitlist.leave(cur, event_id, user_id):
+            return {'error': 'Вы не в листе ожидания этого события', 'status': 404}
+        conn.commit()
+        return {'message': 'Вы вышли из листа ожидания'}
+    finally:
+        cur.close()
+        conn.close()
+
+def promote_waitlists() -> dict:
+    """
+    Раздача свободных мест из листов ожидания (по таймеру) — страховка для мест,
+    освободившихся в обход cancel_registration (например, правкой total_spots в админке).
+    Каждое событие — отдельная транзакция, чтобы не держать блокировки всех строк сразу.
+    """
+    conn = get_db_connection()
+    promoted = {}
+    try:
+        with conn.cursor() as cur:
+            event_ids = waitlist.events_to_promote(cur, WAITLIST_PROMOTE_BATCH)
+            conn.commit()
+            for event_id in event_ids:
+                user_ids = waitlist.promote(cur, event_id)
+                if user_ids:
+                    response_cache.bump(cur, 'events')
+                    promoted[event_id] = len(user_ids)
+                conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    print(f"Waitlist promotion: {promoted}")
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'promoted': promoted})
+    }
+
+def is_timer_event(event: dict) -> bool:
+    """Вызов от таймер-триггера Yandex Cloud Functions"""
+    messages = event.get('messages') or []
+    return bool(messages) and all(
+        (message.get('event_metadata') or {}).get('event_type', '').endswith('TimerMessage')
+        for message in messages
+    )
 
 def get_user_registrations(user_id: int) -> list:
     """Получение регистраций пользователя"""
@@ -333,6 +466,9 @@ def handler(event: dict, context) -> dict:
     API для работы с мероприятиями.
     Поддерживает получение списка событий, регистрацию и отмену регистрации.
     """
+    if is_timer_event(event):
+        return promote_waitlists()
+    
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -341,7 +477,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization'
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization, If-None-Match'
             },
             'body': ''
         }
@@ -370,6 +506,10 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'registrations': registrations})
                 }
             
+            body, version = response_cache.get('events', params)
+            if body is not None:
+                return cached_response(event, body, EVENTS_CACHE_POLICY, cache_headers('HIT'))
+            
             if slug or event_id:
                 detail = get_event_detail(
                     slug=slug,
@@ -383,18 +523,12 @@ def handler(event: dict, context) -> dict:
                         'body': json.dumps({'error': 'Событие не найдено'})
                     }
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(detail)
-                }
+                body = json.dumps(detail)
+            else:
+                body = json.dumps(get_events_list(params))
             
-            result = get_events_list(params)
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(result)
-            }
+            response_cache.put('events', params, body, version)
+            return cached_response(event, body, EVENTS_CACHE_POLICY, cache_headers('MISS'))
         
         elif method == 'POST':
             user_id = get_user_id_from_token(headers)
@@ -415,7 +549,7 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'Не указан event_id'})
                 }
             
-            result = register_for_event(event_id, user_id)
+            result = register_for_event(event_id, user_id, join_waitlist=bool(body.get('waitlist')))
             
             if 'error' in result:
                 status = result.pop('status', 400)
@@ -426,7 +560,7 @@ def handler(event: dict, context) -> dict:
                 }
             
             return {
-                'statusCode': 201,
+                'statusCode': 202 if result.get('waitlisted') else 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps(result)
             }
@@ -449,7 +583,10 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'Не указан event_id'})
                 }
             
-            result = cancel_registration(int(event_id), user_id)
+            if params.get('waitlist') == 'true':
+                result = leave_waitlist(int(event_id), user_id)
+            else:
+                result = cancel_registration(int(event_id), user_id)
             
             if 'error' in result:
                 status = result.pop('status', 400)
@@ -471,6 +608,12 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': 'Метод не поддерживается'})
         }
     
+    except InvalidCursorError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -0,0 +1,123 @@
+"""
+Лист ожидания мероприятий.
+Очередь FIFO по id в event_waitlist. Освободившиеся места раздаются одним запросом:
+голова очереди берётся FOR UPDATE SKIP LOCKED (параллельные промоутеры не ждут
+друг друга), в той же транзакции создаются регистрации, списываются места
+и пользователям пишутся уведомления.
+"""
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+
+def join(cur, event_id: int, user_id: int) -> int:
+    """
+    Постановка в очередь в транзакции вызывающего (повторная постановка не меняет позицию)
+
+    Returns:
+        Позиция в очереди, начиная с 1
+    """
+    # Вышедший или уже продвинутый ранее пользователь встаёт в конец очереди
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.event_waitlist
+        WHERE event_id = %s AND user_id = %s AND status <> 'waiting'
+    """, (event_id, user_id))
+    cur.execute(f"""
+        WITH entry AS (
+            INSERT INTO {SCHEMA}.event_waitlist (event_id, user_id)
+            VALUES (%s, %s)
+            ON CONFLICT (event_id, user_id) DO NOTHING
+            RETURNING id
+        ), own AS (
+            SELECT id FROM entry
+            UNION ALL
+            SELECT id FROM {SCHEMA}.event_waitlist WHERE event_id = %s AND user_id = %s
+        )
+        SELECT COUNT(*) + 1
+        FROM {SCHEMA}.event_waitlist
+        WHERE event_id = %s AND status = 'waiting' AND id < (SELECT MIN(id) FROM own)
+    """, (event_id, user_id, event_id, user_id, event_id))
+    return cur.fetchone()[0]
+
+
+def leave(cur, event_id: int, user_id: int) -> bool:
+    cur.execute(f"""
+        UPDATE {SCHEMA}.event_waitlist
+        SET status = 'left'
+        WHERE event_id = %s AND user_id = %s AND status = 'waiting'
+    """, (event_id, user_id))
+    return cur.rowcount > 0
+
+
+def promote(cur, event_id: int) -> list:
+    """
+    Регистрация ожидающих на все свободные места события одним запросом
+    в транзакции вызывающего
+
+    Returns:
+        user_id зарегистрированных из очереди
+    """
+    cur.execute(f"""
+        WITH event AS (
+            SELECT id, title, slug, available_spots
+            FROM {SCHEMA}.events
+            WHERE id = %s
+            FOR UPDATE
+        ), head AS (
+            SELECT w.id, w.user_id
+            FROM {SCHEMA}.event_waitlist w
+            WHERE w.event_id = %s AND w.status = 'waiting'
+              -- Уже зарегистрированный не занимает место в раздаче
+              AND NOT EXISTS (
+                  SELECT 1 FROM {SCHEMA}.event_registrations r
+                  WHERE r.event_id = w.event_id AND r.user_id = w.user_id AND r.status = 'registered'
+              )
+            ORDER BY w.id
+            LIMIT COALESCE((SELECT GREATEST(available_spots, 0) FROM event), 0)
+            FOR UPDATE SKIP LOCKED
+        ), promoted AS (
+            UPDATE {SCHEMA}.event_waitlist w
+            SET status = 'promoted', promoted_at = NOW()
+            FROM head
+            WHERE w.id = head.id
+            RETURNING w.user_id
+        ), reg AS (
+            INSERT INTO {SCHEMA}.event_registrations (event_id, user_id, status)
+            SELECT %s, user_id, 'registered' FROM promoted
+            ON CONFLICT (event_id, user_id) DO UPDATE
+                SET status = 'registered', registered_at = NOW(), canceled_at = NULL
+                WHERE {SCHEMA}.event_registrations.status = 'canceled'
+            RETURNING user_id
+        ), seat AS (
+            UPDATE {SCHEMA}.events
+            SET available_spots = available_spots - (SELECT COUNT(*) FROM reg)
+            WHERE id = %s AND EXISTS (SELECT 1 FROM reg)
+        ), notified AS (
+            INSERT INTO {SCHEMA}.notifications (user_id, title, message, type, link)
+            SELECT reg.user_id, 'Место на мероприятии',
+                   'Освободилось место — вы зарегистрированы на «' || event.title || '»',
+                   'event_waitlist', '/events/' || event.slug
+            FROM reg, event
+        )
+        SELECT user_id FROM reg
+    """, (event_id, event_id, event_id, event_id))
+    return [row[0] for row in cur.fetchall()]
+
+
+def events_to_promote(cur, limit: int) -> list:
+    """События со свободными местами и непустой очередью"""
+    cur.execute(f"""
+        SELECT e.id
+        FROM {SCHEMA}.events e
+        WHERE e.available_spots > 0
+          AND EXISTS (
+              SELECT 1 FROM {SCHEMA}.event_waitlist w
+              WHERE w.event_id = e.id AND w.status = 'waiting'
+                AND NOT EXISTS (
+                    SELECT 1 FROM {SCHEMA}.event_registrations r
+                    WHERE r.event_id = w.event_id AND r.user_id = w.user_id AND r.status = 'registered'
+                )
+          )
+        ORDER BY e.id
+        LIMIT %s
+    """, (limit,))
+    return [row[0] for row in cur.fetchall()]
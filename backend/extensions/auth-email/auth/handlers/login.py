@@ -4,7 +4,7 @@ import os
 from datetime import datetime, timedelta
 
 from utils.db import query_one, execute, escape, get_schema
-from utils.password import verify_password
+from utils.password import hash_password, needs_rehash, verify_password
 from utils.jwt_utils import create_access_token, create_refresh_token, hash_token, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from utils.email import is_email_enabled
 from utils.http import response, error
@@ -31,21 +31,8 @@ def handle(event: dict, origin: str = '*') -> dict:
 
     S = get_schema()
 
-    rate_check = query_one(f"""
-        SELECT failed_login_attempts, last_failed_login_at
-        FROM {S}users WHERE email = {escape(email)}
-    """)
-
-    if rate_check:
-        attempts, last_failed = rate_check
-        if attempts and attempts >= MAX_LOGIN_ATTEMPTS and last_failed:
-            lockout_until = last_failed + timedelta(minutes=LOCKOUT_MINUTES)
-            if datetime.utcnow() < lockout_until:
-                remaining = int((lockout_until - datetime.utcnow()).total_seconds())
-                return error(429, f'Слишком много попыток. Повторите через {remaining // 60 + 1} мин.', origin)
-
     user = query_one(f"""
-        SELECT id, email, name, password_hash, email_verified
+        SELECT id, email, name, password_hash, email_verified, failed_login_attempts, last_failed_login_at
         FROM {S}users WHERE email = {escape(email)}
     """)
 
@@ -54,7 +41,13 @@ def handle(event: dict, origin: str = '*') -> dict:
     if not user:
         return error(401, auth_error_msg, origin)
 
-    user_id, user_email, user_name, stored_hash, email_verified = user
+    user_id, user_email, user_name, stored_hash, email_verified, attempts, last_failed = user
+
+    if attempts and attempts >= MAX_LOGIN_ATTEMPTS and last_failed:
+        lockout_until = last_failed + timedelta(minutes=LOCKOUT_MINUTES)
+        if datetime.utcnow() < lockout_until:
+            remaining = int((lockout_until - datetime.utcnow()).total_seconds())
+            return error(429, f'Слишком много попыток. Повторите через {remaining // 60 + 1} мин.', origin)
 
     if not verify_password(password, stored_hash):
         now = datetime.utcnow().isoformat()
@@ -71,11 +64,13 @@ def handle(event: dict, origin: str = '*') -> dict:
         return error(403, 'Email не подтверждён. Проверьте почту.', origin)
 
     now = datetime.utcnow().isoformat()
+    # Hash stored with an outdated bcrypt cost is replaced while the password is at hand
+    rehash = f", password_hash = {escape(hash_password(password))}" if needs_rehash(stored_hash) else ""
     execute(f"""
         UPDATE {S}users
         SET failed_login_attempts = 0,
             last_failed_login_at = NULL,
-            last_login_at = {escape(now)}
+            last_login_at = {escape(now)}{rehash}
         WHERE id = {escape(user_id)}
     """)
 
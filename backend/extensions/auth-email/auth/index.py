@@ -9,9 +9,14 @@ Routes (via ?action= query parameter):
   POST /auth?action=logout         - Logout and revoke tokens
   POST /auth?action=reset-password - Request/complete password reset
   GET  /auth?action=health         - Check DB schema
+
+Timer trigger invocations send queued emails from email_outbox.
 """
+import json
+
 from handlers import register, login, logout, refresh, reset_password, health, verify_email
 from utils.http import options_response, error, get_origin_from_event
+from utils.email import deliver_outbox
 
 
 ROUTES = {
@@ -28,8 +33,20 @@ ROUTES = {
 GET_ACTIONS = {'health'}
 
 
+def is_timer_event(event: dict) -> bool:
+    """Invocation by a Yandex Cloud Functions timer trigger."""
+    messages = event.get('messages') or []
+    return bool(messages) and all(
+        (message.get('event_metadata') or {}).get('event_type', '').endswith('TimerMessage')
+        for message in messages
+    )
+
+
 def handler(event: dict, context) -> dict:
     """Main router for auth endpoints."""
+    if is_timer_event(event):
+        return {'statusCode': 200, 'body': json.dumps(deliver_outbox())}
+
     method = event.get('httpMethod', 'GET').upper()
     origin = get_origin_from_event(event)
 
@@ -1,15 +1,96 @@
 """Database utilities for Simple Query Protocol."""
 import os
+import threading
+import time
 import psycopg2
+from psycopg2 import extensions, pool
 from typing import Any
 
 
-def get_connection():
-    """Get database connection."""
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
-        raise ValueError('DATABASE_URL not configured')
-    return psycopg2.connect(dsn)
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_PING_INTERVAL = int(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_last_used = {}
+
+
+def _get_pool() -> pool.ThreadedConnectionPool:
+    """Create the connection pool lazily; it lives as long as the warm instance."""
+    global _pool
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                dsn = os.environ.get('DATABASE_URL')
+                if not dsn:
+                    raise ValueError('DATABASE_URL not configured')
+                _pool = pool.ThreadedConnectionPool(0, DB_POOL_MAX_SIZE, dsn)
+    return _pool
+
+
+def _is_alive(conn) -> bool:
+    """Ping the connection with SELECT 1 if it has been idle for a while."""
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_PING_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _release(conn) -> None:
+    """Return connection to the pool, dropping it if it is broken."""
+    broken = bool(conn.closed)
+    if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    if broken:
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    _get_pool().putconn(conn, close=broken)
+
+
+class PooledConnection:
+    """Pooled connection whose close() returns it to the pool."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError('connection already returned to pool')
+        return getattr(self._conn, name)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            _release(conn)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def get_connection() -> PooledConnection:
+    """Get database connection from the warm pool."""
+    db_pool = _get_pool()
+    conn = db_pool.getconn()
+    if not _is_alive(conn):
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+        conn = db_pool.getconn()
+    return PooledConnection(conn)
 
 
 def get_schema() -> str:
@@ -73,4 +154,15 @@ def execute_returning(sql: str):
     conn.commit()
     cur.close()
     conn.close()
-    return result[0] if result else None
\ No newline at end of file
+    return result[0] if result else None
+
+def execute_returning_rows(sql: str) -> list:
+    """Execute UPDATE/INSERT with RETURNING, commit and return all rows."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(sql)
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+    conn.close()
+    return rows
@@ -1,10 +1,23 @@
-"""Email utilities for sending verification codes."""
+"""Email utilities: verification codes are queued in email_outbox and sent by a timer-triggered worker."""
 import os
 import secrets
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from utils.db import execute, execute_returning_rows, escape, get_schema
+
+
+EMAIL_OUTBOX_BATCH = int(os.environ.get('EMAIL_OUTBOX_BATCH', '50'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+# Retry delay: EMAIL_OUTBOX_BACKOFF * 2^(attempt - 1) seconds
+EMAIL_OUTBOX_BACKOFF = int(os.environ.get('EMAIL_OUTBOX_BACKOFF', '60'))
+EMAIL_OUTBOX_LEASE = int(os.environ.get('EMAIL_OUTBOX_LEASE', '300'))
+# A worker run does not start a new batch after this many seconds (function timeout)
+EMAIL_OUTBOX_DRAIN_SECONDS = int(os.environ.get('EMAIL_OUTBOX_DRAIN_SECONDS', '20'))
+SMTP_TIMEOUT = int(os.environ.get('SMTP_TIMEOUT', '10'))
+
 
 def is_email_enabled() -> bool:
     """Check if email sending is configured."""
@@ -17,60 +30,150 @@ def generate_code() -> str:
 
 
 def send_email(to_email: str, subject: str, html_body: str, text_body: str) -> bool:
-    """Send email via SMTP (Gmail by default)."""
-    smtp_host = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_user = os.environ.get('SMTP_USER', '')
-    smtp_password = os.environ.get('SMTP_PASSWORD', '')
-    smtp_from = os.environ.get('SMTP_FROM', smtp_user)
-
-    print(f"[EMAIL] Attempting to send email to {to_email}")
-    print(f"[EMAIL] SMTP: {smtp_host}:{smtp_port}, User: {smtp_user}")
-
-    if not smtp_user or not smtp_password:
-        print("[EMAIL] ERROR: SMTP credentials not configured")
-        return False
-
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = smtp_from
-    msg['To'] = to_email
-
-    msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
-    msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-
+    """Queue email in email_outbox; the timer-triggered worker sends it (see deliver_outbox)."""
+    S = get_schema()
     try:
-        print("[EMAIL] Connecting to SMTP server...")
-        
+        execute(f"""
+            INSERT INTO {S}email_outbox (to_email, subject, text_body, html_body)
+            VALUES ({escape(to_email)}, {escape(subject)}, {escape(text_body)}, {escape(html_body)})
+        """)
+    except Exception as e:
+        print(f"[EMAIL] Failed to queue email to {to_email}: {type(e).__name__}: {str(e)}")
+        return False
+    print(f"[EMAIL] Queued email to {to_email}")
+    return True
+
+
+class SmtpSession:
+    """One SMTP session for the whole worker run; reconnects once if the server drops it."""
+
+    def __init__(self):
+        self.host = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+        self.port = int(os.environ.get('SMTP_PORT', '587'))
+        self.user = os.environ.get('SMTP_USER', '')
+        self.password = os.environ.get('SMTP_PASSWORD', '')
+        self.sender = os.environ.get('SMTP_FROM', self.user)
+        # Local SMTP stand-ins (aiosmtpd) run without TLS: SMTP_STARTTLS=0
+        self.starttls = os.environ.get('SMTP_STARTTLS', '1') != '0'
+        self._server = None
+
+    def connect(self) -> None:
+        if self._server is not None:
+            return
         # Use SMTP_SSL for port 465, SMTP+starttls for port 587
-        if smtp_port == 465:
-            print("[EMAIL] Using SMTP_SSL (port 465)...")
-            with smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=10) as server:
-                print("[EMAIL] Logging in...")
-                server.login(smtp_user, smtp_password)
-                print("[EMAIL] Sending message...")
-                server.sendmail(smtp_from, to_email, msg.as_string())
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT)
         else:
-            print("[EMAIL] Using SMTP+STARTTLS (port 587)...")
-            with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-                print("[EMAIL] Starting TLS...")
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+            if self.starttls:
                 server.starttls()
-                print("[EMAIL] Logging in...")
-                server.login(smtp_user, smtp_password)
-                print("[EMAIL] Sending message...")
-                server.sendmail(smtp_from, to_email, msg.as_string())
-        
-        print("[EMAIL] Email sent successfully!")
-        return True
-    except smtplib.SMTPException as e:
-        print(f"[EMAIL] SMTP ERROR: {type(e).__name__}: {str(e)}")
-        return False
-    except OSError as e:
-        print(f"[EMAIL] Network ERROR: {type(e).__name__}: {str(e)}")
-        return False
-    except Exception as e:
-        print(f"[EMAIL] Unexpected ERROR: {type(e).__name__}: {str(e)}")
-        return False
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        self._server = server
+
+    def send(self, to_email: str, subject: str, text_body: str, html_body: str) -> None:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
+        if html_body:
+            msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+
+        self.connect()
+        try:
+            self._server.sendmail(self.sender, [to_email], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            self.connect()
+            self._server.sendmail(self.sender, [to_email], msg.as_string())
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except OSError:
+                pass
+            self._server = None
+
+
+def _reschedule(S: str, message_id: int, attempts: int, error: Exception, permanent: bool = False) -> str:
+    """Retry with exponential backoff, or give up after EMAIL_OUTBOX_MAX_ATTEMPTS."""
+    last_error = escape(f'{type(error).__name__}: {error}'[:1000])
+    if permanent or attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        execute(f"UPDATE {S}email_outbox SET status = 'failed', last_error = {last_error} WHERE id = {escape(message_id)}")
+        return 'failed'
+    delay = EMAIL_OUTBOX_BACKOFF * 2 ** (attempts - 1)
+    execute(f"""
+        UPDATE {S}email_outbox
+        SET next_attempt_at = NOW() + make_interval(secs => {escape(delay)}), last_error = {last_error}
+        WHERE id = {escape(message_id)}
+    """)
+    return 'retry'
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Rejected recipient or 5xx reply to the message: retrying will not help."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def deliver_outbox() -> dict:
+    """
+    Send due email_outbox messages in batches over one SMTP session.
+
+    Rows are leased with FOR UPDATE SKIP LOCKED, so several workers never send the same message.
+    Returns counters {sent, retry, failed}.
+    """
+    S = get_schema()
+    stats = {'sent': 0, 'retry': 0, 'failed': 0}
+    if not is_email_enabled():
+        print("[EMAIL] SMTP credentials not configured, outbox left as is")
+        return stats
+
+    session = SmtpSession()
+    deadline = time.monotonic() + EMAIL_OUTBOX_DRAIN_SECONDS
+    try:
+        while time.monotonic() < deadline:
+            batch = execute_returning_rows(f"""
+                UPDATE {S}email_outbox o
+                SET attempts = o.attempts + 1,
+                    next_attempt_at = NOW() + make_interval(secs => {escape(EMAIL_OUTBOX_LEASE)})
+                WHERE o.id IN (
+                    SELECT id FROM {S}email_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= NOW()
+                    ORDER BY next_attempt_at
+                    LIMIT {escape(EMAIL_OUTBOX_BATCH)}
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING o.id, o.to_email, o.subject, o.text_body, o.html_body, o.attempts
+            """)
+            if not batch:
+                break
+
+            for index, (message_id, to_email, subject, text_body, html_body, attempts) in enumerate(batch):
+                try:
+                    session.send(to_email, subject, text_body, html_body)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                    stats[_reschedule(S, message_id, attempts, e, permanent=_is_permanent(e))] += 1
+                except OSError as e:
+                    # Server unreachable or refused the session (SMTPException is an OSError too):
+                    # postpone the rest of the batch instead of reconnecting for every message
+                    print(f"[EMAIL] SMTP ERROR: {type(e).__name__}: {str(e)}")
+                    for rest_id, _, _, _, _, rest_attempts in batch[index:]:
+                        stats[_reschedule(S, rest_id, rest_attempts, e)] += 1
+                    return stats
+                else:
+                    execute(f"UPDATE {S}email_outbox SET status = 'sent', sent_at = NOW(), last_error = NULL WHERE id = {escape(message_id)}")
+                    stats['sent'] += 1
+
+            if len(batch) < EMAIL_OUTBOX_BATCH:
+                break
+    finally:
+        session.close()
+    print(f"[EMAIL] Outbox delivered: {stats}")
+    return stats
 
 
 def send_verification_code(to_email: str, code: str) -> bool:
@@ -1,16 +1,82 @@
-"""Password utilities."""
+"""Password utilities.
+
+bcrypt runs in a bounded thread pool: bcrypt releases the GIL, so concurrent
+requests on one instance hash on several cores, and the pool size caps how many
+CPU-bound hashes compete at once. The cost is BCRYPT_ROUNDS when set; otherwise
+it is calibrated once per instance to the highest cost whose hash fits
+BCRYPT_TARGET_MS (each extra round doubles the time). Logins rehash passwords
+stored with an outdated cost.
+"""
+import math
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
 
+BCRYPT_ROUNDS = os.environ.get('BCRYPT_ROUNDS', '')
+BCRYPT_TARGET_MS = float(os.environ.get('BCRYPT_TARGET_MS', '100'))
+BCRYPT_MIN_ROUNDS = int(os.environ.get('BCRYPT_MIN_ROUNDS', '10'))
+BCRYPT_MAX_ROUNDS = int(os.environ.get('BCRYPT_MAX_ROUNDS', '14'))
+BCRYPT_THREADS = int(os.environ.get('BCRYPT_THREADS', '0')) or os.cpu_count() or 1
+
+# Calibration hashes at a cheap cost and extrapolates
+_CALIBRATION_ROUNDS = 8
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_THREADS, thread_name_prefix='bcrypt')
+_rounds = None
+_lock = threading.Lock()
+
+
+def _calibrate() -> int:
+    """Highest cost within [BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS] that fits BCRYPT_TARGET_MS."""
+    salt = bcrypt.gensalt(rounds=_CALIBRATION_ROUNDS)
+    started = time.perf_counter()
+    bcrypt.hashpw(b'calibration', salt)
+    elapsed_ms = max((time.perf_counter() - started) * 1000, 0.01)
+    rounds = _CALIBRATION_ROUNDS + math.floor(math.log2(BCRYPT_TARGET_MS / elapsed_ms))
+    rounds = min(max(rounds, BCRYPT_MIN_ROUNDS), BCRYPT_MAX_ROUNDS)
+    print(f"[PASSWORD] bcrypt cost {rounds}: {elapsed_ms:.1f} ms at cost {_CALIBRATION_ROUNDS}, "
+          f"target {BCRYPT_TARGET_MS:.0f} ms")
+    return rounds
+
+
+def current_rounds() -> int:
+    """bcrypt cost for new hashes on this instance."""
+    global _rounds
+    if _rounds is None:
+        with _lock:
+            if _rounds is None:
+                _rounds = int(BCRYPT_ROUNDS) if BCRYPT_ROUNDS else _calibrate()
+    return _rounds
+
+
 def hash_password(password: str) -> str:
-    """Hash password using bcrypt with cost factor 12."""
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=12)).decode()
+    """Hash password using bcrypt with the instance cost, off the request thread."""
+    salt = bcrypt.gensalt(rounds=current_rounds())
+    return _executor.submit(bcrypt.hashpw, password.encode(), salt).result().decode()
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    """Verify password against bcrypt hash."""
-    return bcrypt.checkpw(password.encode(), password_hash.encode())
+    """Verify password against bcrypt hash, off the request thread."""
+    return _executor.submit(bcrypt.checkpw, password.encode(), password_hash.encode()).result()
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """
+    Stored cost differs from the configured one. A calibrated cost only upgrades:
+    instances on different hardware must not rehash the same user back and forth.
+    """
+    try:
+        stored = int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return False
+    if BCRYPT_ROUNDS:
+        return stored != current_rounds()
+    return stored < current_rounds()
 
 
 def validate_password(password: str) -> tuple[bool, str]:
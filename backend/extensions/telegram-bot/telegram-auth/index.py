@@ -111,15 +111,6 @@ def mark_token_used(cursor, token: str) -> bool:
     return cursor.fetchone() is not None
 
 
-def cleanup_expired_tokens(cursor) -> None:
-    """Remove expired auth tokens."""
-    schema = get_schema()
-    cursor.execute(f"""
-        DELETE FROM {schema}telegram_auth_tokens
-        WHERE expires_at < NOW() OR (used_at IS NOT NULL AND created_at < NOW() - INTERVAL '1 hour')
-    """)
-
-
 def find_user_by_telegram_id(cursor, telegram_id: str) -> Optional[dict]:
     """Find user by Telegram ID."""
     schema = get_schema()
@@ -241,12 +232,6 @@ def get_user_by_id(cursor, user_id: int) -> Optional[dict]:
     return None
 
 
-def cleanup_expired_refresh_tokens(cursor) -> None:
-    """Remove expired refresh tokens."""
-    schema = get_schema()
-    cursor.execute(f"DELETE FROM {schema}telegram_refresh_tokens WHERE expires_at < NOW()")
-
-
 # =============================================================================
 # CORS HELPERS
 # =============================================================================
@@ -427,13 +412,6 @@ def handler(event, context):
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Cleanup expired tokens periodically (ignore errors)
-        try:
-            cleanup_expired_tokens(cursor)
-            cleanup_expired_refresh_tokens(cursor)
-        except Exception as cleanup_error:
-            print(f"[WARNING] Cleanup failed: {cleanup_error}")
-
         # Route to action handler
         if action == "callback" and method == "POST":
             response = handle_callback(cursor, body)
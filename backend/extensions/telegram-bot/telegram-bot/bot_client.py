@@ -0,0 +1,97 @@
+"""
+Клиент Bot API на уровне инстанса функции.
+
+TeleBot и requests.Session создаются один раз и переживают тёплые вызовы: соединение
+с api.telegram.org (TCP + TLS) держится keep-alive и не устанавливается заново на каждое
+сообщение. Все запросы telebot идут через send_request — он же замеряет задержку
+каждого вызова Bot API.
+"""
+
+import os
+import threading
+import time
+
+import requests
+import telebot
+from requests.adapters import HTTPAdapter
+
+
+# Соединений в пуле к одному хосту — не меньше потоков воркера рассылки
+TELEGRAM_HTTP_POOL_SIZE = int(os.environ.get("TELEGRAM_HTTP_POOL_SIZE", "8"))
+# Печатать в лог вызовы Bot API не быстрее этого порога; 0 — каждый вызов (для отладки)
+TELEGRAM_SLOW_REQUEST_MS = float(os.environ.get("TELEGRAM_SLOW_REQUEST_MS", "500"))
+
+_session = None
+_bots = {}
+_lock = threading.Lock()
+_stats = {}
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TELEGRAM_HTTP_POOL_SIZE, pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def send_request(method: str, url: str, **kwargs) -> requests.Response:
+    """Request sender for telebot: shared keep-alive session plus per-call latency."""
+    api_method = url.rsplit("/", 1)[-1]
+    started = time.perf_counter()
+    status = None
+    try:
+        response = get_session().request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _lock:
+            entry = _stats.setdefault(api_method, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["errors"] += status is None or status >= 400
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        if elapsed_ms >= TELEGRAM_SLOW_REQUEST_MS:
+            print(f"[TELEGRAM] {api_method} {status or 'error'} in {elapsed_ms:.1f} ms")
+
+
+telebot.apihelper.CUSTOM_REQUEST_SENDER = send_request
+
+# Локальный фейковый Bot API для проверок: TELEGRAM_API_URL=http://127.0.0.1:8081/bot{0}/{1}
+if os.environ.get("TELEGRAM_API_URL"):
+    telebot.apihelper.API_URL = os.environ["TELEGRAM_API_URL"]
+
+
+def get_bot(token: str) -> telebot.TeleBot:
+    """TeleBot for the token, created once per instance."""
+    bot = _bots.get(token)
+    if bot is None:
+        with _lock:
+            bot = _bots.setdefault(token, telebot.TeleBot(token, threaded=False))
+    return bot
+
+
+def stats() -> dict:
+    """Latency per Bot API method and HTTP connections created in the pool since the instance started."""
+    with _lock:
+        methods = {
+            name: {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "avg_ms": round(entry["total_ms"] / entry["calls"], 1),
+                "max_ms": round(entry["max_ms"], 1),
+            }
+            for name, entry in _stats.items()
+        }
+    pooled = 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            pooled += sum(pools[key].num_connections for key in pools.keys())
+    return {"methods": methods, "pooled_connections": pooled}
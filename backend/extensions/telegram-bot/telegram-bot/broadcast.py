@@ -0,0 +1,213 @@
+"""
+Очередь рассылок Telegram (telegram_outbox).
+
+action=broadcast ставит по строке на каждый чат; воркер (вызов функции по таймеру)
+арендует пачки через FOR UPDATE SKIP LOCKED и рассылает их несколькими потоками.
+Общий token bucket держит глобальный лимит Bot API (TELEGRAM_GLOBAL_RATE, 30 сообщений/с),
+в каждый чат — не чаще раза в TELEGRAM_CHAT_INTERVAL секунд. Ответ 429 приостанавливает
+отправку на retry_after из ответа, после чего сообщение отправляется снова.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import telebot
+from psycopg2.extras import execute_values
+
+
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", "30"))
+# Запас токенов: 1 — ровный темп без всплесков в начале прохода
+TELEGRAM_GLOBAL_BURST = float(os.environ.get("TELEGRAM_GLOBAL_BURST", "1"))
+TELEGRAM_CHAT_INTERVAL = float(os.environ.get("TELEGRAM_CHAT_INTERVAL", "1"))
+TELEGRAM_WORKER_THREADS = int(os.environ.get("TELEGRAM_WORKER_THREADS", "8"))
+TELEGRAM_OUTBOX_BATCH = int(os.environ.get("TELEGRAM_OUTBOX_BATCH", "300"))
+TELEGRAM_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("TELEGRAM_OUTBOX_MAX_ATTEMPTS", "5"))
+# Задержка перед повтором: TELEGRAM_OUTBOX_BACKOFF * 2^(попытка - 1) секунд
+TELEGRAM_OUTBOX_BACKOFF = int(os.environ.get("TELEGRAM_OUTBOX_BACKOFF", "30"))
+TELEGRAM_OUTBOX_LEASE = int(os.environ.get("TELEGRAM_OUTBOX_LEASE", "120"))
+# Проход воркера укладывается в этот срок (таймаут функции)
+TELEGRAM_DRAIN_SECONDS = int(os.environ.get("TELEGRAM_DRAIN_SECONDS", "50"))
+TELEGRAM_BROADCAST_MAX_CHATS = int(os.environ.get("TELEGRAM_BROADCAST_MAX_CHATS", "10000"))
+
+
+class RateLimiter:
+    """Token bucket for the global limit plus a minimum interval per chat; shared by worker threads."""
+
+    def __init__(self, rate: float, burst: float, chat_interval: float):
+        self.rate = rate
+        self.burst = burst
+        self.chat_interval = chat_interval
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_next = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, chat_id: str, deadline: float) -> bool:
+        """Wait for a send slot; False if it would come after the deadline."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = max(
+                    self._paused_until - now,
+                    self._chat_next.get(chat_id, 0.0) - now,
+                    (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0,
+                )
+                if wait <= 0:
+                    self._tokens -= 1
+                    self._chat_next[chat_id] = now + self.chat_interval
+                    return True
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float, chat_id: str) -> None:
+        """429: Telegram does not say which limit was hit, so both the chat and the bot back off."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._paused_until = max(self._paused_until, until)
+            self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), until)
+
+
+def enqueue(conn, schema: str, chat_ids: list, kind: str, payload: dict) -> str:
+    """Queue one message per chat in the caller's transaction; returns broadcast_id."""
+    broadcast_id = str(uuid.uuid4())
+    body = json.dumps(payload)
+    with conn.cursor() as cur:
+        execute_values(cur, f"""
+            INSERT INTO {schema}telegram_outbox (broadcast_id, chat_id, kind, payload)
+            VALUES %s
+        """, [(broadcast_id, str(chat_id), kind, body) for chat_id in chat_ids], page_size=1000)
+    return broadcast_id
+
+
+def send(bot: telebot.TeleBot, kind: str, chat_id: str, payload: dict) -> None:
+    if kind == "photo":
+        bot.send_photo(
+            chat_id=chat_id,
+            photo=payload["photo_url"],
+            caption=payload.get("caption") or None,
+            parse_mode=payload.get("parse_mode", "HTML"),
+            disable_notification=payload.get("silent", False),
+        )
+    else:
+        bot.send_message(
+            chat_id=chat_id,
+            text=payload["text"],
+            parse_mode=payload.get("parse_mode", "HTML"),
+            disable_notification=payload.get("silent", False),
+            disable_web_page_preview=True,
+        )
+
+
+def deliver(bot: telebot.TeleBot, limiter: RateLimiter, row: tuple, deadline: float) -> tuple:
+    """
+    Send one queued message, waiting out 429 responses.
+
+    Returns:
+        (id, outcome, error): outcome is sent, failed (4xx — retrying will not help),
+        retry (network or 5xx) or requeue (deadline reached before a send slot)
+    """
+    message_id, chat_id, kind, payload = row
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    while True:
+        if not limiter.acquire(chat_id, deadline):
+            return message_id, "requeue", None
+        try:
+            send(bot, kind, chat_id, payload)
+            return message_id, "sent", None
+        except telebot.apihelper.ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = ((e.result_json or {}).get("parameters") or {}).get("retry_after", 1)
+                print(f"[BROADCAST] 429 for chat {chat_id}, retry after {retry_after}s")
+                limiter.pause(retry_after, chat_id)
+                continue
+            if 400 <= e.error_code < 500:
+                return message_id, "failed", f"{e.error_code}: {e.description}"
+            return message_id, "retry", f"{e.error_code}: {e.description}"
+        except Exception as e:
+            return message_id, "retry", f"{type(e).__name__}: {e}"
+
+
+def _claim(cur, schema: str, limit: int) -> list:
+    cur.execute(f"""
+        UPDATE {schema}telegram_outbox o
+        SET attempts = o.attempts + 1,
+            next_attempt_at = NOW() + make_interval(secs => %s)
+        WHERE o.id IN (
+            SELECT id FROM {schema}telegram_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ORDER BY next_attempt_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING o.id, o.chat_id, o.kind, o.payload, o.attempts
+    """, (TELEGRAM_OUTBOX_LEASE, limit))
+    return cur.fetchall()
+
+
+def _record(cur, schema: str, attempts: int, result: tuple, stats: dict) -> None:
+    """Write the outcome of one message; attempts already counts the current one."""
+    message_id, outcome, error = result
+    if outcome == "retry" and attempts >= TELEGRAM_OUTBOX_MAX_ATTEMPTS:
+        outcome = "failed"
+    stats[outcome] = stats.get(outcome, 0) + 1
+
+    if outcome == "sent":
+        cur.execute(f"""
+            UPDATE {schema}telegram_outbox SET status = 'sent', sent_at = NOW(), last_error = NULL
+            WHERE id = %s
+        """, (message_id,))
+    elif outcome == "requeue":
+        # Не отправлялось: попытка не засчитывается, строка снова доступна следующему проходу
+        cur.execute(f"""
+            UPDATE {schema}telegram_outbox SET attempts = attempts - 1, next_attempt_at = NOW()
+            WHERE id = %s
+        """, (message_id,))
+    elif outcome == "failed":
+        cur.execute(f"""
+            UPDATE {schema}telegram_outbox SET status = 'failed', last_error = %s WHERE id = %s
+        """, (error, message_id))
+    else:
+        cur.execute(f"""
+            UPDATE {schema}telegram_outbox
+            SET next_attempt_at = NOW() + make_interval(secs => %s), last_error = %s
+            WHERE id = %s
+        """, (TELEGRAM_OUTBOX_BACKOFF * 2 ** (attempts - 1), error, message_id))
+
+
+def drain(conn, schema: str, bot: telebot.TeleBot) -> dict:
+    """
+    Send due queued messages concurrently under the rate limits until the queue
+    is empty or TELEGRAM_DRAIN_SECONDS run out. Each outcome is committed as soon
+    as its send finishes, so an instance killed mid-batch does not resend
+    messages that were already delivered.
+
+    Returns:
+        Counters {sent, failed, retry, requeue}
+    """
+    limiter = RateLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST, TELEGRAM_CHAT_INTERVAL)
+    deadline = time.monotonic() + TELEGRAM_DRAIN_SECONDS
+    stats = {"sent": 0, "failed": 0, "retry": 0, "requeue": 0}
+
+    with ThreadPoolExecutor(max_workers=TELEGRAM_WORKER_THREADS) as pool, conn.cursor() as cur:
+        while time.monotonic() < deadline:
+            rows = _claim(cur, schema, TELEGRAM_OUTBOX_BATCH)
+            conn.commit()
+            if not rows:
+                break
+            futures = {pool.submit(deliver, bot, limiter, row[:4], deadline): row[4] for row in rows}
+            # Курсор и фиксация — только в этом потоке; потоки пула лишь отправляют
+            for future in as_completed(futures):
+                _record(cur, schema, futures[future], future.result(), stats)
+                conn.commit()
+            if len(rows) < TELEGRAM_OUTBOX_BATCH:
+                break
+    return stats
@@ -4,19 +4,25 @@ Telegram Bot Function
 Обрабатывает:
 1. Webhook от Telegram для авторизации через /start web_auth
 2. Отправку уведомлений через API (action=send, action=send-photo)
-3. Тестовые сообщения (action=test)
+3. Рассылку через очередь (action=broadcast) — отправляет воркер по таймеру
+4. Тестовые сообщения (action=test)
 """
 
+import hmac
 import json
 import os
 import uuid
 import hashlib
+import time
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
 import psycopg2
 import telebot
 
+import bot_client
+import broadcast
+
 
 # =============================================================================
 # CONFIGURATION
@@ -31,8 +37,8 @@ def get_bot_token() -> str:
 
 
 def get_bot() -> telebot.TeleBot:
-    """Create bot instance."""
-    return telebot.TeleBot(get_bot_token())
+    """Bot instance cached for the lifetime of the function instance."""
+    return bot_client.get_bot(get_bot_token())
 
 
 def get_default_chat_id() -> str:
@@ -55,7 +61,7 @@ def get_cors_headers() -> dict:
     return {
         "Access-Control-Allow-Origin": allowed_origins,
         "Access-Control-Allow-Methods": "POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, X-Telegram-Bot-Api-Secret-Token",
+        "Access-Control-Allow-Headers": "Content-Type, X-Telegram-Bot-Api-Secret-Token, X-Broadcast-Secret",
     }
 
 
@@ -166,6 +172,7 @@ def process_webhook(body: dict) -> dict:
         print("[WEBHOOK] No chat_id")
         return {"statusCode": 200, "body": json.dumps({"ok": True})}
 
+    started = time.perf_counter()
     try:
         if text.startswith("/start"):
             parts = text.split(" ", 1)
@@ -183,6 +190,7 @@ def process_webhook(body: dict) -> dict:
         import traceback
         print(f"[ERROR] Traceback: {traceback.format_exc()}")
 
+    print(f"[WEBHOOK] Handled in {(time.perf_counter() - started) * 1000:.1f} ms")
     return {"statusCode": 200, "body": json.dumps({"ok": True})}
 
 
@@ -268,6 +276,78 @@ def handle_send_photo(body: dict) -> dict:
         return cors_response(500, {"error": str(e)})
 
 
+def is_broadcast_authorized(headers: dict) -> bool:
+    """X-Broadcast-Secret matches TELEGRAM_BROADCAST_SECRET; broadcasts are disabled without it."""
+    secret = os.environ.get("TELEGRAM_BROADCAST_SECRET", "")
+    if not secret:
+        return False
+    headers_lower = {k.lower(): v for k, v in (headers or {}).items()}
+    request_secret = headers_lower.get("x-broadcast-secret") or ""
+    return hmac.compare_digest(request_secret.encode(), secret.encode())
+
+
+def handle_broadcast(body: dict) -> dict:
+    """
+    POST ?action=broadcast
+    Queue a text message (or a photo with photo_url) for many chats.
+    Delivery happens in the timer-triggered worker under Telegram rate limits.
+    Requires the X-Broadcast-Secret header (checked in handler).
+    """
+    chat_ids = body.get("chat_ids")
+    text = body.get("text", "").strip()
+    photo_url = body.get("photo_url", "").strip()
+    caption = body.get("caption", "").strip()
+
+    if not isinstance(chat_ids, list) or not chat_ids:
+        return cors_response(400, {"error": "chat_ids must be a non-empty list"})
+
+    # Повторы chat_id в одной рассылке не нужны; порядок сохраняется
+    chat_ids = list(dict.fromkeys(str(chat_id) for chat_id in chat_ids if chat_id))
+    if len(chat_ids) > broadcast.TELEGRAM_BROADCAST_MAX_CHATS:
+        return cors_response(400, {"error": f"Too many chats (max {broadcast.TELEGRAM_BROADCAST_MAX_CHATS})"})
+
+    if photo_url:
+        if len(caption) > 1024:
+            return cors_response(400, {"error": "Caption too long (max 1024 characters)"})
+        kind, payload = "photo", {"photo_url": photo_url, "caption": caption}
+    elif text:
+        if len(text) > 4096:
+            return cors_response(400, {"error": "Message too long (max 4096 characters)"})
+        kind, payload = "message", {"text": text}
+    else:
+        return cors_response(400, {"error": "text or photo_url is required"})
+
+    payload["parse_mode"] = body.get("parse_mode", "HTML")
+    payload["silent"] = bool(body.get("silent", False))
+
+    try:
+        conn = psycopg2.connect(os.environ["DATABASE_URL"])
+        try:
+            broadcast_id = broadcast.enqueue(conn, get_schema(), chat_ids, kind, payload)
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        return cors_response(500, {"error": str(e)})
+
+    return cors_response(202, {
+        "success": True,
+        "broadcast_id": broadcast_id,
+        "queued": len(chat_ids),
+    })
+
+
+def drain_broadcasts() -> dict:
+    """Timer trigger: send queued broadcast messages."""
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        stats = broadcast.drain(conn, get_schema(), get_bot())
+    finally:
+        conn.close()
+    print(f"[BROADCAST] Drained: {stats}, Bot API: {bot_client.stats()}")
+    return {"statusCode": 200, "body": json.dumps(stats)}
+
+
 def handle_test(body: dict) -> dict:
     """
     POST ?action=test
@@ -309,8 +389,20 @@ def handle_test(body: dict) -> dict:
 # MAIN HANDLER
 # =============================================================================
 
+def is_timer_event(event: dict) -> bool:
+    """Invocation by a Yandex Cloud Functions timer trigger."""
+    messages = event.get("messages") or []
+    return bool(messages) and all(
+        (message.get("event_metadata") or {}).get("event_type", "").endswith("TimerMessage")
+        for message in messages
+    )
+
+
 def handler(event: dict, context) -> dict:
     """Main entry point."""
+    if is_timer_event(event):
+        return drain_broadcasts()
+
     method = event.get("httpMethod", "POST")
 
     if method == "OPTIONS":
@@ -333,6 +425,10 @@ def handler(event: dict, context) -> dict:
             return handle_send(body)
         elif action == "send-photo" and method == "POST":
             return handle_send_photo(body)
+        elif action == "broadcast" and method == "POST":
+            if not is_broadcast_authorized(event.get("headers")):
+                return cors_response(403, {"error": "Forbidden"})
+            return handle_broadcast(body)
         elif action == "test" and method == "POST":
             return handle_test(body)
         else:
@@ -92,12 +92,6 @@ def hash_token(token: str) -> str:
     return hashlib.sha256(token.encode()).hexdigest()
 
 
-def cleanup_expired_tokens(cur, S: str):
-    """Remove expired refresh tokens."""
-    now = datetime.now(timezone.utc).isoformat()
-    cur.execute(f"DELETE FROM {S}refresh_tokens WHERE expires_at < %s", (now,))
-
-
 # =============================================================================
 # YANDEX API
 # =============================================================================
@@ -290,8 +284,6 @@ def handle_callback(event: dict, origin: str) -> dict:
             cur = conn.cursor()
             now = datetime.now(timezone.utc).isoformat()
 
-            cleanup_expired_tokens(cur, S)
-
             # 1. Check if user exists by yandex_id
             cur.execute(
                 f"SELECT id, email, name, avatar_url FROM {S}users WHERE yandex_id = %s",
@@ -409,9 +401,6 @@ def handle_refresh(event: dict, origin: str) -> dict:
     try:
         cur = conn.cursor()
         now = datetime.now(timezone.utc).isoformat()
-        
-        # Clean expired tokens
-        cleanup_expired_tokens(cur, S)
 
         # Find token
         token_hash = hash_token(refresh_token)
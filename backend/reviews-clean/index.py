@@ -3,17 +3,18 @@ API для работы с отзывами.
 Поддерживает создание, получение и модерацию отзывов для бань, мастеров и событий.
 """
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
+import jwt_auth
+import ratings
+import response_cache
 
 SCHEMA = 't_p13705114_spa_community_portal'
 
 
 def get_db_connection():
     """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
 
 
 def get_user_id_from_token(headers: dict) -> int:
@@ -22,6 +23,13 @@ def get_user_id_from_token(headers: dict) -> int:
     if not token:
         raise ValueError('Требуется авторизация')
     
+    # JWT от функции auth: в user_sessions.session_token лежит только jti
+    if jwt_auth.is_jwt(token):
+        user_id = jwt_auth.verify(token)
+        if not user_id:
+            raise ValueError('Невалидный токен')
+        return user_id
+    
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
@@ -164,19 +172,8 @@ def get_reviews(entity_type: str, entity_id: int) -> dict:
                     }
                 })
             
-            # Получение статистики
-            cursor.execute(
-                f"""
-                SELECT COALESCE(AVG(rating)::numeric(3,1), 0) as avg_rating, COUNT(*) as total_count
-                FROM {SCHEMA}.reviews
-                WHERE entity_type = %s AND entity_id = %s AND is_approved = true
-                """,
-                (entity_type, entity_id)
-            )
-            
-            stats = cursor.fetchone()
-            avg_rating = float(stats['avg_rating']) if stats['avg_rating'] else 0.0
-            total_count = int(stats['total_count']) if stats['total_count'] else 0
+            # Статистика из агрегатов в строке сущности
+            avg_rating, total_count = ratings.get_stats(cursor, entity_type, entity_id)
             
             return {
                 'reviews': reviews,
@@ -238,32 +235,10 @@ def create_review(user_id: int, data: dict) -> dict:
             review_id = result['id']
             created_at = result['created_at']
             
-            # Обновление рейтинга сущности
-            table_map = {
-                'bath': 'baths',
-                'master': 'masters',
-                'event': 'events'
-            }
-            table_name = table_map.get(entity_type)
-            
+            # Обновление агрегатов рейтинга сущности за O(1)
+            table_name = ratings.add_review(cursor, entity_type, int(entity_id), rating)
             if table_name:
-                cursor.execute(
-                    f"""
-                    UPDATE {SCHEMA}.{table_name}
-                    SET rating = (
-                        SELECT AVG(rating)::numeric(2,1) 
-                        FROM {SCHEMA}.reviews
-                        WHERE entity_type = %s AND entity_id = %s AND is_approved = true
-                    ),
-                    reviews_count = (
-                        SELECT COUNT(*) 
-                        FROM {SCHEMA}.reviews
-                        WHERE entity_type = %s AND entity_id = %s AND is_approved = true
-                    )
-                    WHERE id = %s
-                    """,
-                    (entity_type, entity_id, entity_type, entity_id, entity_id)
-                )
+                response_cache.bump(cursor, table_name)
             
             conn.commit()
             
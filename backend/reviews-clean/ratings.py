@@ -0,0 +1,83 @@
+"""
+Агрегаты рейтинга сущностей (бань, мастеров, мероприятий).
+В строке сущности хранятся rating_sum и reviews_count одобренных отзывов: новый отзыв
+обновляет их за O(1), чтение статистики — одна строка по первичному ключу.
+reconcile() пересчитывает агрегаты по таблице reviews и исправляет расхождения
+(модерация, удаление отзывов в обход API) — запускается по таймеру.
+"""
+from typing import Optional
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+ENTITY_TABLES = {
+    'bath': 'baths',
+    'master': 'masters',
+    'event': 'events'
+}
+
+# Средняя оценка с округлением до десятых; 0 у сущности без отзывов
+AVERAGE_SQL = "COALESCE(ROUND({sum}::numeric / NULLIF({count}, 0), 1), 0)"
+
+
+def add_review(cur, entity_type: str, entity_id: int, rating: int) -> Optional[str]:
+    """
+    Учёт нового одобренного отзыва в транзакции вызывающего
+
+    Returns:
+        Имя таблицы сущности (область кэша ответов) или None для неизвестного типа
+    """
+    table = ENTITY_TABLES.get(entity_type)
+    if not table:
+        return None
+    # В SET справа видны значения строки до обновления
+    cur.execute(f"""
+        UPDATE {SCHEMA}.{table}
+        SET rating_sum = rating_sum + %s,
+            reviews_count = COALESCE(reviews_count, 0) + 1,
+            rating = {AVERAGE_SQL.format(sum='rating_sum + %s', count='COALESCE(reviews_count, 0) + 1')}
+        WHERE id = %s
+    """, (rating, rating, entity_id))
+    return table
+
+
+def get_stats(cur, entity_type: str, entity_id: int) -> tuple[float, int]:
+    """(средняя оценка, число отзывов) из строки сущности"""
+    table = ENTITY_TABLES[entity_type]
+    cur.execute(f"SELECT rating, reviews_count FROM {SCHEMA}.{table} WHERE id = %s", (entity_id,))
+    row = cur.fetchone()
+    if not row:
+        return 0.0, 0
+    if isinstance(row, dict):
+        rating, count = row['rating'], row['reviews_count']
+    else:
+        rating, count = row
+    return float(rating or 0), int(count or 0)
+
+
+def reconcile(cur) -> dict:
+    """
+    Пересчёт агрегатов по reviews для всех сущностей
+
+    Returns:
+        {таблица: число исправленных строк}
+    """
+    fixed = {}
+    for entity_type, table in ENTITY_TABLES.items():
+        cur.execute(f"""
+            UPDATE {SCHEMA}.{table} e
+            SET rating_sum = s.rating_sum,
+                reviews_count = s.reviews_count,
+                rating = {AVERAGE_SQL.format(sum='s.rating_sum', count='s.reviews_count')}
+            FROM (
+                SELECT t.id, COALESCE(SUM(r.rating), 0) AS rating_sum, COUNT(r.id) AS reviews_count
+                FROM {SCHEMA}.{table} t
+                LEFT JOIN {SCHEMA}.reviews r
+                    ON r.entity_type = %s AND r.entity_id = t.id AND r.is_approved = true
+                GROUP BY t.id
+            ) s
+            WHERE e.id = s.id
+              AND (e.rating_sum, COALESCE(e.reviews_count, 0), e.rating)
+                  IS DISTINCT FROM (s.rating_sum, s.reviews_count, {AVERAGE_SQL.format(sum='s.rating_sum', count='s.reviews_count')})
+        """, (entity_type,))
+        fixed[table] = cur.rowcount
+    return fixed
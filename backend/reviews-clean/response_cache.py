@@ -0,0 +1,146 @@
+"""
+Кэш тел публичных GET-ответов в памяти тёплого инстанса.
+LRU ограниченного размера, ключ — область (baths, masters, events, blog) и нормализованные
+параметры запроса, запись живёт не дольше RESPONSE_CACHE_TTL секунд.
+Запись данных увеличивает счётчик области в content_version; инстансы сверяют счётчики
+одним запросом не чаще раза в RESPONSE_CACHE_VERSION_CHECK секунд и не отдают записи
+со старой версией. После сверки счётчики попаданий и промахов пишутся в лог не чаще
+раза в RESPONSE_CACHE_STATS_INTERVAL секунд.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from db import get_connection
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '256'))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '60'))
+RESPONSE_CACHE_MAX_BODY = int(os.environ.get('RESPONSE_CACHE_MAX_BODY', str(256 * 1024)))
+RESPONSE_CACHE_VERSION_CHECK = float(os.environ.get('RESPONSE_CACHE_VERSION_CHECK', '1'))
+# 0 — не писать счётчики в лог
+RESPONSE_CACHE_STATS_INTERVAL = float(os.environ.get('RESPONSE_CACHE_STATS_INTERVAL', '60'))
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_versions = {}
+_versions_checked_at = None
+_hits = 0
+_misses = 0
+_stats_logged_at = None
+
+
+def _key(scope: str, params: dict) -> str:
+    """Порядок параметров и пустые значения на ключ не влияют"""
+    normalized = sorted((str(k), str(v)) for k, v in (params or {}).items() if v not in (None, ''))
+    return scope + '?' + json.dumps(normalized, separators=(',', ':'), ensure_ascii=False)
+
+
+def _read_versions() -> dict:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT scope, version FROM {SCHEMA}.content_version")
+            return {row[0]: row[1] for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def _current_version(scope: str) -> Optional[int]:
+    """Версия области; None — сверка не удалась, и кэшу доверять нельзя"""
+    global _versions, _versions_checked_at
+    now = time.monotonic()
+    if _versions_checked_at is None or now - _versions_checked_at >= RESPONSE_CACHE_VERSION_CHECK:
+        try:
+            versions = _read_versions()
+        except Exception:
+            with _lock:
+                _entries.clear()
+                _versions_checked_at = None
+            return None
+        with _lock:
+            _versions = versions
+            _versions_checked_at = now
+        _log_stats(now)
+    return _versions.get(scope, 0)
+
+
+def _log_stats(now: float) -> None:
+    global _stats_logged_at
+    if not RESPONSE_CACHE_STATS_INTERVAL:
+        return
+    with _lock:
+        if _stats_logged_at is None:
+            # Первая сверка только начинает отсчёт: до неё счётчики пусты
+            _stats_logged_at = now
+            return
+        if now - _stats_logged_at < RESPONSE_CACHE_STATS_INTERVAL:
+            return
+        _stats_logged_at = now
+    print(f"[RESPONSE_CACHE] {json.dumps(stats())}")
+
+
+def get(scope: str, params: dict) -> tuple[Optional[str], Optional[int]]:
+    """
+    Тело ответа из кэша
+
+    Returns:
+        (body или None, версия области) — версию нужно передать в put() после запроса к БД,
+        чтобы ответ, собранный до чужой записи, не сохранился под новой версией
+    """
+    global _hits, _misses
+    version = _current_version(scope)
+    key = _key(scope, params)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            body, entry_version, expires = entry
+            if version is not None and entry_version == version and expires > time.monotonic():
+                _entries.move_to_end(key)
+                _hits += 1
+                return body, version
+            del _entries[key]
+        _misses += 1
+    return None, version
+
+
+def put(scope: str, params: dict, body: str, version: Optional[int]) -> None:
+    if version is None or len(body) > RESPONSE_CACHE_MAX_BODY:
+        return
+    key = _key(scope, params)
+    with _lock:
+        _entries[key] = (body, version, time.monotonic() + RESPONSE_CACHE_TTL)
+        _entries.move_to_end(key)
+        while len(_entries) > RESPONSE_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def stats() -> dict:
+    """Счётчики попаданий и промахов с момента старта инстанса"""
+    with _lock:
+        total = _hits + _misses
+        return {
+            'hits': _hits,
+            'misses': _misses,
+            'hit_ratio': round(_hits / total, 3) if total else 0.0,
+            'entries': len(_entries)
+        }
+
+
+def clear() -> None:
+    global _versions_checked_at
+    with _lock:
+        _entries.clear()
+        _versions_checked_at = None
+
+
+def bump(cur, *scopes: str) -> None:
+    """Увеличение счётчиков областей в транзакции вызывающего (запись в baths, masters, events, blog)"""
+    cur.execute(f"""
+        UPDATE {SCHEMA}.content_version
+        SET version = version + 1, updated_at = NOW()
+        WHERE scope = ANY(%s)
+    """, (list(scopes),))
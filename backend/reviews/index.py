@@ -1,12 +1,14 @@
 import json
-import os
-import psycopg2
 from datetime import datetime
+from db import get_connection
+import session_cache
+import jwt_auth
+import response_cache
+import ratings
 
 def get_db_connection():
     """Создание подключения к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
 
 def get_user_id_from_token(headers: dict) -> int:
     """Извлечение user_id из токена"""
@@ -14,11 +16,21 @@ def get_user_id_from_token(headers: dict) -> int:
     if not token:
         raise ValueError('Требуется авторизация')
     
+    if jwt_auth.is_jwt(token):
+        user_id = jwt_auth.verify(token)
+        if not user_id:
+            raise ValueError('Невалидный токен')
+        return user_id
+    
+    user_id = session_cache.get(token)
+    if user_id:
+        return user_id
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT user_id FROM t_p13705114_spa_community_portal.user_sessions 
+        SELECT user_id, access_expires_at FROM t_p13705114_spa_community_portal.user_sessions 
         WHERE access_token = %s AND access_expires_at > NOW()
     """, (token,))
     
@@ -29,6 +41,7 @@ def get_user_id_from_token(headers: dict) -> int:
     if not result:
         raise ValueError('Невалидный токен')
     
+    session_cache.put(token, result[0], result[1])
     return result[0]
 
 def handler(event: dict, context) -> dict:
@@ -36,6 +49,9 @@ def handler(event: dict, context) -> dict:
     API для работы с отзывами.
     Поддерживает создание, получение и модерацию отзывов.
     """
+    if is_timer_event(event):
+        return reconcile_ratings()
+    
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -114,6 +130,37 @@ def handler(event: dict, context) -> dict:
             except:
                 pass
 
+def is_timer_event(event: dict) -> bool:
+    """Вызов от таймер-триггера Yandex Cloud Functions"""
+    messages = event.get('messages') or []
+    return bool(messages) and all(
+        (message.get('event_metadata') or {}).get('event_type', '').endswith('TimerMessage')
+        for message in messages
+    )
+
+def reconcile_ratings() -> dict:
+    """Сверка агрегатов рейтинга с таблицей reviews (по таймеру)"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            fixed = ratings.reconcile(cursor)
+            changed = [table for table, count in fixed.items() if count]
+            if changed:
+                response_cache.bump(cursor, *changed)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    print(f"Rating reconciliation: {fixed}")
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'fixed': fixed})
+    }
+
 def get_reviews(cursor, entity_type: str, entity_id: int) -> dict:
     """Получение отзывов для сущности"""
     if entity_type not in ['bath', 'master', 'event']:
@@ -144,15 +191,7 @@ def get_reviews(cursor, entity_type: str, entity_id: int) -> dict:
             }
         })
     
-    cursor.execute(
-        "SELECT COALESCE(AVG(rating)::numeric(3,1), 0), COUNT(*) " +
-        "FROM t_p13705114_spa_community_portal.reviews " +
-        "WHERE entity_type = '" + entity_type + "' AND entity_id = " + str(entity_id) + " AND is_approved = true"
-    )
-    
-    stats = cursor.fetchone()
-    avg_rating = float(stats[0]) if stats[0] else 0.0
-    total_count = int(stats[1]) if stats[1] else 0
+    avg_rating, total_count = ratings.get_stats(cursor, entity_type, entity_id)
     
     return {
         'reviews': reviews,
@@ -201,24 +240,10 @@ def create_review(cursor, conn, user_id: int, data: dict) -> dict:
     review_id = result[0]
     created_at = result[1]
     
-    table_map = {
-        'bath': 'baths',
-        'master': 'masters',
-        'event': 'events'
-    }
-    table_name = table_map.get(entity_type)
-    
+    table_name = ratings.add_review(cursor, entity_type, int(entity_id), rating)
     if table_name:
-        cursor.execute(
-            "UPDATE t_p13705114_spa_community_portal." + table_name + " " +
-            "SET rating = (" +
-            "SELECT AVG(rating)::numeric(2,1) FROM t_p13705114_spa_community_portal.reviews " +
-            "WHERE entity_type = '" + entity_type + "' AND entity_id = " + str(entity_id) + " AND is_approved = true" +
-            "), reviews_count = (" +
-            "SELECT COUNT(*) FROM t_p13705114_spa_community_portal.reviews " +
-            "WHERE entity_type = '" + entity_type + "' AND entity_id = " + str(entity_id) + " AND is_approved = true" +
-            ") WHERE id = " + str(entity_id)
-        )
+        # Рейтинг входит в закэшированные списки и карточки каталога и мероприятий
+        response_cache.bump(cursor, table_name)
     
     conn.commit()
     
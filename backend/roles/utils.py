@@ -1,16 +1,39 @@
 """Утилиты для работы с ролями"""
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection
+import jwt_auth
 
 
 def get_db_connection():
     """Получение подключения к БД"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    return get_connection()
+
+
+def get_user_by_jwt(token: str) -> dict | None:
+    """Получение пользователя по JWT: токен проверяется локально, из БД читается только профиль"""
+    user_id = jwt_auth.verify(token)
+    if not user_id:
+        return None
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                """SELECT * FROM t_p13705114_spa_community_portal.users
+                   WHERE id = %s AND is_active = true""",
+                (user_id,)
+            )
+            user = cur.fetchone()
+            return dict(user) if user else None
+    finally:
+        conn.close()
 
 
 def get_user_by_token(token: str) -> dict | None:
-    """Получение пользователя по access токену"""
+    """Получение пользователя по access токену: JWT — локальная проверка, иначе сессия в БД"""
+    if jwt_auth.is_jwt(token):
+        return get_user_by_jwt(token)
+    
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -0,0 +1,48 @@
+"""
+HTTP-кэширование публичных GET-ответов: ETag по содержимому ответа,
+Cache-Control по типу ресурса и 304 Not Modified при совпадении If-None-Match.
+"""
+import hashlib
+
+
+def cache_control(max_age: int, stale_while_revalidate: int) -> str:
+    """Копию можно отдавать max_age секунд, затем ещё stale_while_revalidate — пока идёт перепроверка"""
+    return f'public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}'
+
+
+def make_etag(body: str) -> str:
+    return '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # CDN при сжатии может ослабить ETag до W/"..." — сравниваем без префикса
+    return etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+
+
+def cached_response(event: dict, body: str, policy: str, headers: dict = None) -> dict:
+    """200 с ETag и Cache-Control либо пустой 304, если у клиента актуальная копия"""
+    etag = make_etag(body)
+    request_headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+
+    response_headers = dict(headers or {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'})
+    response_headers.update({
+        'ETag': etag,
+        'Cache-Control': policy,
+        'Access-Control-Expose-Headers': 'ETag'
+    })
+
+    if _etag_matches(request_headers.get('if-none-match', ''), etag):
+        return {'statusCode': 304, 'headers': response_headers, 'body': '', 'isBase64Encoded': False}
+
+    return {'statusCode': 200, 'headers': response_headers, 'body': body, 'isBase64Encoded': False}
+
+
+def with_http_cache(event: dict, response: dict, policy: str) -> dict:
+    """Кэширующие заголовки для уже собранного ответа; ошибки не кэшируются"""
+    if response.get('statusCode') != 200:
+        return response
+    return cached_response(event, response['body'], policy, response.get('headers'))
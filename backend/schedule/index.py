@@ -4,19 +4,31 @@ API для работы с расписанием (ServiceSchedule).
 """
 import json
 import os
-import psycopg2
 from datetime import datetime, timedelta
+from typing import Iterator
 from calendar import monthrange
+from db import get_connection
+from http_cache import cache_control, cached_response
 
 SCHEMA = 't_p13705114_spa_community_portal'
 
+# Свободные места в слотах меняются с каждой записью — короткий max-age
+SCHEDULE_CACHE_POLICY = cache_control(30, 120)
+
+SCHEDULE_RANGE_MAX_DAYS = int(os.environ.get('SCHEDULE_RANGE_MAX_DAYS', '62'))
+# Строк за один FETCH серверного курсора при выдаче диапазона
+SCHEDULE_RANGE_FETCH_SIZE = int(os.environ.get('SCHEDULE_RANGE_FETCH_SIZE', '500'))
+
 def get_db_connection():
     """Подключение к БД"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+    return get_connection()
 
 def get_calendar(params: dict) -> dict:
-    """Получение календаря событий"""
+    """
+    Получение календаря событий.
+    Читается из schedule_day_summary (счётчики по дням поддерживают триггеры
+    service_schedules и services) — месяц одним диапазоном по индексу.
+    """
     conn = get_db_connection()
     cur = conn.cursor()
     
@@ -30,27 +42,26 @@ def get_calendar(params: dict) -> dict:
     date_from = f"{year}-{month_num:02d}-01"
     date_to = f"{year}-{month_num:02d}-{last_day:02d}"
     
-    where_clauses = ["s.type = %s", "s.is_active = true", "sch.status = 'active'"]
+    where_clauses = ["service_type = %s"]
     query_params = [service_type]
     
     if city:
-        where_clauses.append("s.city = %s")
+        where_clauses.append("city = %s")
         query_params.append(city)
     
     where_sql = "WHERE " + " AND ".join(where_clauses)
     
     query = f"""
         SELECT 
-            DATE(sch.start_datetime) as event_date,
-            COUNT(*) as events_count,
-            SUM(sch.capacity_available) as total_available_spots
-        FROM {SCHEMA}.service_schedules sch
-        JOIN {SCHEMA}.services s ON sch.service_id = s.id
+            day as event_date,
+            SUM(events_count) as events_count,
+            SUM(available_spots) as total_available_spots
+        FROM {SCHEMA}.schedule_day_summary
         {where_sql}
-          AND sch.start_datetime >= %s
-          AND sch.start_datetime < %s
-        GROUP BY DATE(sch.start_datetime)
-        ORDER BY event_date ASC
+          AND day BETWEEN %s AND %s
+          AND events_count > 0
+        GROUP BY day
+        ORDER BY day ASC
     """
     
     query_params.extend([date_from, date_to])
@@ -133,18 +144,11 @@ def get_schedule_detail(schedule_id: str) -> dict:
     
     return result
 
-def get_day_schedule(params: dict) -> dict:
-    """Получение расписания на конкретный день"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    date = params.get('date', datetime.now().strftime('%Y-%m-%d'))
+def schedule_list_query(params: dict, date_from: datetime, date_to: datetime) -> tuple[str, list]:
+    """Запрос активных слотов с началом в [date_from, date_to) и его параметры"""
     city = params.get('city', '')
     service_type = params.get('service_type', 'EVENT')
     
-    date_from = f"{date} 00:00:00"
-    date_to = f"{date} 23:59:59"
-    
     where_clauses = ["s.type = %s", "s.is_active = true", "sch.status = 'active'"]
     query_params = [service_type]
     
@@ -167,44 +171,60 @@ def get_day_schedule(params: dict) -> dict:
         LEFT JOIN {SCHEMA}.masters m ON s.master_id = m.id
         {where_sql}
           AND sch.start_datetime >= %s
-          AND sch.start_datetime <= %s
+          AND sch.start_datetime < %s
         ORDER BY sch.start_datetime ASC
     """
     
     query_params.extend([date_from, date_to])
+    return query, query_params
+
+def schedule_row(row) -> dict:
+    """Слот расписания из строки schedule_list_query"""
+    image_url = None
+    if row[10] and len(row[10]) > 0:
+        image_url = row[10][0].get('url')
+    
+    return {
+        'id': str(row[0]),
+        'start_datetime': row[1].isoformat() if row[1] else None,
+        'end_datetime': row[2].isoformat() if row[2] else None,
+        'capacity_total': row[3],
+        'capacity_available': row[4],
+        'price': row[5] if row[5] else row[9],
+        'service': {
+            'id': str(row[6]),
+            'title': row[7],
+            'slug': row[8],
+            'base_price': row[9],
+            'image_url': image_url
+        },
+        'bathhouse': {
+            'id': row[11],
+            'name': row[12]
+        } if row[11] else None,
+        'master': {
+            'id': row[13],
+            'name': row[14]
+        } if row[13] else None
+    }
+
+def get_day_schedule(params: dict) -> dict:
+    """Получение расписания на конкретный день"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    date = params.get('date', datetime.now().strftime('%Y-%m-%d'))
+    
+    day = datetime.strptime(date, '%Y-%m-%d')
+    date_from = day
+    date_to = day + timedelta(days=1)
+    
+    query, query_params = schedule_list_query(params, date_from, date_to)
     
     cur.execute(query, query_params)
     rows = cur.fetchall()
     
-    schedules = []
-    for row in rows:
-        image_url = None
-        if row[10] and len(row[10]) > 0:
-            image_url = row[10][0].get('url')
-        
-        schedules.append({
-            'id': str(row[0]),
-            'start_datetime': row[1].isoformat() if row[1] else None,
-            'end_datetime': row[2].isoformat() if row[2] else None,
-            'capacity_total': row[3],
-            'capacity_available': row[4],
-            'price': row[5] if row[5] else row[9],
-            'service': {
-                'id': str(row[6]),
-                'title': row[7],
-                'slug': row[8],
-                'base_price': row[9],
-                'image_url': image_url
-            },
-            'bathhouse': {
-                'id': row[11],
-                'name': row[12]
-            } if row[11] else None,
-            'master': {
-                'id': row[13],
-                'name': row[14]
-            } if row[13] else None
-        })
+    schedules = [schedule_row(row) for row in rows]
     
     cur.close()
     conn.close()
@@ -214,6 +234,45 @@ def get_day_schedule(params: dict) -> dict:
         'schedules': schedules
     }
 
+def parse_range(params: dict) -> tuple[datetime, datetime]:
+    """Границы диапазона from..to (включительно); ValueError с текстом для ответа 400"""
+    try:
+        date_from = datetime.strptime(params.get('from', ''), '%Y-%m-%d')
+        date_to = datetime.strptime(params.get('to', ''), '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('Требуются параметры from и to (YYYY-MM-DD)')
+    if date_to < date_from:
+        raise ValueError('Дата to раньше from')
+    if (date_to - date_from).days + 1 > SCHEDULE_RANGE_MAX_DAYS:
+        raise ValueError(f'Период не может быть длиннее {SCHEDULE_RANGE_MAX_DAYS} дней')
+    return date_from, date_to
+
+def iter_range_schedule(params: dict, date_from: datetime, date_to: datetime) -> Iterator[str]:
+    """
+    Расписание за несколько дней как поток фрагментов JSON.
+    Строки читаются серверным (именованным) курсором пачками по SCHEDULE_RANGE_FETCH_SIZE,
+    каждый слот сериализуется сразу — весь диапазон не собирается в список словарей.
+    Склеенные фрагменты совпадают с json.dumps({'from', 'to', 'schedules'}).
+    """
+    query, query_params = schedule_list_query(params, date_from, date_to + timedelta(days=1))
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor(name='schedule_range') as cur:
+            cur.itersize = SCHEDULE_RANGE_FETCH_SIZE
+            cur.execute(query, query_params)
+            
+            yield '{"from": %s, "to": %s, "schedules": [' % (
+                json.dumps(date_from.strftime('%Y-%m-%d')), json.dumps(date_to.strftime('%Y-%m-%d'))
+            )
+            separator = ''
+            for row in cur:
+                yield separator + json.dumps(schedule_row(row), default=str)
+                separator = ', '
+            yield ']}'
+    finally:
+        conn.close()
+
 def handler(event: dict, context) -> dict:
     """Обработчик запросов к API расписания"""
     method = event.get('httpMethod', 'GET')
@@ -224,7 +283,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
@@ -254,6 +313,22 @@ def handler(event: dict, context) -> dict:
                 result = get_calendar(query_params)
             elif endpoint == 'day':
                 result = get_day_schedule(query_params)
+            elif endpoint == 'range':
+                try:
+                    date_from, date_to = parse_range(query_params)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                # Ответ функции — одна строка: фрагменты склеиваются без промежуточного дерева словарей
+                body = ''.join(iter_range_schedule(query_params, date_from, date_to))
+                return cached_response(event, body, SCHEDULE_CACHE_POLICY)
             else:
                 result = get_calendar(query_params)
         else:
@@ -267,15 +342,7 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps(result, default=str),
-            'isBase64Encoded': False
-        }
+        return cached_response(event, json.dumps(result, default=str), SCHEDULE_CACHE_POLICY)
         
     except Exception as e:
         return {
@@ -0,0 +1,141 @@
+"""
+Пропускная способность входа в расширении auth-email: стоимость bcrypt, калибровка
+под BCRYPT_TARGET_MS, хэширование в пуле потоков и перехэширование при входе.
+
+Запуск:
+    pip install bcrypt PyJWT psycopg2-binary
+    python benchmarks/auth_login_throughput.py --max-cost 12             # только bcrypt
+    DATABASE_URL=postgresql://... python benchmarks/auth_login_throughput.py --logins 60 --clients 1,4
+
+Без DATABASE_URL печатает время хэша на каждой стоимости от BCRYPT_MIN_ROUNDS до --max-cost
+и выбранную калибровкой стоимость. Проверяет, что хэш на этой стоимости укладывается
+в BCRYPT_TARGET_MS с запасом на погрешность замера.
+
+С DATABASE_URL дополнительно создаёт временного пользователя с хэшем стоимости
+--stored-cost и прогоняет --logins входов через handler функции при каждом
+числе параллельных клиентов из --clients: входов в секунду, p50/p95.
+Проверяет, что:
+    - все входы успешны;
+    - первый вход перехэшировал пароль на текущую стоимость (если она выше сохранённой).
+Временные строки удаляются. Код выхода 1, если проверка не прошла.
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+def percentile(values: list, share: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[max(0, int(len(ordered) * share) - 1)], 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-cost', type=int, default=12)
+    parser.add_argument('--logins', type=int, default=60)
+    parser.add_argument('--clients', default='1,4', help='числа параллельных клиентов через запятую')
+    parser.add_argument('--stored-cost', type=int, default=12)
+    args = parser.parse_args()
+
+    os.environ.setdefault('JWT_SECRET', secrets.token_hex(32))
+    clients = [int(value) for value in args.clients.split(',')]
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(max(clients)))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'extensions', 'auth-email', 'auth'))
+    from utils import password  # noqa: E402
+
+    costs = {}
+    for cost in range(password.BCRYPT_MIN_ROUNDS, args.max_cost + 1):
+        started = time.perf_counter()
+        bcrypt.hashpw(b'benchmark', bcrypt.gensalt(rounds=cost))
+        costs[cost] = round((time.perf_counter() - started) * 1000, 1)
+    rounds = password.current_rounds()
+    report = {
+        'cpu_count': os.cpu_count(),
+        'bcrypt_threads': password.BCRYPT_THREADS,
+        'target_ms': password.BCRYPT_TARGET_MS,
+        'hash_ms_by_cost': costs,
+        'calibrated_cost': rounds
+    }
+    checks = {}
+    if not password.BCRYPT_ROUNDS and rounds in costs and rounds > password.BCRYPT_MIN_ROUNDS:
+        # Калибровка экстраполирует с дешёвой стоимости: допускается 1.5x на погрешность
+        checks['calibrated_cost_fits_target'] = costs[rounds] <= password.BCRYPT_TARGET_MS * 1.5
+
+    if os.environ.get('DATABASE_URL'):
+        import psycopg2
+        import index  # noqa: E402
+        from utils.db import get_schema  # noqa: E402
+
+        schema = get_schema()
+        email = f'bench-{secrets.token_hex(4)}@example.invalid'
+        secret = 'Benchmark-' + secrets.token_hex(6) + '1'
+        stored_hash = bcrypt.hashpw(secret.encode(), bcrypt.gensalt(rounds=args.stored_cost)).decode()
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    INSERT INTO {schema}users (email, password_hash, name, email_verified, created_at, updated_at)
+                    VALUES (%s, %s, 'Benchmark', TRUE, NOW(), NOW())
+                """, (email, stored_hash))
+            conn.commit()
+
+            event = {
+                'httpMethod': 'POST',
+                'queryStringParameters': {'action': 'login'},
+                'body': json.dumps({'email': email, 'password': secret})
+            }
+
+            def login(_) -> tuple[int, float]:
+                started = time.perf_counter()
+                status = index.handler(event, None)['statusCode']
+                return status, (time.perf_counter() - started) * 1000
+
+            first_status, _ = login(0)
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT password_hash FROM {schema}users WHERE email = %s", (email,))
+                new_cost = int(cur.fetchone()[0].split('$')[2])
+            conn.rollback()
+            # Заданная BCRYPT_ROUNDS стоимость применяется всегда, откалиброванная — только повышает
+            expected_cost = rounds if password.BCRYPT_ROUNDS else max(rounds, args.stored_cost)
+            checks['rehashed_on_login'] = first_status == 200 and new_cost == expected_cost
+
+            runs = {}
+            all_ok = True
+            for count in clients:
+                with ThreadPoolExecutor(max_workers=count) as pool:
+                    started = time.perf_counter()
+                    results = list(pool.map(login, range(args.logins)))
+                    elapsed = time.perf_counter() - started
+                all_ok = all_ok and all(status == 200 for status, _ in results)
+                latencies = [latency for _, latency in results]
+                runs[count] = {
+                    'logins_per_s': round(args.logins / elapsed, 1),
+                    'p50_ms': percentile(latencies, 0.5),
+                    'p95_ms': percentile(latencies, 0.95)
+                }
+            checks['all_logins_ok'] = all_ok
+            report.update({'stored_cost': args.stored_cost, 'cost_after_login': new_cost, 'clients': runs})
+        finally:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    DELETE FROM {schema}refresh_tokens
+                    WHERE user_id = (SELECT id FROM {schema}users WHERE email = %s)
+                """, (email,))
+                cur.execute(f"DELETE FROM {schema}users WHERE email = %s", (email,))
+            conn.commit()
+            conn.close()
+
+    report['checks'] = checks
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Бенчмарк bookings: соединение на каждый хелпер против единицы работы на запрос.
+
+Запуск (нужна реальная БД и действующий access_token из user_sessions):
+    DATABASE_URL=postgresql://... BENCH_TOKEN=... python benchmarks/bookings_request_scope.py -n 200
+
+Режимы:
+    legacy        — как было до BookingRequest: авторизация и выборка открывают
+                    отдельные соединения через psycopg2.connect
+    request_scope — handler() с одним соединением из пула на запрос
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'bookings'))
+
+import index  # noqa: E402
+
+_connects = 0
+_original_connect = psycopg2.connect
+
+
+def _counting_connect(*args, **kwargs):
+    """Подсчёт физических подключений (пул тоже вызывает psycopg2.connect)"""
+    global _connects
+    _connects += 1
+    return _original_connect(*args, **kwargs)
+
+
+psycopg2.connect = _counting_connect
+
+
+def legacy_request(token: str, params: dict) -> None:
+    """Повторяет старый поток handle_get: отдельное соединение на авторизацию и выборку"""
+    auth_conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    try:
+        user = index.get_user_from_token(auth_conn, token)
+    finally:
+        auth_conn.close()
+    if not user:
+        raise SystemExit('BENCH_TOKEN не найден в user_sessions')
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RealDictCursor)
+    try:
+        index.get_user_bookings(conn, user['id'], params)
+    finally:
+        conn.close()
+
+
+def request_scope_request(token: str, params: dict) -> None:
+    """Текущий handler: одна единица работы на запрос"""
+    response = index.handler({
+        'httpMethod': 'GET',
+        'headers': {'x-authorization': f'Bearer {token}'},
+        'queryStringParameters': params
+    }, None)
+    if response['statusCode'] != 200:
+        raise SystemExit(f"handler вернул {response['statusCode']}: {response['body']}")
+
+
+def run(name: str, fn, iterations: int, token: str, params: dict) -> dict:
+    global _connects
+    fn(token, params)  # прогрев: для request_scope создаёт пул
+    _connects = 0
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(token, params)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'mode': name,
+        'requests': iterations,
+        'connects': _connects,
+        'connects_per_request': round(_connects / iterations, 2),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 2),
+        'mean_ms': round(statistics.fmean(timings), 2)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('--limit', default='20')
+    args = parser.parse_args()
+
+    token = os.environ.get('BENCH_TOKEN')
+    if not token or 'DATABASE_URL' not in os.environ:
+        raise SystemExit('Нужны переменные окружения DATABASE_URL и BENCH_TOKEN')
+
+    params = {'limit': args.limit}
+    results = [
+        run('legacy', legacy_request, args.iterations, token, params),
+        run('request_scope', request_scope_request, args.iterations, token, params)
+    ]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
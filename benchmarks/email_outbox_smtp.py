@@ -0,0 +1,129 @@
+"""
+Проверка очереди писем на локальном SMTP-стенде: воркер отправляет всю очередь
+через одну SMTP-сессию, письма с отказом сервера уходят на повтор.
+
+Запуск (нужна реальная БД с применёнными миграциями и пакет aiosmtpd):
+    pip install aiosmtpd
+    DATABASE_URL=postgresql://... python benchmarks/email_outbox_smtp.py --messages 120
+
+Поднимает aiosmtpd на localhost, ставит в email_outbox --messages писем
+(каждое --reject-every-е стенд отклоняет ответом 451), запускает mail_outbox.drain
+и проверяет, что:
+    - стенд получил все неотклонённые письма, а в БД они помечены sent;
+    - отклонённые остались pending с attempts = 1 и отложены в будущее;
+    - SMTP-сессия была одна на все письма прохода.
+Запускать на тестовой базе: воркер заберёт и «отправит» на стенд всю очередь, не только свои письма.
+Временные строки удаляются. Код выхода 1, если проверка не прошла.
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import time
+
+import psycopg2
+from aiosmtpd.controller import Controller
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+
+class StandIn:
+    """Обработчик aiosmtpd: считает сессии и письма, часть адресатов отклоняет"""
+
+    def __init__(self, reject_marker: str):
+        self.reject_marker = reject_marker
+        self.sessions = 0
+        self.received = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if self.reject_marker in address:
+            return '451 Temporary failure, try later'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.extend(envelope.rcpt_tos)
+        return '250 Message accepted'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=120)
+    parser.add_argument('--reject-every', type=int, default=10)
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        raise SystemExit('Нужна переменная окружения DATABASE_URL')
+
+    tag = secrets.token_hex(4)
+    handler = StandIn(reject_marker=f'reject-{tag}')
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+
+    os.environ.update({'SMTP_HOST': '127.0.0.1', 'SMTP_PORT': str(args.port), 'SMTP_STARTTLS': '0',
+                       'SMTP_FROM': 'outbox@example.invalid'})
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'auth'))
+    import mail_outbox  # noqa: E402
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    addresses = [
+        f'reject-{tag}-{i}@example.invalid' if args.reject_every and i % args.reject_every == 0
+        else f'ok-{tag}-{i}@example.invalid'
+        for i in range(args.messages)
+    ]
+    try:
+        with conn.cursor() as cur:
+            for address in addresses:
+                mail_outbox.enqueue(cur, address, 'Outbox check', 'Текст письма', '<p>Текст письма</p>')
+        conn.commit()
+
+        started = time.perf_counter()
+        stats = mail_outbox.drain(conn)
+        elapsed = time.perf_counter() - started
+
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT status, COUNT(*), MIN(attempts), BOOL_AND(next_attempt_at > NOW())
+                FROM {SCHEMA}.email_outbox
+                WHERE to_email LIKE %s
+                GROUP BY status
+            """, (f'%-{tag}-%',))
+            by_status = {row[0]: row[1:] for row in cur.fetchall()}
+        conn.rollback()
+
+        rejected = sum(1 for address in addresses if address.startswith('reject-'))
+        accepted = len(addresses) - rejected
+        pending = by_status.get('pending', (0, 1, True))
+        checks = {
+            'all_accepted_delivered': sorted(handler.received) == sorted(a for a in addresses if a.startswith('ok-')),
+            'accepted_marked_sent': by_status.get('sent', (0,))[0] == accepted,
+            'rejected_postponed': pending[0] == rejected and pending[1] == 1 and pending[2],
+            'single_smtp_session': handler.sessions == 1
+        }
+        print(json.dumps({
+            'messages': len(addresses),
+            'elapsed_s': round(elapsed, 3),
+            'stats': stats,
+            'smtp_sessions': handler.sessions,
+            'checks': checks
+        }, ensure_ascii=False, indent=2))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {SCHEMA}.email_outbox WHERE to_email LIKE %s", (f'%-{tag}-%',))
+        conn.commit()
+        conn.close()
+        controller.stop()
+
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
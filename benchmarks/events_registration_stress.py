@@ -0,0 +1,136 @@
+"""
+Стресс-тест регистрации на мероприятие: конкурентные регистрации не должны
+продать больше мест, чем было.
+
+Запуск (нужна реальная БД с применёнными миграциями):
+    DATABASE_URL=postgresql://... python benchmarks/events_registration_stress.py --spots 10 --users 60
+
+Создаёт временное событие на --spots мест и --users пользователей. Каждый пользователь
+--attempts раз регистрируется через events.register_for_event одновременно со всеми
+остальными (старт по барьеру). Затем проверяет, что:
+    - успешных регистраций ровно min(spots, users), по одной на пользователя;
+    - available_spots = spots - успешные и не ушёл в минус;
+    - повторные попытки получили 409, лишние — «Нет свободных мест».
+Временные данные удаляются. Код выхода 1, если инвариант нарушен.
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+
+def setup(conn, spots: int, users: int, tag: str) -> tuple[int, list]:
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.events (slug, title, date, time, location, type, price, available_spots, total_spots)
+            VALUES (%s, %s, CURRENT_DATE + 30, '18:00', 'stress', 'mixed', 0, %s, %s)
+            RETURNING id
+        """, (f'stress-{tag}', f'Stress {tag}', spots, spots))
+        event_id = cur.fetchone()[0]
+        user_ids = []
+        for i in range(users):
+            cur.execute(f"""
+                INSERT INTO {SCHEMA}.users (email, password_hash, name)
+                VALUES (%s, 'stress', %s)
+                RETURNING id
+            """, (f'stress-{tag}-{i}@example.invalid', f'Stress {i}'))
+            user_ids.append(cur.fetchone()[0])
+    conn.commit()
+    return event_id, user_ids
+
+
+def teardown(conn, event_id: int, user_ids: list) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {SCHEMA}.event_registrations WHERE event_id = %s", (event_id,))
+        cur.execute(f"DELETE FROM {SCHEMA}.events WHERE id = %s", (event_id,))
+        cur.execute(f"DELETE FROM {SCHEMA}.users WHERE id = ANY(%s)", (user_ids,))
+    conn.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spots', type=int, default=10)
+    parser.add_argument('--users', type=int, default=60)
+    parser.add_argument('--attempts', type=int, default=2, help='попыток регистрации на пользователя')
+    parser.add_argument('--workers', type=int, default=32)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        raise SystemExit('Нужна переменная окружения DATABASE_URL')
+
+    # Пул функции должен вмещать все потоки, иначе тест упрётся в PoolError, а не в БД
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.workers)
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'events'))
+    import index  # noqa: E402
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    tag = secrets.token_hex(4)
+    event_id, user_ids = setup(conn, args.spots, args.users, tag)
+
+    attempts = [user_id for user_id in user_ids for _ in range(args.attempts)]
+    barrier = threading.Barrier(min(args.workers, len(attempts)))
+
+    def attempt(user_id: int) -> tuple[int, dict]:
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        return user_id, index.register_for_event(event_id, user_id)
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(attempt, attempts))
+        elapsed = time.perf_counter() - started
+
+        succeeded = Counter(user_id for user_id, result in results if 'error' not in result)
+        outcomes = Counter(result.get('status', 201) for _, result in results)
+
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT available_spots FROM {SCHEMA}.events WHERE id = %s", (event_id,))
+            available_spots = cur.fetchone()[0]
+            cur.execute(f"""
+                SELECT COUNT(*) FROM {SCHEMA}.event_registrations
+                WHERE event_id = %s AND status = 'registered'
+            """, (event_id,))
+            registered = cur.fetchone()[0]
+        conn.rollback()
+
+        expected = min(args.spots, args.users)
+        checks = {
+            'registrations_match_successes': registered == sum(succeeded.values()),
+            'one_registration_per_user': all(count == 1 for count in succeeded.values()),
+            'all_seats_sold_no_more': registered == expected,
+            'seats_balance': available_spots == args.spots - registered,
+            'no_negative_seats': available_spots >= 0,
+            'no_server_errors': outcomes.get(500, 0) == 0
+        }
+        print(json.dumps({
+            'spots': args.spots,
+            'users': args.users,
+            'attempts': len(attempts),
+            'elapsed_s': round(elapsed, 3),
+            'registered': registered,
+            'available_spots': available_spots,
+            'outcomes': {str(status): count for status, count in sorted(outcomes.items())},
+            'checks': checks
+        }, ensure_ascii=False, indent=2))
+    finally:
+        teardown(conn, event_id, user_ids)
+        conn.close()
+
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
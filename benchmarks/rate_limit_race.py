@@ -0,0 +1,93 @@
+"""
+Проверка ограничителя частоты под параллельными попытками: upsert в rate_limit_counters
+пропускает ровно limit попыток за окно, сколько бы потоков ни пришло одновременно.
+
+Запуск (нужна реальная БД с применёнными миграциями):
+    DATABASE_URL=postgresql://... python benchmarks/rate_limit_race.py --threads 32 --attempts 400
+
+--threads потоков делают в сумме --attempts попыток по одному ключу с лимитом --limit
+за часовое фиксированное окно, локальное ведро отключено (RATE_LIMIT_LOCAL=0). Проверяет, что:
+    - разрешено ровно --limit попыток;
+    - счётчик в БД равен числу попыток (ни один инкремент не потерян).
+Второй прогон с включённым локальным ведром показывает, сколько попыток флуда
+отсечено без запроса к БД. Если прогон пересёк границу часа, запустите скрипт ещё раз.
+Временные строки удаляются. Код выхода 1, если проверка не прошла.
+"""
+import argparse
+import json
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+SCHEMA = 't_p13705114_spa_community_portal'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--attempts', type=int, default=400)
+    parser.add_argument('--limit', type=int, default=25)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        raise SystemExit('Нужна переменная окружения DATABASE_URL')
+
+    os.environ.update({'RATE_LIMIT_LOCAL': '0', 'DB_POOL_MAX_SIZE': str(args.threads)})
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'auth'))
+    import rate_limit  # noqa: E402
+
+    tag = secrets.token_hex(4)
+    db_key, local_key = f'race-{tag}:db', f'race-{tag}:local'
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: rate_limit.check(db_key, args.limit, 3600), range(args.attempts)))
+            db_elapsed = time.perf_counter() - started
+
+            rate_limit.RATE_LIMIT_LOCAL = True
+            started = time.perf_counter()
+            local_results = list(pool.map(lambda _: rate_limit.check(local_key, args.limit, 3600), range(args.attempts)))
+            local_elapsed = time.perf_counter() - started
+
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT key, hits FROM {SCHEMA}.rate_limit_counters WHERE key IN (%s, %s)", (db_key, local_key))
+            hits = dict(cur.fetchall())
+        conn.rollback()
+
+        allowed = sum(1 for ok, _ in results if ok)
+        checks = {
+            'exactly_limit_allowed': allowed == args.limit,
+            'no_lost_increments': hits.get(db_key) == args.attempts,
+            'local_bucket_keeps_limit': sum(1 for ok, _ in local_results if ok) == args.limit
+        }
+        print(json.dumps({
+            'attempts': args.attempts,
+            'threads': args.threads,
+            'limit': args.limit,
+            'allowed': allowed,
+            'db_hits': hits.get(db_key),
+            'db_elapsed_s': round(db_elapsed, 3),
+            'local_bucket': {
+                'db_hits': hits.get(local_key),
+                'dropped_before_db': args.attempts - (hits.get(local_key) or 0),
+                'elapsed_s': round(local_elapsed, 3)
+            },
+            'checks': checks
+        }, ensure_ascii=False, indent=2))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {SCHEMA}.rate_limit_counters WHERE key LIKE %s", (f'race-{tag}:%',))
+        conn.commit()
+        conn.close()
+
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
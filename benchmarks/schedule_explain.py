@@ -0,0 +1,123 @@
+"""
+Регрессионная проверка планов запросов schedule: каждый запрос функции должен
+уметь обслуживаться индексом, а не полным сканированием.
+
+Запуск (нужна реальная БД с применёнными миграциями):
+    DATABASE_URL=postgresql://... python benchmarks/schedule_explain.py
+
+Функции schedule вызываются как есть. Курсор перехватывается: перед каждым запросом
+выполняется EXPLAIN (FORMAT JSON) с тем же SQL и параметрами, затем сам запрос.
+В сессии выключен enable_seqscan — на маленькой тестовой базе планировщик иначе
+честно выбрал бы seq scan, а проверяется именно применимость индекса к предикатам
+(например, выражение DATE(start_datetime) индекс по start_datetime не использует).
+Код выхода 1, если в плане нет ожидаемого индекса или есть Seq Scan по проверяемой таблице.
+"""
+import json
+import os
+import sys
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'schedule'))
+
+import index  # noqa: E402
+
+# Запрос → индексы, хотя бы один из которых должен быть в плане, и таблицы без Seq Scan
+CASES = [
+    {
+        'name': 'calendar_all_cities',
+        'call': lambda: index.get_calendar({'month': '2026-01', 'service_type': 'EVENT'}),
+        'indexes': {'idx_schedule_day_summary_type_day', 'schedule_day_summary_pkey'},
+        'tables': {'schedule_day_summary'}
+    },
+    {
+        'name': 'calendar_city',
+        'call': lambda: index.get_calendar({'month': '2026-01', 'service_type': 'EVENT', 'city': 'Москва'}),
+        'indexes': {'schedule_day_summary_pkey'},
+        'tables': {'schedule_day_summary'}
+    },
+    {
+        'name': 'day_all_cities',
+        'call': lambda: index.get_day_schedule({'date': '2026-01-20', 'service_type': 'EVENT'}),
+        'indexes': {'idx_schedules_active_start', 'idx_schedules_service_active_start'},
+        'tables': {'service_schedules'}
+    },
+    {
+        'name': 'day_city',
+        'call': lambda: index.get_day_schedule({'date': '2026-01-20', 'service_type': 'EVENT', 'city': 'Москва'}),
+        'indexes': {'idx_schedules_active_start', 'idx_schedules_service_active_start'},
+        'tables': {'service_schedules', 'services'}
+    }
+]
+
+
+class ExplainingCursor:
+    """Курсор, который перед каждым запросом сохраняет его план"""
+
+    def __init__(self, cursor, plans: list):
+        self._cursor = cursor
+        self._plans = plans
+
+    def execute(self, query, params=None):
+        self._cursor.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+        self._plans.append(self._cursor.fetchone()[0][0]['Plan'])
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+        return False
+
+
+class ExplainingConnection:
+    def __init__(self, plans: list):
+        self._conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        self._plans = plans
+        with self._conn.cursor() as cur:
+            cur.execute('SET enable_seqscan = off')
+
+    def cursor(self, *args, **kwargs):
+        return ExplainingCursor(self._conn.cursor(*args, **kwargs), self._plans)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def check(case: dict) -> dict:
+    plans = []
+    index.get_db_connection = lambda: ExplainingConnection(plans)
+    case['call']()
+
+    nodes = [node for plan in plans for node in walk(plan)]
+    used = {node['Index Name'] for node in nodes if 'Index Name' in node}
+    seq_scans = {node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'}
+    failures = []
+    if not used & case['indexes']:
+        failures.append(f"нет ни одного из индексов {sorted(case['indexes'])}")
+    if seq_scans & case['tables']:
+        failures.append(f"Seq Scan по {sorted(seq_scans & case['tables'])}")
+    return {'name': case['name'], 'indexes_used': sorted(used), 'ok': not failures, 'failures': failures}
+
+
+def main() -> None:
+    if 'DATABASE_URL' not in os.environ:
+        raise SystemExit('Нужна переменная окружения DATABASE_URL')
+    results = [check(case) for case in CASES]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if not all(result['ok'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Задержка ответов бота на тёплом инстансе: общий TeleBot и keep-alive сессия (bot_client.py)
+против нового соединения на каждый вызов Bot API.
+
+Запуск (нужен pyTelegramBotAPI, БД не нужна):
+    python benchmarks/telegram_bot_warm_latency.py --requests 200 --connect-delay-ms 30
+
+Поднимает на localhost фейковый Bot API с HTTP/1.1 keep-alive. Каждое новое соединение
+задерживается на --connect-delay-ms — так стенд изображает TCP + TLS рукопожатие
+с api.telegram.org. Через handler функции прогоняются --requests webhook-апдейтов /start,
+каждый отвечает пользователю одним sendMessage. Режимы:
+    fresh_session — одноразовая requests.Session на вызов, как при TeleBot на каждое сообщение;
+    cached_client — TeleBot и сессия из bot_client.py.
+Проверяет, что cached_client открыл одно соединение на все запросы и быстрее fresh_session.
+Код выхода 1, если проверка не прошла.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, connect_delay: float):
+        self.connect_delay = connect_delay
+        self.connections = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', port), Handler)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными записями: с Nagle на keep-alive соединении
+    # ответ ждал бы отложенного ACK клиента (~40 мс) и исказил бы замер
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_delay)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        payload = json.dumps({'ok': True, 'result': {
+            'message_id': 1, 'date': int(time.time()), 'chat': {'id': 1, 'type': 'private'}, 'text': 'ok'
+        }}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(index, count: int) -> list:
+    """Время обработки webhook-апдейтов /start, мс"""
+    timings = []
+    for i in range(count):
+        event = {'httpMethod': 'POST', 'queryStringParameters': {}, 'body': json.dumps({
+            'message': {'text': '/start', 'from': {'id': 1000 + i}, 'chat': {'id': 1000 + i}}
+        })}
+        started = time.perf_counter()
+        response = index.handler(event, None)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response['statusCode'] != 200:
+            raise SystemExit(f"webhook завершился ошибкой: {response}")
+    return timings
+
+
+def summary(timings: list, connections: int) -> dict:
+    ordered = sorted(timings)
+    return {
+        'avg_ms': round(statistics.mean(ordered), 2),
+        'p50_ms': round(ordered[len(ordered) // 2], 2),
+        'p95_ms': round(ordered[int(len(ordered) * 0.95) - 1], 2),
+        'connections': connections
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--connect-delay-ms', type=float, default=30)
+    parser.add_argument('--port', type=int, default=8082)
+    args = parser.parse_args()
+
+    server = FakeBotApi(args.port, args.connect_delay_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'TELEGRAM_API_URL': f'http://127.0.0.1:{args.port}/bot{{0}}/{{1}}',
+        'TELEGRAM_BOT_TOKEN': '123456:fake'
+    })
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'extensions', 'telegram-bot', 'telegram-bot'))
+    import index  # noqa: E402
+    import telebot  # noqa: E402
+    import bot_client  # noqa: E402
+
+    results = {}
+    # Логи webhook и Bot API на каждый апдейт не выводятся
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Одноразовая сессия на вызов: каждое сообщение открывает новое соединение
+        cached_sender = telebot.apihelper.CUSTOM_REQUEST_SENDER
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = None
+        telebot.apihelper.SESSION_TIME_TO_LIVE = 0
+        opened = server.connections
+        timings = run(index, args.requests)
+        results['fresh_session'] = summary(timings, server.connections - opened)
+
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = cached_sender
+        opened = server.connections
+        timings = run(index, args.requests)
+        results['cached_client'] = summary(timings, server.connections - opened)
+    server.shutdown()
+
+    checks = {
+        'single_connection': results['cached_client']['connections'] == 1,
+        'faster_than_fresh_session': results['cached_client']['avg_ms'] < results['fresh_session']['avg_ms']
+    }
+    print(json.dumps({
+        'requests': args.requests,
+        'connect_delay_ms': args.connect_delay_ms,
+        'results': results,
+        'bot_api': bot_client.stats(),
+        'checks': checks
+    }, ensure_ascii=False, indent=2))
+
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
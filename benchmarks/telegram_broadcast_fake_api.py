@@ -0,0 +1,173 @@
+"""
+Проверка рассылки Telegram на локальном фейковом Bot API: вся очередь доставляется,
+лимиты Bot API соблюдаются, ответы 429 с retry_after отрабатываются.
+
+Запуск (нужна реальная БД с применёнными миграциями и pyTelegramBotAPI):
+    DATABASE_URL=postgresql://... MAIN_DB_SCHEMA=t_p13705114_spa_community_portal \\
+        python benchmarks/telegram_broadcast_fake_api.py --chats 300
+
+Поднимает на localhost фейковый Bot API (sendMessage/sendPhoto). Он отвечает 429 с retry_after,
+если за последнюю секунду бот отправил больше --global-limit сообщений или в чат чаще раза
+в секунду, и дополнительно отклоняет каждое --force-429-every-е сообщение. Скрипт ставит
+рассылку на --chats чатов через action=broadcast и вызывает функцию как таймер-триггер,
+пока очередь не опустеет. Затем проверяет, что:
+    - каждый чат получил ровно одно сообщение и все строки рассылки помечены sent;
+    - ни одно принятое сообщение не нарушило лимиты;
+    - все 429 были отработаны повторной отправкой.
+Запускать на тестовой базе: воркер заберёт всю очередь, не только эту рассылку.
+Временные строки удаляются. Код выхода 1, если проверка не прошла.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import psycopg2
+
+
+class FakeBotApi:
+    """Состояние фейкового Bot API: скользящие окна отправок и счётчики"""
+
+    def __init__(self, global_limit: int, force_429_every: int):
+        self.global_limit = global_limit
+        self.force_429_every = force_429_every
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.chat_last = {}
+        self.delivered = Counter()
+        self.requests = 0
+        self.throttled = 0
+        self.peak_per_second = 0
+
+    def handle(self, chat_id: str) -> tuple[int, dict]:
+        with self.lock:
+            now = time.monotonic()
+            self.requests += 1
+            while self.recent and now - self.recent[0] >= 1:
+                self.recent.popleft()
+            flooded = len(self.recent) >= self.global_limit or now - self.chat_last.get(chat_id, -1e9) < 1
+            forced = self.force_429_every and self.requests % self.force_429_every == 0
+            if flooded or forced:
+                self.throttled += 1
+                return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                             'parameters': {'retry_after': 1}}
+            self.recent.append(now)
+            self.chat_last[chat_id] = now
+            self.peak_per_second = max(self.peak_per_second, len(self.recent))
+            self.delivered[chat_id] += 1
+            return 200, {'ok': True, 'result': {
+                'message_id': self.requests, 'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'private'}, 'text': 'ok'
+            }}
+
+
+def serve(api: FakeBotApi, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            # telebot передаёт параметры в строке запроса, multipart — только для файлов
+            length = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(length)
+            params = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+            status, body = api.handle(params.get('chat_id', ''))
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=300)
+    parser.add_argument('--global-limit', type=int, default=30)
+    parser.add_argument('--force-429-every', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--max-runs', type=int, default=20, help='вызовов воркера до отказа')
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        raise SystemExit('Нужна переменная окружения DATABASE_URL')
+
+    api = FakeBotApi(args.global_limit, args.force_429_every)
+    server = serve(api, args.port)
+    os.environ.update({
+        'TELEGRAM_API_URL': f'http://127.0.0.1:{args.port}/bot{{0}}/{{1}}',
+        'TELEGRAM_BOT_TOKEN': '123456:fake',
+        'TELEGRAM_OUTBOX_BACKOFF': '0',
+        'TELEGRAM_BROADCAST_SECRET': 'benchmark-secret'
+    })
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'extensions', 'telegram-bot', 'telegram-bot'))
+    import index  # noqa: E402
+
+    chat_ids = [str(900000000 + i) for i in range(args.chats)]
+    response = index.handler({
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': 'broadcast'},
+        'headers': {'X-Broadcast-Secret': 'benchmark-secret'},
+        'body': json.dumps({'chat_ids': chat_ids, 'text': 'Напоминание о мероприятии'})
+    }, None)
+    broadcast_id = json.loads(response['body']).get('broadcast_id')
+    if response['statusCode'] != 202:
+        raise SystemExit(f"broadcast не поставлен: {response['body']}")
+
+    timer_event = {'messages': [{'event_metadata': {'event_type': 'yandex.cloud.events.serverless.triggers.TimerMessage'}}]}
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    schema = index.get_schema()
+    try:
+        started = time.perf_counter()
+        runs = []
+        for _ in range(args.max_runs):
+            runs.append(json.loads(index.handler(timer_event, None)['body']))
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT status, COUNT(*) FROM {schema}telegram_outbox
+                    WHERE broadcast_id = %s GROUP BY status
+                """, (broadcast_id,))
+                by_status = dict(cur.fetchall())
+            conn.rollback()
+            if not by_status.get('pending'):
+                break
+        elapsed = time.perf_counter() - started
+
+        checks = {
+            'every_chat_once': sorted(api.delivered) == sorted(chat_ids) and set(api.delivered.values()) == {1},
+            'all_rows_sent': by_status.get('sent', 0) == args.chats and len(by_status) == 1,
+            'global_limit_kept': api.peak_per_second <= args.global_limit,
+            'throttled_were_retried': api.requests == args.chats + api.throttled
+        }
+        print(json.dumps({
+            'chats': args.chats,
+            'elapsed_s': round(elapsed, 3),
+            'messages_per_s': round(args.chats / elapsed, 1) if elapsed else None,
+            'worker_runs': runs,
+            'api_requests': api.requests,
+            'throttled_429': api.throttled,
+            'peak_per_second': api.peak_per_second,
+            'checks': checks
+        }, ensure_ascii=False, indent=2))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {schema}telegram_outbox WHERE broadcast_id = %s", (broadcast_id,))
+        conn.commit()
+        conn.close()
+        server.shutdown()
+
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+-- ============================================================================
+-- SESSION CACHE VERSION
+-- Revocation counter: functions cache token -> user in memory and drop
+-- the cache whenever version changes
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS session_cache_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO session_cache_version (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
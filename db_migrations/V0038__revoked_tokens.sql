@@ -0,0 +1,13 @@
+-- ============================================================================
+-- REVOKED TOKENS
+-- Denylist of revoked JWT access token ids (jti). Rows are only needed
+-- until the token itself expires
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens(expires_at);
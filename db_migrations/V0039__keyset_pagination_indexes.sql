@@ -0,0 +1,19 @@
+-- ============================================================================
+-- KEYSET PAGINATION INDEXES
+-- Match the ORDER BY keys used by cursor pagination so that a page after a
+-- cursor is an index range scan instead of a sort of the whole table
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_baths_rating_keyset
+    ON baths ((COALESCE(rating, 0)) DESC, (COALESCE(reviews_count, 0)) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_baths_price_keyset ON baths(price_per_hour, id);
+
+CREATE INDEX IF NOT EXISTS idx_masters_rating_keyset
+    ON masters ((COALESCE(rating, 0)) DESC, (COALESCE(reviews_count, 0)) DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_events_date_keyset ON events(date, time, id);
+
+CREATE INDEX IF NOT EXISTS idx_blog_posts_published_keyset
+    ON blog_posts ((COALESCE(published_at, updated_at, created_at)) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_blog_posts_published_nulls_keyset
+    ON blog_posts ((COALESCE(published_at, TIMESTAMP '1970-01-01')) DESC, created_at DESC, id DESC);
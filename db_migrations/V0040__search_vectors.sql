@@ -0,0 +1,38 @@
+-- ============================================================================
+-- FULL-TEXT AND TRIGRAM SEARCH
+-- search_vector (russian config) + GIN for search_mode=fts,
+-- trigram GIN indexes so the default ILIKE search stops scanning the table
+-- ============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE baths ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(name, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+    ) STORED;
+
+ALTER TABLE masters ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(name, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(specialization, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+    ) STORED;
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_baths_search_vector ON baths USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_masters_search_vector ON masters USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_events_search_vector ON events USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_baths_name_trgm ON baths USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_baths_description_trgm ON baths USING GIN (description gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_masters_name_trgm ON masters USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_masters_description_trgm ON masters USING GIN (description gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_masters_specialization_trgm ON masters USING GIN (specialization gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_events_title_trgm ON events USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_events_description_trgm ON events USING GIN (description gin_trgm_ops);
@@ -0,0 +1,18 @@
+-- ============================================================================
+-- CONTENT VERSION
+-- Per-scope write counters: read functions cache public GET responses in
+-- memory and drop entries whose scope version has changed
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS content_version (
+    scope VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO content_version (scope, version) VALUES
+    ('baths', 0),
+    ('masters', 0),
+    ('events', 0),
+    ('blog', 0)
+ON CONFLICT (scope) DO NOTHING;
@@ -0,0 +1,50 @@
+-- ============================================================================
+-- RATING AGGREGATES
+-- Running sum/count of approved review ratings per entity: a new review
+-- updates them in O(1) instead of re-aggregating all reviews of the entity.
+-- The reviews function reconciles them with reviews on a timer
+-- ============================================================================
+
+ALTER TABLE baths ADD COLUMN IF NOT EXISTS rating_sum BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE masters ADD COLUMN IF NOT EXISTS rating_sum BIGINT NOT NULL DEFAULT 0;
+
+-- events had no rating columns, so event reviews could not update them
+ALTER TABLE events ADD COLUMN IF NOT EXISTS rating DECIMAL(2,1) DEFAULT 0;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS reviews_count INTEGER DEFAULT 0;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS rating_sum BIGINT NOT NULL DEFAULT 0;
+
+UPDATE baths b
+SET rating_sum = s.rating_sum,
+    reviews_count = s.reviews_count,
+    rating = ROUND(s.rating_sum::numeric / s.reviews_count, 1)
+FROM (
+    SELECT entity_id, SUM(rating) AS rating_sum, COUNT(*) AS reviews_count
+    FROM reviews
+    WHERE entity_type = 'bath' AND is_approved = true
+    GROUP BY entity_id
+) s
+WHERE s.entity_id = b.id;
+
+UPDATE masters m
+SET rating_sum = s.rating_sum,
+    reviews_count = s.reviews_count,
+    rating = ROUND(s.rating_sum::numeric / s.reviews_count, 1)
+FROM (
+    SELECT entity_id, SUM(rating) AS rating_sum, COUNT(*) AS reviews_count
+    FROM reviews
+    WHERE entity_type = 'master' AND is_approved = true
+    GROUP BY entity_id
+) s
+WHERE s.entity_id = m.id;
+
+UPDATE events e
+SET rating_sum = s.rating_sum,
+    reviews_count = s.reviews_count,
+    rating = ROUND(s.rating_sum::numeric / s.reviews_count, 1)
+FROM (
+    SELECT entity_id, SUM(rating) AS rating_sum, COUNT(*) AS reviews_count
+    FROM reviews
+    WHERE entity_type = 'event' AND is_approved = true
+    GROUP BY entity_id
+) s
+WHERE s.entity_id = e.id;
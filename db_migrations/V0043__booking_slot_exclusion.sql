@@ -0,0 +1,54 @@
+-- ============================================================================
+-- BOOKING SLOT EXCLUSION
+-- slot = [start, end) as tsrange; a GiST exclusion constraint makes
+-- overlapping pending/confirmed bookings of the same bath or master
+-- impossible, and the availability check becomes a single index probe
+-- ============================================================================
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- end_time <= start_time is treated as a booking that ends the next day
+ALTER TABLE bath_master_bookings ADD COLUMN IF NOT EXISTS slot tsrange
+    GENERATED ALWAYS AS (
+        tsrange(
+            booking_date + start_time,
+            CASE WHEN end_time > start_time THEN booking_date + end_time
+                 ELSE (booking_date + 1) + end_time END,
+            '[)'
+        )
+    ) STORED;
+
+-- Existing double bookings would block the constraint: keep the confirmed
+-- (then the oldest) booking of each overlapping pair and cancel the other
+UPDATE bath_master_bookings b
+SET status = 'canceled',
+    canceled_at = NOW(),
+    cancellation_reason = 'Пересечение с другим бронированием'
+WHERE b.status IN ('pending', 'confirmed')
+  AND EXISTS (
+      SELECT 1 FROM bath_master_bookings o
+      WHERE o.booking_type = b.booking_type
+        AND o.entity_id = b.entity_id
+        AND o.id <> b.id
+        AND o.status IN ('pending', 'confirmed')
+        AND o.slot && b.slot
+        AND (
+            (o.status = 'confirmed' AND b.status = 'pending')
+            OR (o.status = b.status AND o.id < b.id)
+        )
+  );
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'bath_master_bookings_no_overlap'
+    ) THEN
+        ALTER TABLE bath_master_bookings
+            ADD CONSTRAINT bath_master_bookings_no_overlap
+            EXCLUDE USING gist (booking_type WITH =, entity_id WITH =, slot WITH &&)
+            WHERE (status IN ('pending', 'confirmed'));
+    END IF;
+END $$;
+
+-- Exact-duplicate guard is covered by the exclusion constraint
+DROP INDEX IF EXISTS idx_bath_master_bookings_unique_slot;
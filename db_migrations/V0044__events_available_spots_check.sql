@@ -0,0 +1,17 @@
+-- ============================================================================
+-- EVENT SEATS GUARD
+-- Registration now decrements available_spots atomically; the CHECK makes
+-- an oversell impossible even for writers that bypass the events function
+-- ============================================================================
+
+UPDATE events SET available_spots = 0 WHERE available_spots < 0;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'events_available_spots_nonnegative'
+    ) THEN
+        ALTER TABLE events
+            ADD CONSTRAINT events_available_spots_nonnegative CHECK (available_spots >= 0);
+    END IF;
+END $$;
@@ -0,0 +1,19 @@
+-- ============================================================================
+-- EVENT WAITLIST
+-- FIFO queue for sold-out events: a freed seat is handed to the oldest
+-- waiting user (promotion takes rows with FOR UPDATE SKIP LOCKED)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS event_waitlist (
+    id BIGSERIAL PRIMARY KEY,
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    status VARCHAR(20) NOT NULL DEFAULT 'waiting' CHECK (status IN ('waiting', 'promoted', 'left')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    promoted_at TIMESTAMP NULL,
+    UNIQUE (event_id, user_id)
+);
+
+-- Queue head lookup: waiting rows of an event in arrival order
+CREATE INDEX IF NOT EXISTS idx_event_waitlist_queue
+    ON event_waitlist (event_id, id) WHERE status = 'waiting';
@@ -0,0 +1,111 @@
+-- ============================================================================
+-- SCHEDULE DAY SUMMARY
+-- Per-day counters of active slots and free spots per service type and city,
+-- kept up to date by triggers with O(1) deltas. The schedule calendar reads
+-- a month as one range scan instead of GROUP BY DATE(start_datetime)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS schedule_day_summary (
+    service_type VARCHAR(50) NOT NULL,
+    city VARCHAR(100) NOT NULL DEFAULT '',
+    day DATE NOT NULL,
+    events_count INTEGER NOT NULL DEFAULT 0,
+    available_spots INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (service_type, city, day)
+);
+
+-- Calendar without a city filter
+CREATE INDEX IF NOT EXISTS idx_schedule_day_summary_type_day
+    ON schedule_day_summary (service_type, day);
+
+-- Add (or subtract) a slot's contribution to its day bucket
+CREATE OR REPLACE FUNCTION schedule_day_summary_apply(
+    p_type VARCHAR, p_city VARCHAR, p_day DATE, p_events INTEGER, p_spots INTEGER
+) RETURNS void AS $$
+BEGIN
+    IF p_type IS NULL OR (p_events = 0 AND p_spots = 0) THEN
+        RETURN;
+    END IF;
+    INSERT INTO schedule_day_summary AS d (service_type, city, day, events_count, available_spots)
+    VALUES (p_type, COALESCE(p_city, ''), p_day, p_events, p_spots)
+    ON CONFLICT (service_type, city, day) DO UPDATE
+    SET events_count = d.events_count + EXCLUDED.events_count,
+        available_spots = d.available_spots + EXCLUDED.available_spots;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Slot inserted/moved/resized/cancelled/deleted: remove the old contribution, add the new one
+CREATE OR REPLACE FUNCTION service_schedules_summary_trigger() RETURNS trigger AS $$
+DECLARE
+    svc RECORD;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'active' THEN
+        SELECT type, city, is_active INTO svc FROM services WHERE id = OLD.service_id;
+        IF FOUND AND svc.is_active THEN
+            PERFORM schedule_day_summary_apply(
+                svc.type, svc.city, OLD.start_datetime::date, -1, -OLD.capacity_available);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'active' THEN
+        SELECT type, city, is_active INTO svc FROM services WHERE id = NEW.service_id;
+        IF FOUND AND svc.is_active THEN
+            PERFORM schedule_day_summary_apply(
+                svc.type, svc.city, NEW.start_datetime::date, 1, NEW.capacity_available);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_service_schedules_summary ON service_schedules;
+CREATE TRIGGER trg_service_schedules_summary
+    AFTER INSERT OR DELETE OR UPDATE OF service_id, start_datetime, capacity_available, status
+    ON service_schedules
+    FOR EACH ROW EXECUTE FUNCTION service_schedules_summary_trigger();
+
+-- Service type/city/activity changed: move all of its active slots between buckets
+CREATE OR REPLACE FUNCTION services_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_active THEN
+        PERFORM schedule_day_summary_apply(OLD.type, OLD.city, s.day, -s.events, -s.spots)
+        FROM (
+            SELECT start_datetime::date AS day, COUNT(*)::int AS events, SUM(capacity_available)::int AS spots
+            FROM service_schedules
+            WHERE service_id = OLD.id AND status = 'active'
+            GROUP BY start_datetime::date
+        ) s;
+    END IF;
+    IF TG_OP = 'UPDATE' AND NEW.is_active THEN
+        PERFORM schedule_day_summary_apply(NEW.type, NEW.city, s.day, s.events, s.spots)
+        FROM (
+            SELECT start_datetime::date AS day, COUNT(*)::int AS events, SUM(capacity_available)::int AS spots
+            FROM service_schedules
+            WHERE service_id = NEW.id AND status = 'active'
+            GROUP BY start_datetime::date
+        ) s;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_services_summary ON services;
+CREATE TRIGGER trg_services_summary
+    AFTER DELETE OR UPDATE OF type, city, is_active
+    ON services
+    FOR EACH ROW EXECUTE FUNCTION services_summary_trigger();
+
+-- Full rebuild from the source tables (initial fill, manual reconciliation)
+CREATE OR REPLACE FUNCTION rebuild_schedule_day_summary() RETURNS void AS $$
+BEGIN
+    LOCK TABLE schedule_day_summary IN EXCLUSIVE MODE;
+    DELETE FROM schedule_day_summary;
+    INSERT INTO schedule_day_summary (service_type, city, day, events_count, available_spots)
+    SELECT s.type, COALESCE(s.city, ''), sch.start_datetime::date, COUNT(*), SUM(sch.capacity_available)
+    FROM service_schedules sch
+    JOIN services s ON s.id = sch.service_id
+    WHERE s.is_active = true AND sch.status = 'active'
+    GROUP BY s.type, COALESCE(s.city, ''), sch.start_datetime::date;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_schedule_day_summary();
@@ -0,0 +1,24 @@
+-- ============================================================================
+-- SCHEDULE COMPOSITE INDEXES
+-- Schedule queries always filter active slots by a start_datetime range and
+-- active services by type (+ city); single-column indexes could not serve
+-- those predicates together
+-- ============================================================================
+
+-- Day view: active slots in [day, day + 1)
+CREATE INDEX IF NOT EXISTS idx_schedules_active_start
+    ON service_schedules (start_datetime)
+    WHERE status = 'active';
+
+-- Join from a service to its active slots in a range (and summary triggers)
+CREATE INDEX IF NOT EXISTS idx_schedules_service_active_start
+    ON service_schedules (service_id, start_datetime)
+    WHERE status = 'active';
+
+-- Active services of a type, optionally in a city
+CREATE INDEX IF NOT EXISTS idx_services_active_type_city
+    ON services (type, city)
+    WHERE is_active = true;
+
+ANALYZE service_schedules;
+ANALYZE services;
@@ -0,0 +1,24 @@
+-- ============================================================================
+-- EMAIL OUTBOX
+-- Request handlers only INSERT a message; a timer-triggered worker claims due
+-- rows with FOR UPDATE SKIP LOCKED and sends them over one SMTP session,
+-- rescheduling failures with exponential backoff
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    to_email VARCHAR(255) NOT NULL,
+    subject VARCHAR(500) NOT NULL,
+    text_body TEXT NOT NULL,
+    html_body TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP NULL
+);
+
+-- Worker scan: due pending messages in schedule order
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+    ON email_outbox (next_attempt_at) WHERE status = 'pending';
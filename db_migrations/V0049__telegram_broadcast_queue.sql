@@ -0,0 +1,28 @@
+-- ============================================================================
+-- TELEGRAM BROADCAST QUEUE
+-- action=broadcast enqueues one row per chat; the timer-triggered worker
+-- leases due rows with FOR UPDATE SKIP LOCKED and sends them concurrently
+-- under Telegram's global and per-chat rate limits
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS telegram_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    broadcast_id UUID NOT NULL,
+    chat_id VARCHAR(64) NOT NULL,
+    kind VARCHAR(20) NOT NULL DEFAULT 'message' CHECK (kind IN ('message', 'photo')),
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP NULL
+);
+
+-- Worker scan: due pending messages in queue order
+CREATE INDEX IF NOT EXISTS idx_telegram_outbox_due
+    ON telegram_outbox (next_attempt_at, id) WHERE status = 'pending';
+
+-- Broadcast progress lookups
+CREATE INDEX IF NOT EXISTS idx_telegram_outbox_broadcast
+    ON telegram_outbox (broadcast_id);
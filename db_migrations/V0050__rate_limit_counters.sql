@@ -0,0 +1,20 @@
+-- ============================================================================
+-- RATE LIMIT COUNTERS
+-- One row per limited key ('login:<ip>', 'blog-post:<user_id>'), updated by a
+-- single INSERT ... ON CONFLICT DO UPDATE per attempt. window_id is
+-- floor(epoch / window); prev_hits keeps the previous window's count for the
+-- sliding-window estimate. Replaces the read-then-write logic on rate_limits
+-- and blog_rate_limits
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS rate_limit_counters (
+    key VARCHAR(255) PRIMARY KEY,
+    window_id BIGINT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 1,
+    prev_hits INTEGER NOT NULL DEFAULT 0,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Purge of counters whose window and the following one are over
+CREATE INDEX IF NOT EXISTS idx_rate_limit_counters_expires
+    ON rate_limit_counters (expires_at);
@@ -0,0 +1,19 @@
+-- ============================================================================
+-- AUTH TTL PURGE INDEXES
+-- The timer-triggered purge in the auth function deletes expired rows in
+-- batches; these indexes let each batch find expired rows without a full
+-- scan of tables that do not have an expires_at index yet
+-- ============================================================================
+
+-- Session is dead once both the access and the refresh token have expired
+CREATE INDEX IF NOT EXISTS idx_user_sessions_purge
+    ON user_sessions ((COALESCE(refresh_expires_at, expires_at)));
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires
+    ON refresh_tokens (expires_at);
+
+CREATE INDEX IF NOT EXISTS idx_email_verification_tokens_expires
+    ON email_verification_tokens (expires_at);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limits_last_attempt
+    ON rate_limits (last_attempt);